@@ -0,0 +1,122 @@
+"""
+Requests/sec and latency of the post list under gunicorn (WSGI, sync views) and uvicorn
+(ASGI, the same sync views and their async versions), one server process each, many
+concurrent clients.
+
+    pip install gunicorn uvicorn httpx
+    python benchmarks/bench_asgi.py --concurrency 500 --requests 5000
+
+gunicorn runs one process with --threads threads, so at most that many requests are served
+at once and the rest queue. uvicorn runs one process and event loop. Sync views under ASGI
+still go through a thread each, while the async views only take one while they wait on a query.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from common import percentile, setup
+
+teardown = setup()
+
+import httpx  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from blogapp.models import Post  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'gunicorn (WSGI)': ['gunicorn', 'bink_blog_application.wsgi:application', '--workers', '1',
+                        '--worker-class', 'gthread', '--threads', '{threads}', '--bind', '127.0.0.1:{port}'],
+    'uvicorn (ASGI)': ['uvicorn', 'bink_blog_application.asgi:application', '--workers', '1',
+                       '--no-access-log', '--host', '127.0.0.1', '--port', '{port}'],
+}
+
+RUNS = [
+    ('gunicorn (WSGI)', '/api/blogapp/post/'),
+    ('uvicorn (ASGI)', '/api/blogapp/post/'),
+    ('uvicorn (ASGI)', '/api/blogapp/async/post/'),
+]
+
+
+def start_server(name, port, threads):
+    command = [part.format(port = port, threads = threads) for part in SERVERS[name]]
+    env = dict(os.environ, SQLITE_PATH = str(settings.DATABASES['default']['NAME']))
+    server = subprocess.Popen(command, cwd = ROOT, env = env, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            httpx.get('http://127.0.0.1:%d/api/blogapp/' % port)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    sys.exit('%s did not start' % name)
+
+
+async def load(url, token, concurrency, requests):
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+    limits = httpx.Limits(max_connections = concurrency, max_keepalive_connections = concurrency)
+    headers = {'Authorization': 'Bearer %s' % token}
+
+    async with httpx.AsyncClient(limits = limits, headers = headers, timeout = 60) as client:
+        async def client_loop():
+            nonlocal errors
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[client_loop() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--concurrency', type = int, default = 200)
+    parser.add_argument('--requests', type = int, default = 2000)
+    parser.add_argument('--threads', type = int, default = 8, help = 'gunicorn threads')
+    parser.add_argument('--port', type = int, default = 8765)
+    args = parser.parse_args()
+
+    user = User.objects.create_user('bench')
+    Post.objects.bulk_create(Post(user = user, title = 'Post %d' % i, body = 'Body ' * 50) for i in range(200))
+    token = str(AccessToken.for_user(user))
+    connection.close()
+
+    for name, path in RUNS:
+        server = start_server(name, args.port, args.threads)
+        try:
+            url = 'http://127.0.0.1:%d%s' % (args.port, path)
+            asyncio.run(load(url, token, 10, 50))  # warm up
+            latencies, errors, elapsed = asyncio.run(load(url, token, args.concurrency, args.requests))
+        finally:
+            server.terminate()
+            server.wait()
+        print('%-18s %-26s %7.0f req/s  p50=%6.1fms  p99=%7.1fms  errors=%d' % (
+            name, path, len(latencies) / elapsed,
+            percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000, errors,
+        ))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
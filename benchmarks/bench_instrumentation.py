@@ -0,0 +1,54 @@
+"""
+Overhead of the request metrics of blogapp/instrumentation.py on a post list page.
+
+    python benchmarks/bench_instrumentation.py --requests 2000
+
+Serves the same page through the test client with BLOGAPP['METRICS_SAMPLE_RATE'] at 0
+(requests are only counted), 0.1 and 1 (every request measured, Server-Timing sent).
+"""
+import argparse
+import time
+
+from common import percentile, setup
+
+teardown = setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from blogapp.models import Post  # noqa: E402
+
+
+def run(client, url, rate, requests):
+    latencies = []
+    with override_settings(ALLOWED_HOSTS = ['testserver'], BLOGAPP = {'METRICS_SAMPLE_RATE': rate}):
+        for _ in range(requests):
+            started = time.perf_counter()
+            client.get(url)
+            latencies.append(time.perf_counter() - started)
+    print('sample rate %-4s p50=%6.3fms  mean=%6.3fms' % (
+        rate, percentile(latencies, 0.5) * 1000, sum(latencies) / len(latencies) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--requests', type = int, default = 2000)
+    args = parser.parse_args()
+
+    user = User.objects.create_user('bench')
+    Post.objects.bulk_create(Post(user = user, title = 'Post %d' % i, body = 'Body ' * 50) for i in range(50))
+    client = APIClient()
+    client.force_authenticate(user = user)
+    url = reverse('post-list') + '?page_size=20'
+    run(client, url, 0, 100)  # warm up
+    for rate in (0, 0.1, 1, 0, 0.1, 1):
+        run(client, url, rate, args.requests)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
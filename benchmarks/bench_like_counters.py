@@ -0,0 +1,73 @@
+"""
+Compares the 'direct' and 'sharded' like counters with many threads liking the same hot post.
+
+    python benchmarks/bench_like_counters.py --threads 32 --likes-per-thread 50
+
+On SQLite every write takes the database lock, so both modes serialize and the numbers mostly
+show the overhead of each path. Point DATABASES at PostgreSQL to see the row lock contention
+the sharded mode removes.
+"""
+import argparse
+import threading
+
+from common import setup, timer
+
+teardown = setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import OperationalError, connection  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from blogapp.counters import get_like_counter  # noqa: E402
+from blogapp.likes import toggle_like  # noqa: E402
+from blogapp.models import Like, Post  # noqa: E402
+
+
+def run(mode, args, users):
+    post = Post.objects.create(user = users[0], title = 'Hot post', body = mode)
+    errors = []
+
+    def worker(batch):
+        try:
+            for user in batch:
+                try:
+                    toggle_like(user.id, post.id)
+                except OperationalError as exc:
+                    errors.append(exc)
+        finally:
+            connection.close()
+
+    batches = [users[i::args.threads] for i in range(args.threads)]
+    threads = [threading.Thread(target = worker, args = (batch,)) for batch in batches]
+    with override_settings(BLOGAPP = {'LIKE_COUNTER': mode, 'LIKE_COUNTER_SHARDS': args.shards}):
+        with timer('%s (%d threads)' % (mode, args.threads), len(users)):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        get_like_counter().flush()
+
+    post.refresh_from_db()
+    likes = Like.objects.filter(post = post).count()
+    print('    like_count=%d like rows=%d errors=%d' % (post.like_count, likes, len(errors)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--threads', type = int, default = 16)
+    parser.add_argument('--likes-per-thread', type = int, default = 50)
+    parser.add_argument('--shards', type = int, default = 16)
+    args = parser.parse_args()
+
+    users = User.objects.bulk_create(
+        User(username = 'bench%d' % i) for i in range(args.threads * args.likes_per_thread)
+    )
+    for mode in ('direct', 'sharded'):
+        run(mode, args, users)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
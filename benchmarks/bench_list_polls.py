@@ -0,0 +1,71 @@
+"""
+Conditional polls (If-None-Match answered with 304) of the post listings for a user with many posts.
+
+    python benchmarks/bench_list_polls.py --posts 200000
+
+The validator of a keyset paginated listing reads the requested page only, so a poll should cost
+the same on the global listing and on the listing of a user owning every post, and stay flat as
+--posts grows.
+"""
+import argparse
+import time
+
+from common import percentile, setup, timer
+
+teardown = setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import transaction  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from blogapp.models import Post  # noqa: E402
+
+
+def create_posts(user, count, chunk = 20000):
+    created = 0
+    while created < count:
+        size = min(chunk, count - created)
+        with transaction.atomic():
+            Post.objects.bulk_create(Post(user = user, title = 'Post %d' % i, body = 'Body') for i in range(created, created + size))
+        created += size
+
+
+def poll_latencies(client, url, samples):
+    etag = client.get(url)['ETag']
+    result = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        response = client.get(url, HTTP_IF_NONE_MATCH = etag)
+        result.append(time.perf_counter() - started)
+        assert response.status_code == 304, response.status_code
+    return result
+
+
+def report(label, samples):
+    print('%-40s p50=%8.2fms  p99=%8.2fms' % (label, percentile(samples, 0.5) * 1000, percentile(samples, 0.99) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--posts', type = int, default = 200000)
+    parser.add_argument('--page-size', type = int, default = 50)
+    parser.add_argument('--samples', type = int, default = 200)
+    args = parser.parse_args()
+
+    user = User.objects.create_user(username = 'prolific', password = 'bench')
+    with timer('create posts', args.posts):
+        create_posts(user, args.posts)
+    client = APIClient()
+    client.force_authenticate(user = user)
+
+    report('post list poll', poll_latencies(client, '%s?page_size=%d' % (reverse('post-list'), args.page_size), args.samples))
+    url = '%s?page_size=%d' % (reverse('user-post', kwargs = {'username': user.username}), args.page_size)
+    report('user post list poll', poll_latencies(client, url, args.samples))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,119 @@
+"""
+Latency of cheap reads during a login storm, passwords hashed on the request threads
+(PASSWORD_HASH_WORKERS=0) against the hashing pool of blogapp/hashing.py.
+
+    pip install gunicorn httpx
+    python benchmarks/bench_login_storm.py --logins 200 --login-concurrency 32
+
+One gunicorn process with --threads threads serves both. --login-concurrency clients post to
+login/ (with right and wrong passwords) while one client keeps reading the post list, the script
+reports the p50/p99 of those reads and the outcome of the logins. With the pool, at most
+--workers hashes run at once whatever the number of logins in flight, the rest queue or get a 503.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from common import percentile, setup
+
+teardown = setup()
+
+import httpx  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from blogapp.models import Post  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(port, threads, workers):
+    command = ['gunicorn', 'bink_blog_application.wsgi:application', '--workers', '1',
+               '--worker-class', 'gthread', '--threads', str(threads), '--bind', '127.0.0.1:%d' % port]
+    env = dict(os.environ, SQLITE_PATH = str(settings.DATABASES['default']['NAME']), PASSWORD_HASH_WORKERS = str(workers))
+    server = subprocess.Popen(command, cwd = ROOT, env = env, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            httpx.get('http://127.0.0.1:%d/api/blogapp/' % port)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    sys.exit('gunicorn did not start')
+
+
+async def storm(base, token, logins, concurrency):
+    statuses = {}
+    queue = asyncio.Queue()
+    for i in range(logins):
+        queue.put_nowait(i)
+    done = asyncio.Event()
+    read_latencies = []
+
+    async with httpx.AsyncClient(timeout = 120) as client:
+        async def login_loop():
+            while not queue.empty():
+                i = queue.get_nowait()
+                password = 'benchpass1234' if i % 4 else 'wrong'
+                try:
+                    response = await client.post(base + 'login/', data = {'username': 'bench', 'password': password})
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                except httpx.HTTPError:
+                    statuses['error'] = statuses.get('error', 0) + 1
+
+        async def read_loop():
+            headers = {'Authorization': 'Bearer %s' % token}
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get(base + 'post/', headers = headers)
+                read_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        reader = asyncio.ensure_future(read_loop())
+        started = time.perf_counter()
+        await asyncio.gather(*[login_loop() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        done.set()
+        await reader
+    return read_latencies, statuses, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--logins', type = int, default = 200)
+    parser.add_argument('--login-concurrency', type = int, default = 32)
+    parser.add_argument('--threads', type = int, default = 16, help = 'gunicorn threads')
+    parser.add_argument('--workers', type = int, default = max(1, (os.cpu_count() or 2) // 2), help = 'hashing processes')
+    parser.add_argument('--port', type = int, default = 8766)
+    args = parser.parse_args()
+
+    user = User.objects.create_user('bench', password = 'benchpass1234')
+    Post.objects.bulk_create(Post(user = user, title = 'Post %d' % i, body = 'Body ' * 50) for i in range(50))
+    token = str(AccessToken.for_user(user))
+    connection.close()
+
+    for label, workers in (('request threads', 0), ('pool of %d' % args.workers, args.workers)):
+        server = start_server(args.port, args.threads, workers)
+        base = 'http://127.0.0.1:%d/api/blogapp/' % args.port
+        try:
+            asyncio.run(storm(base, token, 4, 2))  # warm up, starts the pool
+            latencies, statuses, elapsed = asyncio.run(storm(base, token, args.logins, args.login_concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+        print('%-18s reads p50=%7.1fms  p99=%7.1fms  logins %5.1f/s  %s' % (
+            label, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000,
+            args.logins / elapsed, ' '.join('%s:%d' % item for item in sorted(statuses.items(), key = str)),
+        ))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
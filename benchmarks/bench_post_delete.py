@@ -0,0 +1,73 @@
+"""
+Deleting a viral post : Django's cascading delete() against delete_post() plus the batched purge
+of blogapp/purge.py.
+
+    python benchmarks/bench_post_delete.py --likes 1000000 --comments 20000
+
+Two identical posts get --likes likes (from as many users) and --comments comments with one
+reply each. One is deleted with post.delete(), the other with delete_post() followed by
+purge_deleted_posts(). Reports the wall time and the peak Python memory (tracemalloc) of each.
+"""
+import argparse
+import time
+import tracemalloc
+
+from common import setup
+
+teardown = setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import transaction  # noqa: E402
+
+from blogapp.models import Comment, Like, Post, Reply  # noqa: E402
+from blogapp.purge import delete_post, purge_deleted_posts  # noqa: E402
+
+
+def create_post(author, users, comments, chunk = 50000):
+    post = Post.objects.create(user = author, title = 'Viral', body = 'Body')
+    for start in range(0, len(users), chunk):
+        with transaction.atomic():
+            Like.objects.bulk_create(Like(user_id = user_id, post = post) for user_id in users[start:start + chunk])
+    with transaction.atomic():
+        created = Comment.objects.bulk_create(Comment(user = author, post = post, body = 'Comment') for _ in range(comments))
+        Reply.objects.bulk_create(Reply(user = author, comment = comment, body = 'Reply') for comment in created)
+    Post.objects.filter(pk = post.pk).update(like_count = len(users), comment_count = comments)
+    return Post.objects.get(pk = post.pk)
+
+
+def measure(label, function):
+    tracemalloc.start()
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('%-40s %10.3fs  peak %8.1f MB' % (label, elapsed, peak / 1024 / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--likes', type = int, default = 1000000)
+    parser.add_argument('--comments', type = int, default = 20000)
+    parser.add_argument('--batch-size', type = int, default = 1000)
+    args = parser.parse_args()
+
+    author = User.objects.create_user('author')
+    with transaction.atomic():
+        User.objects.bulk_create(User(username = 'fan%d' % i, password = '!') for i in range(args.likes))
+    users = list(User.objects.exclude(pk = author.pk).values_list('pk', flat = True))
+
+    post = create_post(author, users, args.comments)
+    measure('post.delete()', post.delete)
+
+    post = create_post(author, users, args.comments)
+    measure('delete_post() (the request)', lambda: delete_post(post))
+    measure('purge_deleted_posts() (the worker)', lambda: purge_deleted_posts(args.batch_size))
+    assert not Like.objects.exists() and not Reply.objects.exists()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
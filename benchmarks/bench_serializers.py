@@ -0,0 +1,60 @@
+"""
+Objects/sec of the post list serialization paths on N posts (10k by default).
+
+    python benchmarks/bench_serializers.py --posts 10000
+
+model instances + PostSerializer + JSONRenderer   : what the list views used to do
+values() + FastPostSerializer + JSONRenderer      : fast path with the stdlib encoder
+values() + FastPostSerializer + ORJSONRenderer    : fast path as configured in settings
+"""
+import argparse
+
+from common import setup, timer
+
+teardown = setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from blogapp.fast_serializers import FastPostSerializer  # noqa: E402
+from blogapp.models import Post  # noqa: E402
+from blogapp.renderers import ORJSONRenderer  # noqa: E402
+from blogapp.serializers import PostSerializer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--posts', type = int, default = 10000)
+    parser.add_argument('--rounds', type = int, default = 3)
+    args = parser.parse_args()
+
+    user = User.objects.create(username = 'bench')
+    Post.objects.bulk_create(
+        Post(user = user, title = 'Post number %d' % i, body = 'Lorem ipsum dolor sit amet. ' * 20)
+        for i in range(args.posts)
+    )
+    queryset = Post.objects.with_like_count().order_by('-created', '-id')
+
+    outputs = {}
+    paths = [
+        ('PostSerializer + JSONRenderer',
+         lambda: JSONRenderer().render(PostSerializer(queryset, many = True).data)),
+        ('FastPostSerializer + JSONRenderer',
+         lambda: JSONRenderer().render(FastPostSerializer(FastPostSerializer.values(queryset)).data)),
+        ('FastPostSerializer + ORJSONRenderer',
+         lambda: ORJSONRenderer().render(FastPostSerializer(FastPostSerializer.values(queryset)).data)),
+    ]
+    for label, render in paths:
+        with timer(label, args.posts * args.rounds):
+            for _ in range(args.rounds):
+                outputs[label] = render()
+
+    identical = len(set(outputs.values())) == 1
+    print('byte-identical output: %s' % identical)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
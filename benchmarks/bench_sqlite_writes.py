@@ -0,0 +1,105 @@
+"""
+Write throughput of SQLite with several worker processes, the way gunicorn runs the app.
+
+    python benchmarks/bench_sqlite_writes.py --workers 8 --requests-per-worker 200
+    SQLITE_PRODUCTION=1 python benchmarks/bench_sqlite_writes.py --workers 8 --requests-per-worker 200
+
+Every worker is a separate process with its own connection, sending comment and like
+requests through the full Django / DRF stack. Run it with and without SQLITE_PRODUCTION=1
+to compare the stock settings with the production profile (see settings.py), the
+"locked" column counts requests that failed with "database is locked". Throttling is turned
+off, the rates of the workers would reject most of the requests, and every other request has to
+succeed.
+"""
+import argparse
+import multiprocessing
+import random
+import time
+
+from common import percentile, setup
+
+teardown = setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import OperationalError, connection, connections  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from blogapp.models import Comment, Like, Post  # noqa: E402
+
+
+def worker(user_id, post_ids, requests, results):
+    client = APIClient()
+    client.force_authenticate(user = User.objects.get(pk = user_id))
+    latencies, locked, failed = [], 0, []
+    try:
+        for i in range(requests):
+            post_id = random.choice(post_ids)
+            started = time.perf_counter()
+            try:
+                if i % 2:
+                    response = client.post(reverse('like', kwargs = {'pk': post_id}))
+                else:
+                    response = client.post(reverse('comment', kwargs = {'pk': post_id}), {'body': 'Load test'}, format = 'json')
+                if not 200 <= response.status_code < 300:
+                    failed.append(response.status_code)
+            except OperationalError:
+                locked += 1
+            latencies.append(time.perf_counter() - started)
+    finally:
+        connection.close()
+    results.put((latencies, locked, failed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--workers', type = int, default = 8)
+    parser.add_argument('--requests-per-worker', type = int, default = 200)
+    parser.add_argument('--posts', type = int, default = 20)
+    args = parser.parse_args()
+
+    users = [User.objects.create_user('bench%d' % i) for i in range(args.workers)]
+    post_ids = [Post.objects.create(user = users[0], title = 'Post %d' % i, body = 'Body').pk for i in range(args.posts)]
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        journal_mode = cursor.fetchone()[0]
+    # forked workers must not share the parent's SQLite connection
+    connections.close_all()
+
+    results = multiprocessing.get_context('fork').Queue()
+    processes = [
+        multiprocessing.get_context('fork').Process(
+            target = worker, args = (user.id, post_ids, args.requests_per_worker, results)
+        )
+        for user in users
+    ]
+    # the forked workers inherit the override
+    unthrottled = dict(getattr(settings, 'BLOGAPP', {}), THROTTLE_RATES = {}, THROTTLE_ENDPOINT_RATES = {})
+    with override_settings(BLOGAPP = unthrottled):
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency for worker_latencies, _, _ in outcomes for latency in worker_latencies]
+    locked = sum(worker_locked for _, worker_locked, _ in outcomes)
+    failed = [status for _, _, worker_failed in outcomes for status in worker_failed]
+    assert not failed, 'non-2xx responses: %s' % sorted(set(failed))
+    print('journal_mode=%s workers=%d' % (journal_mode, args.workers))
+    print('%10.0f req/s  p50=%.1fms  p99=%.1fms  locked=%d  (%d requests in %.2fs)' % (
+        len(latencies) / elapsed, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000,
+        locked, len(latencies), elapsed,
+    ))
+    print('    comments=%d likes=%d' % (Comment.objects.count(), Like.objects.count()))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
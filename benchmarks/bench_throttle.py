@@ -0,0 +1,70 @@
+"""
+Cost of the token bucket throttle of the write endpoints, per request.
+
+    python benchmarks/bench_throttle.py --checks 200000 --users 10000
+
+Times TokenBucketThrottle.allow_request() on its own with the local store, for a client that
+always has tokens, one that is always refused and many clients spread over the buckets
+(the LRU store keeps every one of them).
+"""
+import argparse
+import random
+import time
+
+from common import setup
+
+teardown = setup()
+
+from django.test.utils import override_settings  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory, force_authenticate  # noqa: E402
+from rest_framework_simplejwt.models import TokenUser  # noqa: E402
+
+from blogapp.throttling import TokenBucketThrottle, get_bucket_store  # noqa: E402
+from blogapp.views import LikeAPIView  # noqa: E402
+
+
+def make_request(user_id):
+    request = APIRequestFactory().post('/api/blogapp/post/1/like/')
+    user = TokenUser({'user_id': user_id})
+    force_authenticate(request, user = user)
+    request = Request(request)
+    request.user = user
+    return request
+
+
+def run(label, requests, checks):
+    view = LikeAPIView()
+    throttle = TokenBucketThrottle()
+    get_bucket_store().clear()
+    started = time.perf_counter()
+    for i in range(checks):
+        throttle.allow_request(requests[i % len(requests)], view)
+    elapsed = time.perf_counter() - started
+    print('%-32s %8.2f us/check' % (label, elapsed / checks * 1000000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--checks', type = int, default = 200000)
+    parser.add_argument('--users', type = int, default = 10000)
+    args = parser.parse_args()
+
+    one = [make_request(1)]
+    many = [make_request(user_id) for user_id in range(args.users)]
+    random.shuffle(many)
+    with override_settings(BLOGAPP = {'THROTTLE_RATES': {'like': '1000000000/s'}}):
+        run('one client, allowed', one, args.checks)
+        run('%d clients, allowed' % args.users, many, args.checks)
+    with override_settings(BLOGAPP = {'THROTTLE_RATES': {'like': '1/day'}}):
+        run('one client, refused', one, args.checks)
+    with override_settings(BLOGAPP = {'THROTTLE_RATES': {'like': '1000000000/s'},
+                                      'THROTTLE_ENDPOINT_RATES': {'like': '1000000000/s'}}):
+        run('user and endpoint buckets', one, args.checks)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,70 @@
+"""
+Refresh token rotation latency as revocations pile up, with the RevokedToken store of
+blogapp/tokens.py and with simplejwt's stock token_blacklist tables.
+
+    python benchmarks/bench_token_refresh.py --sizes 0 100000 1000000 --refreshes 500
+
+Before each round both stores get --sizes revoked tokens (which is what months of rotations
+leave behind without a purge), then a chain of refreshes is timed through each serializer.
+"""
+import argparse
+import time
+import uuid
+from datetime import timedelta
+
+from common import percentile, setup
+
+teardown = setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer  # noqa: E402
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken  # noqa: E402
+from rest_framework_simplejwt.tokens import RefreshToken  # noqa: E402
+
+from blogapp.models import RevokedToken  # noqa: E402
+from blogapp.tokens import BlogRefreshToken, RotatingTokenRefreshSerializer  # noqa: E402
+
+
+def fill(count, chunk = 50000):
+    expires_at = timezone.now() + timedelta(days = 50)
+    while RevokedToken.objects.count() < count:
+        size = min(chunk, count - RevokedToken.objects.count())
+        jtis = [uuid.uuid4().hex for _ in range(size)]
+        RevokedToken.objects.bulk_create(RevokedToken(jti = jti, expires_at = expires_at) for jti in jtis)
+        outstanding = OutstandingToken.objects.bulk_create(
+            OutstandingToken(jti = jti, token = 'x' * 250, expires_at = expires_at) for jti in jtis
+        )
+        BlacklistedToken.objects.bulk_create(BlacklistedToken(token = token) for token in outstanding)
+
+
+def run(label, serializer_class, token, refreshes):
+    latencies = []
+    for _ in range(refreshes):
+        started = time.perf_counter()
+        serializer = serializer_class(data = {'refresh': token})
+        serializer.is_valid(raise_exception = True)
+        latencies.append(time.perf_counter() - started)
+        token = serializer.validated_data['refresh']
+    print('    %-28s p50=%6.2fms  p99=%6.2fms' % (label, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--sizes', type = int, nargs = '+', default = [0, 100000, 1000000])
+    parser.add_argument('--refreshes', type = int, default = 500)
+    args = parser.parse_args()
+
+    user = User.objects.create_user('bench')
+    for size in sorted(args.sizes):
+        fill(size)
+        print('%d revoked tokens' % RevokedToken.objects.count())
+        run('RevokedToken', RotatingTokenRefreshSerializer, str(BlogRefreshToken.for_user(user)), args.refreshes)
+        run('token_blacklist', TokenRefreshSerializer, str(RefreshToken.for_user(user)), args.refreshes)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,122 @@
+"""
+Trending posts at scale : the incremental scores of blogapp/trending.py against ranking every
+post from scratch on each request.
+
+    python benchmarks/bench_trending.py --posts 1000000 --events 50000
+
+Posts get a creation time spread over the last --days days. Events are 80% likes, 15% comments
+and 5% replies, and pick their post with a heavy tail towards the newest ones, the way attention
+on a feed is distributed. Reports the events/s record_activity sustains, how long a
+refresh_trending run takes, and the latency of a posts/trending/ page against the
+ORDER BY <decayed score> LIMIT query over all of Post (SQLite only).
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from common import percentile, setup, timer
+
+teardown = setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from blogapp.conf import blogapp_settings  # noqa: E402
+from blogapp.models import Post, TrendingScore  # noqa: E402
+from blogapp.trending import get_tau, log_weight, record_activity, refresh_trending  # noqa: E402
+
+EVENTS = ['like'] * 80 + ['comment'] * 15 + ['reply'] * 5
+
+
+def create_posts(user, count, days, chunk = 20000):
+    now = datetime.now(timezone.utc)
+    created = 0
+    while created < count:
+        size = min(chunk, count - created)
+        with transaction.atomic():
+            posts = Post.objects.bulk_create(
+                Post(user = user, title = 'Post %d' % i, body = 'Body') for i in range(created, created + size)
+            )
+            ages = [random.uniform(0, days * 86400) for _ in posts]
+            TrendingScore.objects.bulk_create(
+                TrendingScore(post_id = post.pk, score = log_weight('post', now - timedelta(seconds = age)))
+                for post, age in zip(posts, ages)
+            )
+        created += size
+    return Post.objects.order_by('pk').values_list('pk', flat = True).first()
+
+
+def pick_post(first_id, count):
+    # newest ids are the likeliest, with a long tail over the rest
+    return first_id + count - 1 - min(count - 1, int(random.paretovariate(1.2)) - 1)
+
+
+def page_latencies(client, url, samples):
+    latencies = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+    return latencies
+
+
+def naive_latencies(page_size, samples):
+    weights = blogapp_settings.TRENDING_WEIGHTS
+    sql = (
+        'SELECT id FROM blogapp_post ORDER BY '
+        '(%s + like_count * %s + comment_count * %s) '
+        "* EXP((julianday(created) - julianday('now')) * 86400 / %s) DESC, id DESC LIMIT %d"
+        % (weights['post'], weights['like'], weights['comment'], get_tau(), page_size)
+    )
+    latencies = []
+    with connection.cursor() as cursor:
+        for _ in range(samples):
+            started = time.perf_counter()
+            cursor.execute(sql)
+            cursor.fetchall()
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(label, latencies):
+    print('%-40s p50=%8.2fms  p99=%8.2fms' % (label, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--posts', type = int, default = 1000000)
+    parser.add_argument('--events', type = int, default = 50000)
+    parser.add_argument('--days', type = float, default = 7)
+    parser.add_argument('--page-size', type = int, default = 20)
+    parser.add_argument('--samples', type = int, default = 50)
+    args = parser.parse_args()
+
+    user = User.objects.create_user('bench')
+    with timer('create posts with scores', args.posts):
+        first_id = create_posts(user, args.posts, args.days)
+
+    with timer('record_activity', args.events):
+        for _ in range(args.events):
+            record_activity(pick_post(first_id, args.posts), random.choice(EVENTS))
+
+    started = time.perf_counter()
+    ranked = refresh_trending()
+    print('%-40s %10.2fs  (%d posts ranked)' % ('refresh_trending', time.perf_counter() - started, ranked))
+
+    client = APIClient()
+    client.force_authenticate(user = user)
+    url = '%s?page_size=%d' % (reverse('post-trending'), args.page_size)
+    report('posts/trending/ page', page_latencies(client, url, args.samples))
+    if connection.vendor == 'sqlite':
+        report('ORDER BY decayed score over Post', naive_latencies(args.page_size, min(args.samples, 5)))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,76 @@
+"""
+User directory pages against the old unpaginated users list.
+
+    python benchmarks/bench_user_directory.py --users 200000
+
+Reports the latency of the first page, a page deep into the directory (reached through its
+cursor), a username prefix lookup, and serializing every user the way UsersAPIView used to.
+"""
+import argparse
+import time
+
+from common import percentile, setup, timer
+
+teardown = setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import transaction  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from blogapp.pagination import UserKeysetPagination  # noqa: E402
+from blogapp.serializers import UserSerializer  # noqa: E402
+
+
+def create_users(count, chunk = 20000):
+    created = 0
+    while created < count:
+        size = min(chunk, count - created)
+        with transaction.atomic():
+            User.objects.bulk_create(User(username = 'user%07d' % i, password = '!') for i in range(created, created + size))
+        created += size
+
+
+def latencies(client, url, samples):
+    result = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        response = client.get(url)
+        result.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+    return result
+
+
+def report(label, samples):
+    print('%-40s p50=%8.2fms  p99=%8.2fms' % (label, percentile(samples, 0.5) * 1000, percentile(samples, 0.99) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument('--users', type = int, default = 200000)
+    parser.add_argument('--page-size', type = int, default = 50)
+    parser.add_argument('--samples', type = int, default = 50)
+    args = parser.parse_args()
+
+    with timer('create users', args.users):
+        create_users(args.users)
+    client = APIClient()
+    client.force_authenticate(user = User.objects.first())
+
+    url = '%s?page_size=%d' % (reverse('users-list'), args.page_size)
+    report('first page', latencies(client, url, args.samples))
+    position = User.objects.filter(username = 'user%07d' % (args.users * 9 // 10)).values_list('username', 'id').get()
+    deep = '%s&cursor=%s' % (url, UserKeysetPagination().encode_cursor(position))
+    report('page at 90% of the directory', latencies(client, deep, args.samples))
+    report('prefix lookup', latencies(client, '%s&prefix=user00123' % url, args.samples))
+
+    started = time.perf_counter()
+    UserSerializer(User.objects.all(), many = True).data
+    print('%-40s %10.2fms' % ('old list, every user serialized', (time.perf_counter() - started) * 1000))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,53 @@
+"""
+Shared setup for the scripts in this folder.
+
+Every benchmark runs against a throwaway database created the same way the test runner does it
+(a temporary file for SQLite, a test_<name> database on PostgreSQL), so the development
+database is never touched. Run them from the repository root, e.g.
+
+    python benchmarks/bench_like_counters.py --threads 32
+"""
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bink_blog_application.settings')
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+
+def setup():
+    """
+    Configures Django and creates the benchmark database.
+    Returns : a callable that destroys the database again
+    """
+    database = settings.DATABASES['default']
+    if database['ENGINE'].endswith('sqlite3'):
+        # an on-disk file so several threads / processes can share it
+        database.setdefault('TEST', {})['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        database.setdefault('OPTIONS', {}).setdefault('timeout', 60)
+    django.setup()
+
+    from django.db import connection
+    old_name = connection.creation.create_test_db(verbosity = 0, autoclobber = True, serialize = False)
+
+    def teardown():
+        connection.creation.destroy_test_db(old_name, verbosity = 0)
+    return teardown
+
+
+@contextmanager
+def timer(label, operations):
+    started = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - started
+    print('%-40s %10.0f ops/s  (%d ops in %.2fs)' % (label, operations / elapsed, operations, elapsed))
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
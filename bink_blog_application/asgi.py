@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bink_blog_application.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from blogapp.sse import EventStreamRouter  # noqa: E402
+
+# the Server-Sent Events streams are served before Django, see blogapp/sse.py
+application = EventStreamRouter(django_application)
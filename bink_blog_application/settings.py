@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -45,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so its timings include every other middleware
+    'blogapp.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -53,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'blogapp.routers.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'bink_blog_application.urls'
@@ -79,14 +83,36 @@ WSGI_APPLICATION = 'bink_blog_application.wsgi.application'
 REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
+    # byte-identical to JSONRenderer, falls back to it when orjson isn't installed
+    "DEFAULT_RENDERER_CLASSES": (
+        "blogapp.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    # read-heavy views trust the token claims for their GETs, see blogapp.authentication.StatelessReadMixin
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
         'rest_framework.authentication.SessionAuthentication',
     ),
 }
 
+# blogapp specific settings, see blogapp/conf.py for the defaults
+BLOGAPP = {
+    "KEYSET_MAX_PAGE_SIZE": 100,
+    # "sharded" spreads likes of hot posts over LIKE_COUNTER_SHARDS rows,
+    # run `manage.py flush_like_counters --interval 5` next to the app when enabled
+    "LIKE_COUNTER": "direct",
+    "LIKE_COUNTER_SHARDS": 16,
+    "POST_CACHE_ALIAS": "default",
+    "POST_CACHE_TIMEOUT": 300,
+    "USER_CACHE_TTL": 60,
+}
+# 0 hashes passwords on the request threads
+if 'PASSWORD_HASH_WORKERS' in os.environ:
+    BLOGAPP['PASSWORD_HASH_WORKERS'] = int(os.environ['PASSWORD_HASH_WORKERS'])
+
+# checks passwords in the hashing process pool, see blogapp/hashing.py
 AUTHENTICATION_BACKENDS = (
-    ('django.contrib.auth.backends.ModelBackend'),
+    ('blogapp.authentication.PooledModelBackend'),
 )
 
 SIMPLE_JWT = {
@@ -119,6 +145,9 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
+
+    # revocations go to blogapp.models.RevokedToken, run `manage.py purge_tokens` daily
+    'TOKEN_REFRESH_SERIALIZER': 'blogapp.tokens.RotatingTokenRefreshSerializer',
 }
 
 # Database
@@ -127,7 +156,49 @@ SIMPLE_JWT = {
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+    }
+}
+
+# SQLite production profile, enabled with SQLITE_PRODUCTION=1 : WAL journal, relaxed fsync,
+# memory mapped reads, writers wait for the lock (and take it at BEGIN) instead of failing
+# with "database is locked", and connections are reused between requests
+if os.environ.get('SQLITE_PRODUCTION') == '1':
+    DATABASES['default'].update({
+        'ENGINE': 'blogapp.backends.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+    })
+    BLOGAPP['SQLITE_PRAGMAS'] = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+        'cache_size': -20000,
+        'temp_store': 'MEMORY',
+    }
+
+# Read replica, GET requests of the post and comment endpoints read from it when READ_REPLICAS=1.
+# Locally a second SQLite file stands in for it, e.g. a copy of db.sqlite3 or one kept in sync by litestream.
+# Otherwise the alias is the primary database under another name, nothing routes to it but tests
+# get a separate test database for it.
+DATABASES['replica'] = dict(DATABASES['default'])
+DATABASE_ROUTERS = ['blogapp.routers.ReplicaRouter']
+if os.environ.get('READ_REPLICAS') == '1':
+    DATABASES['replica']['NAME'] = os.environ.get('SQLITE_REPLICA_PATH', BASE_DIR / 'db.replica.sqlite3')
+    BLOGAPP['READ_REPLICAS'] = ['replica']
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# LocMemCache is a per-process LRU, switch to
+# "django.core.cache.backends.redis.RedisCache" with "LOCATION": "redis://..." to share it between workers
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 
@@ -16,10 +16,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from blogapp import urls as appurls
+from blogapp import async_urls
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("api-auth/", include("rest_framework.urls", namespace="rest_framework")),
+    path("api/blogapp/async/", include(async_urls)),
     path("api/blogapp/", include(appurls)),
 
 ]
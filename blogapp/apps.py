@@ -1,6 +1,22 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    from django.db import connections
+    from .search import install_search_index
+    install_search_index(connections[using])
 
 
 class BlogappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blogapp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .instrumentation import install_query_recorder
+        from .sqlite import configure_sqlite
+        post_migrate.connect(ensure_search_index, sender = self)
+        connection_created.connect(configure_sqlite)
+        connection_created.connect(install_query_recorder)
@@ -0,0 +1,10 @@
+from django.urls import path
+from .async_views import AsyncPostListAPIView, AsyncPostDetailAPIView, AsyncUserPostAPIView, AsyncCommentAPIView
+
+
+urlpatterns = [
+    path('post/', AsyncPostListAPIView.as_view(), name='async-post-list'),
+    path('post/<int:pk>/', AsyncPostDetailAPIView.as_view(), name='async-post-detail'),
+    path('post/<int:pk>/comment/', AsyncCommentAPIView.as_view(), name='async-comment'),
+    path('post/<username>/', AsyncUserPostAPIView.as_view(), name='async-user-post'),
+]
@@ -0,0 +1,168 @@
+from collections import OrderedDict
+
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+
+from .cache import aget_cached_post, acache_post, set_validators
+from .conditional import ConditionalListMixin
+from .fast_serializers import FastPostSerializer, FastCommentSerializer
+from .models import Post, Comment
+from .pagination import KeysetPagination
+from .renderers import ORJSONRenderer
+from .routers import reset_replica, use_replica
+from .serializers import PostSerializer
+
+"""
+Async versions of the read endpoints, served under api/blogapp/async/ with the same
+responses as their APIView counterparts in views.py.
+
+DRF 3.14 views are synchronous, so these are plain async Django views that reuse the DRF
+pieces which never block: Request for query_params, the stateless JWT authentication (the
+token is only decoded, no user row is read), the keyset paginator, the fast serializers and
+the renderer. Queries go through Django's async ORM, so under an ASGI server a request waiting
+on the database or a slow client costs a coroutine, not a thread.
+
+Session authentication is not supported here.
+"""
+
+
+class AsyncReadAPIView(View):
+    """
+    Arguments : Bearer access token
+    Returns : whatever get() returns, or the DRF style {"detail": ...} error for 401 / 403
+
+    Subclasses implement `async def get(self, request, ...)`, request being a DRF Request.
+    """
+    http_method_names = ['get', 'head', 'options']
+    authentication_classes = (JWTStatelessUserAuthentication,)
+    pagination_class = KeysetPagination
+    renderer = ORJSONRenderer()
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() not in self.http_method_names or request.method == 'OPTIONS':
+            return super().dispatch(request, *args, **kwargs)
+        return self.handle(request, *args, **kwargs)
+
+    async def handle(self, request, *args, **kwargs):
+        request = Request(request, authenticators = [auth() for auth in self.authentication_classes])
+        self.request = request
+        token = None
+        try:
+            if not request.user or not request.user.is_authenticated:
+                raise exceptions.NotAuthenticated()
+            token = use_replica(request)
+            return await self.get(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.error_response(request, exc)
+        finally:
+            reset_replica(token)
+
+    def render(self, data, status = status.HTTP_200_OK):
+        return HttpResponse(self.renderer.render(data), status = status, content_type = 'application/json')
+
+    def error_response(self, request, exc):
+        """
+        Renders exc like DRF's exception_handler : the detail itself when it is a dict or a list
+        (validation errors), else {"detail": ...}, with the WWW-Authenticate and Retry-After headers
+        """
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = self.render(data, status = exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            authenticator = self.authentication_classes[0]()
+            response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+            response.status_code = status.HTTP_401_UNAUTHORIZED
+        if getattr(exc, 'wait', None):
+            response['Retry-After'] = '%d' % exc.wait
+        return response
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = self.pagination_class()
+        return self._paginator
+
+    def paginated_response(self, data):
+        return self.render(OrderedDict([
+            ('next', self.paginator.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class AsyncFastListAPIView(ConditionalListMixin, AsyncReadAPIView):
+    """
+    Conditional, keyset paginated list of fast_serializer rows
+    """
+    fast_serializer_class = None
+
+    async def list_response(self, queryset, rows_queryset = None):
+        not_modified = await self.aconditional_list_response(queryset)
+        if not_modified is not None:
+            return self.set_list_validators(not_modified)
+        rows = self.fast_serializer_class.values(queryset if rows_queryset is None else rows_queryset)
+        page = await self.paginator.apaginate_queryset(rows, self.request, view = self)
+        return self.set_list_validators(self.paginated_response(self.fast_serializer_class(page).data))
+
+
+class AsyncPostListAPIView(AsyncFastListAPIView):
+    """
+    Returns : Page of Posts (newest first), as PostListAPIView
+    """
+    fast_serializer_class = FastPostSerializer
+    validator_fields = ('like_count', 'comment_count')
+
+    async def get(self, request, *args, **kwargs):
+        posts = Post.objects.all()
+        return await self.list_response(posts, posts.with_like_count())
+
+
+class AsyncPostDetailAPIView(AsyncReadAPIView):
+    """
+    Returns : specific post details, as PostDetailAPIView (same post cache, ETag and Last-Modified)
+    """
+
+    async def get(self, request, pk, *args, **kwargs):
+        entry = await aget_cached_post(pk)
+        if entry is None:
+            try:
+                post = await Post.objects.with_like_count().aget(pk = pk)
+            except Post.DoesNotExist:
+                return self.render({'error': 'Post not found'}, status = status.HTTP_404_NOT_FOUND)
+            entry = await acache_post(post, PostSerializer(post).data)
+        not_modified = get_conditional_response(request, etag = entry['etag'], last_modified = entry['last_modified'])
+        if not_modified is not None:
+            return set_validators(not_modified, entry)
+        return set_validators(self.render(entry['data']), entry)
+
+
+class AsyncUserPostAPIView(AsyncFastListAPIView):
+    """
+    Returns : Page of posts made by the specific user (newest first), as UserPostAPIView
+    """
+    fast_serializer_class = FastPostSerializer
+    validator_fields = ('like_count', 'comment_count')
+
+    async def get(self, request, username, *args, **kwargs):
+        user_id = await User.objects.filter(username = username).values_list('id', flat = True).afirst()
+        if user_id is None:
+            return self.render({'error': 'User not found'}, status = status.HTTP_404_NOT_FOUND)
+        posts = Post.objects.filter(user_id = user_id)
+        return await self.list_response(posts, posts.with_like_count())
+
+
+class AsyncCommentAPIView(AsyncFastListAPIView):
+    """
+    Returns : Page of the post's comments (newest first), as CommentAPIView.get
+    """
+    fast_serializer_class = FastCommentSerializer
+    last_modified_field = 'created'
+    validator_fields = ('reply_count',)
+
+    async def get(self, request, pk, *args, **kwargs):
+        if not await Post.objects.filter(pk = pk).aexists():
+            return self.render({'error': 'Post not found'}, status = status.HTTP_404_NOT_FOUND)
+        return await self.list_response(Comment.objects.filter(post_id = pk))
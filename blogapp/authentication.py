@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .conf import blogapp_settings
+from .hashing import hash_password, verify_password
+
+"""
+JWT authentication without a User query per request.
+
+JWTAuthentication (the default in settings) loads the User row of every request, so a deactivated
+user is locked out at once. Read-heavy views opt out of that for their safe requests with
+StatelessReadMixin : rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication builds
+a TokenUser from the validated claims, MyTokenObtainPairSerializer embeds user_id, username,
+is_staff and is_superuser at issue time, so nothing is read from the database. A user deactivated
+meanwhile can still read until the access token expires (ACCESS_TOKEN_LIFETIME), writes go through
+the default classes.
+
+Views that need the real User model on every request can use CachedUserJWTAuthentication, which
+keeps looked up users in a small per-process TTL cache.
+
+"""
+
+
+class UserCache:
+    """
+    Per-process cache of User instances, entries expire after ttl seconds and the oldest
+    entry is evicted above max_entries. Saving or deleting a user drops it (blogapp/signals.py).
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            return user
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + blogapp_settings.USER_CACHE_TTL, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > blogapp_settings.USER_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last = False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedUserJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that looks each user up at most once per USER_CACHE_TTL seconds per process
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        user = user_cache.get(user_id) if user_id is not None else None
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user)
+        return user
+
+
+class StatelessReadMixin:
+    """
+    Authenticates the safe requests of a view from the token claims alone, see the module docstring
+    """
+    read_authentication_classes = (JWTStatelessUserAuthentication, SessionAuthentication)
+
+    def initialize_request(self, request, *args, **kwargs):
+        self.safe_request = request.method in SAFE_METHODS
+        return super().initialize_request(request, *args, **kwargs)
+
+    def get_authenticators(self):
+        if getattr(self, 'safe_request', False):
+            return [auth() for auth in self.read_authentication_classes]
+        return super().get_authenticators()
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend checking passwords in the hashing pool (see blogapp/hashing.py),
+    outdated hashes are replaced by a rehash with the current hasher on a successful login
+    """
+
+    def authenticate(self, request, username = None, password = None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # hash anyway, so the response time doesn't tell whether the user exists
+            hash_password(password)
+            return None
+        valid, rehashed = verify_password(password, user.password)
+        if not valid or not self.user_can_authenticate(user):
+            return None
+        if rehashed:
+            user.password = rehashed
+            UserModel._default_manager.filter(pk = user.pk).update(password = rehashed)
+        return user
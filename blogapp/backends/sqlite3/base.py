@@ -0,0 +1,34 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+"""
+The stock SQLite backend plus OPTIONS['transaction_mode'] (same name and values as Django 5.1).
+
+Django opens transactions with a plain (deferred) BEGIN, so a transaction that reads before
+it writes has to upgrade its lock midway, and SQLite fails that upgrade with "database is
+locked" straight away instead of waiting out the busy timeout. With 'IMMEDIATE' the write lock
+is taken at BEGIN, where the busy timeout applies.
+
+"""
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    transaction_mode = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        transaction_mode = params.pop('transaction_mode', None)
+        if transaction_mode is not None and transaction_mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                "DATABASES['%s']['OPTIONS']['transaction_mode'] must be one of %s"
+                % (self.alias, ', '.join(TRANSACTION_MODES))
+            )
+        self.transaction_mode = transaction_mode.upper() if transaction_mode else None
+        return params
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            return super()._start_transaction_under_autocommit()
+        self.cursor().execute('BEGIN %s' % self.transaction_mode)
@@ -0,0 +1,251 @@
+import json
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Q
+
+from .cache import invalidate_post
+from .conf import blogapp_settings
+from .feed import fan_out_posts
+from .models import Comment, Post, TrendingScore
+from .stats import add_to_stats
+from .trending import log_weight
+
+"""
+Bulk import and export of posts as JSON Lines, one JSON object per line.
+
+    {"title": "...", "body": "...", "user": "<username>", "comments": [{"body": "...", "user": "<username>"}]}
+    {"type": "comment", "post": <existing post id>, "body": "...", "user": "<username>"}
+
+"type" defaults to "post", "user" defaults to the importing user and nested comments get the id
+of the post they are nested in. Lines are validated and inserted chunk by chunk with bulk_create,
+each chunk in its own transaction, so memory stays constant whatever the size of the input.
+bulk_create sends no signals, so each chunk also does in bulk what the post_save receivers do
+for a single post : the feeds of the followers, the author's counters and the trending score.
+
+"""
+
+TITLE_MAX_LENGTH = Post._meta.get_field('title').max_length
+
+
+class ImportResult:
+    """
+    Counts every rejected line but only keeps the first max_errors of them,
+    so a bad input of any size can't fill the memory with its errors
+    """
+
+    def __init__(self, max_errors = 100):
+        self.posts = 0
+        self.comments = 0
+        self.error_count = 0
+        self.max_errors = max_errors
+        self.errors = []
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        return {
+            'posts': self.posts,
+            'comments': self.comments,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+def parse_lines(lines):
+    """
+    Yields (line number, record or None, error message or None), skipping blank lines
+    """
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line.decode('utf-8') if isinstance(line, bytes) else line)
+        except UnicodeDecodeError as exc:
+            yield number, None, 'Invalid UTF-8: %s' % exc
+            continue
+        except ValueError as exc:
+            yield number, None, 'Invalid JSON: %s' % exc
+            continue
+        if not isinstance(record, dict):
+            yield number, None, 'Expected a JSON object'
+            continue
+        yield number, record, None
+
+
+def check_text(record, field, max_length = None):
+    value = record.get(field)
+    if not isinstance(value, str) or not value.strip():
+        return '"%s" must be a non-empty string' % field
+    if max_length and len(value) > max_length:
+        return '"%s" must have at most %d characters' % (field, max_length)
+    return None
+
+
+def post_reference(record):
+    # json gives true / false as bool, a subclass of int
+    post_id = record.get('post')
+    return post_id if type(post_id) is int else None
+
+
+def import_chunk(chunk, default_user_id, allow_user, result):
+    """
+    Validates one chunk of parsed lines with one query per referenced table and inserts it
+    """
+    usernames, post_ids = set(), set()
+    for _, record, _ in chunk:
+        if record is None:
+            continue
+        if allow_user:
+            usernames.add(record.get('user'))
+            usernames.update(comment.get('user') for comment in record.get('comments') or [] if isinstance(comment, dict))
+        if record.get('type') == 'comment':
+            post_ids.add(post_reference(record))
+    usernames.discard(None)
+    post_ids.discard(None)
+    user_ids = dict(User.objects.filter(username__in = usernames).values_list('username', 'id')) if usernames else {}
+    existing_posts = set(Post.objects.filter(pk__in = post_ids).values_list('pk', flat = True)) if post_ids else set()
+
+    def resolve_user(record):
+        username = record.get('user') if allow_user else None
+        if username is None:
+            return default_user_id
+        return user_ids.get(username)
+
+    posts, nested, comments = [], [], []
+    for number, record, error in chunk:
+        if error:
+            result.error(number, error)
+            continue
+        kind = record.get('type', 'post')
+        user_id = resolve_user(record)
+        if user_id is None:
+            result.error(number, 'Unknown user "%s"' % record.get('user'))
+            continue
+
+        if kind == 'comment':
+            error = check_text(record, 'body')
+            if error is None and post_reference(record) not in existing_posts:
+                error = 'Unknown post %r' % record.get('post')
+            if error:
+                result.error(number, error)
+                continue
+            comments.append(Comment(user_id = user_id, post_id = record['post'], body = record['body']))
+            continue
+
+        if kind != 'post':
+            result.error(number, 'Unknown type "%s"' % kind)
+            continue
+        error = check_text(record, 'title', TITLE_MAX_LENGTH) or check_text(record, 'body')
+        post_comments = []
+        for comment in record.get('comments') or []:
+            if error:
+                break
+            if not isinstance(comment, dict):
+                error = 'Comments must be JSON objects'
+                break
+            comment_user_id = resolve_user(comment)
+            error = check_text(comment, 'body') or (
+                'Unknown user "%s"' % comment.get('user') if comment_user_id is None else None
+            )
+            post_comments.append(Comment(user_id = comment_user_id, body = comment.get('body')))
+        if error:
+            result.error(number, error)
+            continue
+        posts.append(Post(user_id = user_id, title = record['title'], body = record['body'], comment_count = len(post_comments)))
+        nested.append(post_comments)
+
+    added = {}
+    for comment in comments:
+        added[comment.post_id] = added.get(comment.post_id, 0) + 1
+
+    with transaction.atomic():
+        # comments on existing posts, nested ones are counted in comment_count already
+        for post_id, count in sorted(added.items()):
+            Post.objects.filter(pk = post_id).update(comment_count = F('comment_count') + count)
+            invalidate_post(post_id)
+        # primary keys come back from bulk_create on PostgreSQL and SQLite 3.35+
+        Post.objects.bulk_create(posts)
+        authors = {}
+        for post in posts:
+            authors[post.user_id] = authors.get(post.user_id, 0) + 1
+        for user_id, count in sorted(authors.items()):
+            add_to_stats(user_id, post_count = count)
+        fan_out_posts(posts)
+        TrendingScore.objects.bulk_create([TrendingScore(post_id = post.pk, score = log_weight('post', post.created)) for post in posts])
+        for post, post_comments in zip(posts, nested):
+            for comment in post_comments:
+                comment.post_id = post.pk
+            comments.extend(post_comments)
+        Comment.objects.bulk_create(comments)
+    result.posts += len(posts)
+    result.comments += len(comments)
+
+
+def import_posts(lines, default_user_id, allow_user = False, chunk_size = None, max_errors = 100):
+    """
+    Arguments : iterable of JSON lines (str or bytes), id of the user owning records without "user",
+                whether records may name their "user", number of lines per transaction (BLOGAPP['BULK_CHUNK_SIZE']),
+                number of rejected lines reported with their reason
+    Returns : ImportResult
+    """
+    chunk_size = chunk_size or blogapp_settings.BULK_CHUNK_SIZE
+    result = ImportResult(max_errors)
+    parsed = parse_lines(lines)
+    while True:
+        chunk = list(islice(parsed, chunk_size))
+        if not chunk:
+            return result
+        import_chunk(chunk, default_user_id, allow_user, result)
+
+
+def iter_comments(post_ids, chunk_size):
+    """
+    Yields the comments of post_ids ordered by post and primary key, reading chunk_size of them per query
+    """
+    last_post_id, last_id = 0, 0
+    while True:
+        comments = list(
+            Comment.objects.filter(post_id__in = post_ids)
+            .filter(Q(post_id__gt = last_post_id) | Q(post_id = last_post_id, pk__gt = last_id))
+            .order_by('post_id', 'pk').values('id', 'post_id', 'body', 'created', 'user__username')[:chunk_size]
+        )
+        if not comments:
+            return
+        yield from comments
+        last_post_id, last_id = comments[-1]['post_id'], comments[-1]['id']
+
+
+def export_posts(queryset = None, chunk_size = None):
+    """
+    Yields one JSON line per post with its comments nested, in the import format.
+    Posts are read in primary key ranges of chunk_size and their comments in keyset pages of chunk_size,
+    so only one post's comments are held at a time.
+    """
+    queryset = Post.objects.all() if queryset is None else queryset
+    chunk_size = chunk_size or blogapp_settings.BULK_CHUNK_SIZE
+    encoder = DjangoJSONEncoder(ensure_ascii = False)
+    last_id = 0
+    while True:
+        posts = list(
+            queryset.filter(pk__gt = last_id).order_by('pk')
+            .values('id', 'title', 'body', 'created', 'updated', 'like_count', 'user__username')[:chunk_size]
+        )
+        if not posts:
+            return
+        # both are ordered by post id, so the comments of each post come next in the stream
+        comments = iter_comments([post['id'] for post in posts], chunk_size)
+        comment = next(comments, None)
+        for post in posts:
+            post['user'] = post.pop('user__username')
+            post['comments'] = []
+            while comment is not None and comment['post_id'] == post['id']:
+                post['comments'].append({'body': comment['body'], 'created': comment['created'], 'user': comment['user__username']})
+                comment = next(comments, None)
+            yield encoder.encode(post) + '\n'
+        last_id = posts[-1]['id']
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta, timezone
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import http_date, quote_etag
+
+from .conf import blogapp_settings
+from .routers import current_replica
+
+"""
+Read-through cache of serialized posts for PostDetailAPIView.
+
+Entries live in the Django cache named by BLOGAPP['POST_CACHE_ALIAS'], so the backend is whatever
+CACHES configures for it (LocMemCache is a per-process LRU, RedisCache is shared by all workers).
+Entries are dropped from post_save / post_delete signals (blogapp/signals.py) and by every write
+that bypasses them, e.g. the like toggle.
+
+"""
+
+EPOCH = datetime(1970, 1, 1, tzinfo = timezone.utc)
+
+
+def get_post_cache():
+    return caches[blogapp_settings.POST_CACHE_ALIAS]
+
+
+def post_cache_key(pk):
+    return 'blogapp:post:%s' % pk
+
+
+def to_micros(updated):
+    # integer arithmetic, a float timestamp can be a microsecond off
+    return (updated - EPOCH) // timedelta(microseconds = 1)
+
+
+def from_micros(micros):
+    return EPOCH + timedelta(microseconds = micros)
+
+
+def post_etag(updated, like_count, comment_count):
+    """
+    Returns : strong ETag of a post representation, "<updated in microseconds>.<like count>.<comment count>"
+
+    Only the first part changes with an edit, If-Match on PUT compares that one (see blogapp/edits.py)
+    so a like in between doesn't fail an edit.
+    """
+    return quote_etag('%d.%d.%d' % (to_micros(updated), like_count, comment_count))
+
+
+def get_cached_post(pk):
+    return get_post_cache().get(post_cache_key(pk))
+
+
+def make_post_entry(post, data):
+    return {
+        'data': dict(data),
+        'etag': post_etag(post.updated, data['like_count'], data['comment_count']),
+        'last_modified': int(post.updated.timestamp()),
+    }
+
+
+def get_post_cache_timeout():
+    timeout = blogapp_settings.POST_CACHE_TIMEOUT
+    if current_replica() is not None:
+        # a lagging replica may have served a row older than the last invalidation
+        timeout = min(timeout, blogapp_settings.REPLICA_PIN_SECONDS)
+    return timeout
+
+
+def cache_post(post, data):
+    """
+    Arguments : Post instance, its serialized data
+    Returns : the cache entry, {"data", "etag", "last_modified"}
+    """
+    entry = make_post_entry(post, data)
+    get_post_cache().set(post_cache_key(post.pk), entry, get_post_cache_timeout())
+    return entry
+
+
+async def aget_cached_post(pk):
+    return await get_post_cache().aget(post_cache_key(pk))
+
+
+async def acache_post(post, data):
+    entry = make_post_entry(post, data)
+    await get_post_cache().aset(post_cache_key(post.pk), entry, get_post_cache_timeout())
+    return entry
+
+
+def invalidate_post(pk):
+    """
+    Drops the cached post now and again once the surrounding transaction commits,
+    so a reader that loaded the old row just before the commit can't keep it cached.
+    """
+    key = post_cache_key(pk)
+    get_post_cache().delete(key)
+    transaction.on_commit(lambda: get_post_cache().delete(key))
+
+
+def set_validators(response, entry):
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    return response
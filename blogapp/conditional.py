@@ -0,0 +1,90 @@
+import hashlib
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .pagination import KeysetPagination
+
+"""
+Conditional GET for list endpoints.
+
+The ETag of a listing is computed by one query, so a polling client whose copy is still
+current gets a 304 before any page is serialized. On keyset paginated views that query reads
+the requested page itself, with the same index seek and LIMIT, but only the primary key,
+last_modified_field and validator_fields of its rows, and the ETag hashes them in order : a
+post added, deleted (soft deletes don't touch "updated") or edited on the page, or a changed
+counter, changes it, and a poll costs the page size whatever the size of the listing. Other
+views hash one aggregate over the whole queryset (latest change, row count, sums of the
+validator_fields).
+
+Lists only send an ETag. A like or a delete changes a listing without changing the latest
+"updated" of its rows, so a Last-Modified built from it would keep answering 304 to
+If-Modified-Since for a stale copy.
+
+"""
+
+
+class ConditionalListMixin:
+    """
+    Arguments : last_modified_field, validator_fields (counters whose changes change the ETag)
+    Returns : 304 from conditional_list_response() when If-None-Match matches,
+              an ETag header on every answered list
+    """
+    last_modified_field = 'updated'
+    validator_fields = ()
+
+    def make_list_etag(self, stats):
+        # the full path keeps different pages, cursors and queries apart
+        digest = hashlib.md5(repr((self.request.get_full_path(), stats)).encode()).hexdigest()
+        return quote_etag(digest)
+
+    def get_validator_aggregates(self):
+        return dict(
+            last_modified = Max(self.last_modified_field),
+            count = Count('pk'),
+            **{field: Sum(field) for field in self.validator_fields}
+        )
+
+    def get_page_validator_rows(self, queryset):
+        """
+        Returns : None when the view isn't keyset paginated, else the queryset of the requested page
+                  plus the row telling whether there is a next page, as
+                  (pk, last_modified_field, *validator_fields) tuples in page order
+        """
+        paginator = getattr(self, 'paginator', None)
+        if not isinstance(paginator, KeysetPagination):
+            return None
+        page = paginator.get_page_queryset(queryset, self.request)
+        return page.values_list('pk', self.last_modified_field, *self.validator_fields)
+
+    def get_list_etag(self, queryset):
+        rows = self.get_page_validator_rows(queryset)
+        if rows is None:
+            return self.make_list_etag(sorted(queryset.order_by().aggregate(**self.get_validator_aggregates()).items()))
+        return self.make_list_etag(list(rows))
+
+    async def aget_list_etag(self, queryset):
+        rows = self.get_page_validator_rows(queryset)
+        if rows is None:
+            stats = await queryset.order_by().aaggregate(**self.get_validator_aggregates())
+            return self.make_list_etag(sorted(stats.items()))
+        return self.make_list_etag([row async for row in rows])
+
+    def conditional_list_response(self, queryset):
+        self.list_etag = self.get_list_etag(queryset)
+        return get_conditional_response(self.request, etag = self.list_etag)
+
+    async def aconditional_list_response(self, queryset):
+        self.list_etag = await self.aget_list_etag(queryset)
+        return get_conditional_response(self.request, etag = self.list_etag)
+
+    def set_list_validators(self, response):
+        etag = getattr(self, 'list_etag', None)
+        if etag and response.status_code in (200, 304):
+            response['ETag'] = etag
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        return self.set_list_validators(response)
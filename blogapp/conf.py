@@ -0,0 +1,81 @@
+from django.conf import settings
+
+"""
+Settings for blogapp are all namespaced in the BLOGAPP setting, for example:
+
+BLOGAPP = {
+    'KEYSET_MAX_PAGE_SIZE': 50,
+}
+
+Values are looked up on every access so override_settings() works in tests.
+"""
+
+DEFAULTS = {
+    # Keyset pagination; None falls back to REST_FRAMEWORK['PAGE_SIZE']
+    'KEYSET_PAGE_SIZE': None,
+    'KEYSET_MAX_PAGE_SIZE': 100,
+    # 'direct' or 'sharded', see blogapp/counters.py
+    'LIKE_COUNTER': 'direct',
+    'LIKE_COUNTER_SHARDS': 16,
+    # Replies embedded under each comment of a comment thread page
+    'THREAD_REPLIES_PAGE_SIZE': 5,
+    # Serialized post cache of PostDetailAPIView, an alias of CACHES
+    'POST_CACHE_ALIAS': 'default',
+    'POST_CACHE_TIMEOUT': 300,
+    # Per-process user cache of CachedUserJWTAuthentication
+    'USER_CACHE_TTL': 60,
+    'USER_CACHE_MAX_ENTRIES': 10000,
+    # Lines per transaction of the JSON Lines import, posts per query of the export
+    'BULK_CHUNK_SIZE': 1000,
+    # PRAGMAs run on every new SQLite connection, see blogapp/sqlite.py
+    'SQLITE_PRAGMAS': {},
+    # Aliases of DATABASES that safe requests may read from, see blogapp/routers.py
+    'READ_REPLICAS': [],
+    'REPLICA_PIN_SECONDS': 10,
+    # Post activity streams, see blogapp/events.py and blogapp/sse.py
+    'EVENT_BROKER': 'local',
+    'EVENT_BROKER_URL': None,
+    'EVENT_QUEUE_SIZE': 100,
+    'EVENT_HEARTBEAT': 15,
+    # Home feed, authors with FEED_FANOUT_LIMIT followers or more are merged in on read,
+    # following someone copies their FEED_BACKFILL latest posts into the feed
+    'FEED_FANOUT_LIMIT': 10000,
+    'FEED_BACKFILL': 20,
+    # Trending posts, see blogapp/trending.py; an event's weight halves every TRENDING_HALF_LIFE
+    # seconds, refresh_trending ranks the TRENDING_SIZE best scores
+    'TRENDING_HALF_LIFE': 6 * 60 * 60,
+    'TRENDING_WEIGHTS': {'post': 1.0, 'like': 1.0, 'comment': 3.0, 'reply': 2.0},
+    'TRENDING_SIZE': 1000,
+    # Token bucket throttles of the write endpoints, "<N>/<s|min|hour|day>" per throttle_scope,
+    # see blogapp/throttling.py
+    'THROTTLE_STORE': 'local',
+    'THROTTLE_STORE_URL': None,
+    'THROTTLE_RATES': {'like': '120/min', 'comment': '30/min', 'reply': '30/min', 'signup': '20/hour'},
+    'THROTTLE_ENDPOINT_RATES': {},
+    'THROTTLE_MAX_ENTRIES': 100000,
+    # Request metrics, see blogapp/instrumentation.py; share of the requests measured (0 to 1),
+    # Server-Timing header on them, bearer token of the Prometheus scraper (staff only when None)
+    'METRICS_SAMPLE_RATE': 1.0,
+    'METRICS_SERVER_TIMING': True,
+    'METRICS_TOKEN': None,
+    # Revoked refresh token jtis remembered per process, see blogapp/tokens.py
+    'REVOKED_TOKEN_CACHE_SIZE': 10000,
+    # Password hashing processes (None : half the CPUs, 0 : hash on the request thread), jobs queued
+    # per process before callers wait, seconds they wait before a 503, see blogapp/hashing.py
+    'PASSWORD_HASH_WORKERS': None,
+    'PASSWORD_HASH_QUEUE_SIZE': 16,
+    'PASSWORD_HASH_QUEUE_TIMEOUT': 2,
+}
+
+
+class BlogappSettings:
+    def __init__(self, defaults):
+        self.defaults = defaults
+
+    def __getattr__(self, attr):
+        if attr not in self.defaults:
+            raise AttributeError("Invalid blogapp setting: '%s'" % attr)
+        return getattr(settings, 'BLOGAPP', {}).get(attr, self.defaults[attr])
+
+
+blogapp_settings = BlogappSettings(DEFAULTS)
@@ -0,0 +1,173 @@
+import random
+from collections import defaultdict
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .conf import blogapp_settings
+from .models import LikeCounterShard, Post
+from .stats import add_to_author_stats, add_to_stats
+from .trending import record_activity
+
+"""
+Denormalized counters (e.g. Post.like_count) are updated in place with F() expressions,
+this module holds the like counter backends and the helpers that recompute counters from the source rows.
+
+The like counter backend is picked with BLOGAPP['LIKE_COUNTER'] :
+    'direct'  : every like updates Post.like_count
+    'sharded' : every like updates one of BLOGAPP['LIKE_COUNTER_SHARDS'] LikeCounterShard rows,
+                flush_like_counters folds them into Post.like_count on an interval
+Both carry every change of Post.like_count over to UserProfileStats.like_count of the author
+and to the post's TrendingScore.
+
+"""
+
+
+class DirectLikeCounter:
+    """
+    Keeps the count on the Post row, every like of a post serializes on that row lock
+    """
+
+    def add(self, post_id, delta):
+        """
+        Returns : False when the post does not exist
+        """
+        if not Post.objects.filter(pk = post_id).update(like_count = F('like_count') + delta):
+            return False
+        add_to_author_stats(post_id, like_count = delta)
+        record_activity(post_id, 'like', count = delta)
+        return True
+
+    def annotate(self, queryset):
+        return queryset
+
+    def value(self, post):
+        return post.like_count
+
+    def flush(self, batch_size = 1000):
+        return 0
+
+
+class ShardedLikeCounter(DirectLikeCounter):
+    """
+    Spreads pending likes over several rows per post, readers add the pending deltas on top
+    of Post.like_count so the value they see is exact, only the Post row itself lags behind
+    """
+
+    def __init__(self, shards = None):
+        self.shards = shards or blogapp_settings.LIKE_COUNTER_SHARDS
+
+    def add(self, post_id, delta):
+        shard = random.randrange(self.shards)
+        # the shard row of a soft deleted post outlives it until the next flush
+        rows = LikeCounterShard.objects.filter(post_id = post_id, shard = shard, post__is_deleted = False)
+        if rows.update(delta = F('delta') + delta):
+            return True
+        if not Post.objects.filter(pk = post_id).exists():
+            return False
+        try:
+            with transaction.atomic():
+                LikeCounterShard.objects.create(post_id = post_id, shard = shard, delta = delta)
+        except IntegrityError:
+            # another like created the same shard row in between
+            rows.update(delta = F('delta') + delta)
+        return True
+
+    def pending(self):
+        return Coalesce(
+            Subquery(
+                LikeCounterShard.objects.filter(post = OuterRef('pk'))
+                .order_by().values('post').annotate(total = Sum('delta')).values('total'),
+                output_field = IntegerField(),
+            ),
+            0,
+        )
+
+    def annotate(self, queryset):
+        return queryset.annotate(pending_likes = self.pending())
+
+    def value(self, post):
+        pending = getattr(post, 'pending_likes', None)
+        if pending is None:
+            pending = post.like_shards.aggregate(total = Sum('delta'))['total'] or 0
+        return post.like_count + pending
+
+    def flush(self, batch_size = 1000):
+        """
+        Folds pending shard rows into Post.like_count
+        Returns : number of shard rows flushed
+        """
+        flushed = 0
+        while True:
+            with transaction.atomic():
+                shards = list(
+                    LikeCounterShard.objects.select_for_update().order_by('pk')
+                    .values_list('pk', 'post_id', 'delta')[:batch_size]
+                )
+                totals = defaultdict(int)
+                for _, post_id, delta in shards:
+                    totals[post_id] += delta
+                authors = defaultdict(int)
+                for post_id, user_id in Post.objects.filter(pk__in = list(totals)).values_list('pk', 'user_id'):
+                    authors[user_id] += totals[post_id]
+                for post_id, total in totals.items():
+                    if total:
+                        Post.objects.filter(pk = post_id).update(like_count = F('like_count') + total)
+                        record_activity(post_id, 'like', count = total)
+                for user_id, total in sorted(authors.items()):
+                    if total:
+                        add_to_stats(user_id, like_count = total)
+                LikeCounterShard.objects.filter(pk__in = [pk for pk, _, _ in shards]).delete()
+            flushed += len(shards)
+            if len(shards) < batch_size:
+                return flushed
+
+
+LIKE_COUNTERS = {
+    'direct': DirectLikeCounter,
+    'sharded': ShardedLikeCounter,
+}
+
+
+def get_like_counter():
+    try:
+        return LIKE_COUNTERS[blogapp_settings.LIKE_COUNTER]()
+    except KeyError:
+        raise ImproperlyConfigured(
+            "BLOGAPP['LIKE_COUNTER'] must be one of %s" % ', '.join(LIKE_COUNTERS)
+        )
+
+
+def reconcile_count(model, field, related_model, related_field, batch_size = 10000):
+    """
+    Arguments : model holding the counter, counter field name,
+                model whose rows are counted, name of its FK pointing at model
+    Returns : number of rows whose counter was wrong and got fixed
+
+    Walks model in primary key ranges of batch_size so every UPDATE stays short,
+    and only rewrites the rows whose stored value drifted.
+    """
+    actual = Coalesce(
+        Subquery(
+            related_model.objects.filter(**{related_field: OuterRef('pk')})
+            .order_by().values(related_field).annotate(total = Count('pk')).values('total'),
+            output_field = IntegerField(),
+        ),
+        0,
+    )
+    ids = model.objects.order_by('pk').values_list('pk', flat = True)
+    first, last = ids.first(), ids.last()
+    fixed = 0
+    if first is None:
+        return fixed
+    for start in range(first, last + 1, batch_size):
+        with transaction.atomic():
+            drifted = (
+                model.objects.filter(pk__gte = start, pk__lt = start + batch_size)
+                .annotate(actual = actual).exclude(**{field: actual})
+                .values_list('pk', flat = True)
+            )
+            fixed += model.objects.filter(pk__in = list(drifted)).update(**{field: actual})
+    return fixed
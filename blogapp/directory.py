@@ -0,0 +1,42 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+
+"""
+User directory : users in username order with their profile summary.
+
+A page is one range read of the unique index on auth_user.username joined to UserProfileStats
+by primary key, so its cost depends on the page size only. A username prefix becomes a range
+on the same index (username >= 'ab' AND username < 'ac'), which SQLite can seek where it
+can't with LIKE, and PostgreSQL serves from the varchar_pattern_ops index Django adds next
+to unique CharFields.
+
+"""
+
+SUMMARY_FIELDS = ('post_count', 'like_count', 'follower_count', 'following_count')
+
+
+def prefix_filter(field, prefix):
+    """
+    Returns : Q matching the values of field starting with prefix (case sensitive)
+    """
+    condition = Q(**{'%s__startswith' % field: prefix, '%s__gte' % field: prefix})
+    last = ord(prefix[-1])
+    if last < sys.maxunicode:
+        condition &= Q(**{'%s__lt' % field: prefix[:-1] + chr(last + 1)})
+    return condition
+
+
+def directory_queryset(prefix = None):
+    """
+    Arguments : username prefix or None for every user
+    Returns : .values() queryset of id, username and the summary counters, 0 for users without stats
+    """
+    queryset = User.objects.filter(is_active = True)
+    if prefix:
+        queryset = queryset.filter(prefix_filter('username', prefix))
+    return queryset.annotate(
+        **{name: Coalesce('stats__%s' % name, 0) for name in SUMMARY_FIELDS}
+    ).values('id', 'username', *SUMMARY_FIELDS)
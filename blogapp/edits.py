@@ -0,0 +1,61 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from django.utils.http import parse_etags
+
+from .cache import from_micros, invalidate_post
+from .models import Post
+
+"""
+Post edits as one conditional UPDATE, then the row read back by primary key.
+
+    UPDATE blogapp_post SET title = ?, updated = ?
+    WHERE id = ? AND user_id = ? AND is_deleted = false [AND updated IN (<If-Match versions>)]
+
+Only the fields sent are written, so an edit can't overwrite like_count or comment_count
+with what it read earlier, and the ownership check and the version check are the same
+statement as the write. When no row matches, one more query tells the caller why.
+
+A client sends the ETag it got from GET in If-Match, the edit only applies if the post was
+not edited since. The version is the "updated" part of the ETag (see post_etag()), likes and
+comments change the rest and don't conflict with an edit.
+
+"""
+
+
+def parse_if_match(header):
+    """
+    Returns : None when any version is fine (no header or "*"),
+              otherwise the list of "updated" values the client accepts (empty when none parse)
+    """
+    if header is None:
+        return None
+    etags = parse_etags(header)
+    if etags == ['*']:
+        return None
+    versions = []
+    for etag in etags:
+        # weak ETags never match for If-Match
+        if etag.startswith('W/'):
+            continue
+        try:
+            versions.append(from_micros(int(etag.strip('"').split('.')[0])))
+        except (ValueError, OverflowError):
+            continue
+    return versions
+
+
+def update_post(pk, user_id, changes, versions = None, using = DEFAULT_DB_ALIAS):
+    """
+    Arguments : post id, id of the user editing it, {field name: new value},
+                accepted "updated" values from parse_if_match() or None for any
+    Returns : the updated Post, None when the post doesn't exist, isn't the user's or was edited since
+    """
+    if versions is not None and not versions:
+        return None
+    rows = Post.objects.using(using).filter(pk = pk, user_id = user_id)
+    if versions:
+        rows = rows.filter(updated__in = versions)
+    if not rows.update(**dict(changes, updated = timezone.now())):
+        return None
+    invalidate_post(pk)
+    return Post.objects.using(using).get(pk = pk)
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .conf import blogapp_settings
+
+"""
+In-process publish / subscribe of post activity for the event streams (blogapp/sse.py).
+
+Events are published on the channel of their post ("post:<pk>") and on the global feed
+("posts") once the transaction that produced them commits. Every message is encoded once,
+whatever the number of subscribers, and every subscriber gets a queue of at most
+BLOGAPP['EVENT_QUEUE_SIZE'] messages. A subscriber that falls behind loses the backlog
+and gets a "resync" event telling the client to refetch instead.
+
+BLOGAPP['EVENT_BROKER'] picks the backend :
+    'local' : subscribers of this process only
+    'redis' : messages go through Redis pub/sub (BLOGAPP['EVENT_BROKER_URL']) so every
+              process, including the WSGI workers that handle the writes, reaches every subscriber
+
+"""
+
+GLOBAL_CHANNEL = 'posts'
+
+
+def post_channel(post_id):
+    return 'post:%s' % post_id
+
+
+def encode_event(event, data):
+    """
+    Returns : the Server-Sent Events message, as bytes
+    """
+    return ('event: %s\ndata: %s\n\n' % (event, json.dumps(data, cls = DjangoJSONEncoder))).encode()
+
+
+RESYNC_MESSAGE = encode_event('resync', {})
+
+
+class Subscription:
+    """
+    Bounded queue of encoded messages, owned by the event loop of its connection
+    """
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.lagged = False
+
+    def push(self, message):
+        # always runs on self.loop
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    async def get(self):
+        message = await self.queue.get()
+        if self.lagged:
+            self.lagged = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return RESYNC_MESSAGE
+        return message
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    def __init__(self):
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, blogapp_settings.EVENT_QUEUE_SIZE)
+        with self.lock:
+            self.subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.channel, None)
+
+    def has_subscribers(self, channel):
+        return bool(self.subscriptions.get(channel))
+
+    def deliver(self, channel, message):
+        """
+        Hands message to the subscribers of this process, safe to call from any thread
+        """
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, message)
+            except RuntimeError:
+                # the loop of the connection is gone
+                self.unsubscribe(subscription)
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+
+class RedisBroker(LocalBroker):
+    """
+    Publishes through Redis, a listener thread delivers what any process published to local subscribers
+    """
+    prefix = 'blogapp:events:'
+
+    def __init__(self, url):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("BLOGAPP['EVENT_BROKER'] = 'redis' needs the redis package")
+        self.client = redis.Redis.from_url(url)
+        self.listener = None
+
+    def subscribe(self, channel):
+        if self.listener is None:
+            with self.lock:
+                if self.listener is None:
+                    self.listener = threading.Thread(target = self.listen, daemon = True)
+                    self.listener.start()
+        return super().subscribe(channel)
+
+    def listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages = True)
+        pubsub.psubscribe(self.prefix + '*')
+        for item in pubsub.listen():
+            channel = item['channel'].decode()[len(self.prefix):]
+            self.deliver(channel, item['data'])
+
+    def has_subscribers(self, channel):
+        # they may be in any process
+        return True
+
+    def publish(self, channel, message):
+        self.client.publish(self.prefix + channel, message)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = blogapp_settings.EVENT_BROKER
+                if backend == 'local':
+                    _broker = LocalBroker()
+                elif backend == 'redis':
+                    _broker = RedisBroker(blogapp_settings.EVENT_BROKER_URL)
+                else:
+                    raise ImproperlyConfigured("BLOGAPP['EVENT_BROKER'] must be one of local, redis")
+    return _broker
+
+
+def publish_post_event(post_id, event, data):
+    """
+    Arguments : post id, event name ("like", "comment", "reply"),
+                JSON serializable data or a callable returning it once the transaction committed
+    Publishes on the post's channel and on the global feed after the current transaction commits
+    """
+    def publish():
+        broker = get_broker()
+        channels = [channel for channel in (post_channel(post_id), GLOBAL_CHANNEL) if broker.has_subscribers(channel)]
+        if not channels:
+            return
+        message = encode_event(event, data() if callable(data) else data)
+        for channel in channels:
+            broker.publish(channel, message)
+    transaction.on_commit(publish)
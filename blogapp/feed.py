@@ -0,0 +1,157 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+
+from .conf import blogapp_settings
+from .models import FeedEntry, Follow, Post, UserProfileStats
+from .pagination import KeysetPagination
+from .stats import add_to_stats
+
+"""
+Home feed : the posts of the people a user follows, newest first.
+
+Posts are copied into the FeedEntry rows of every follower of their author when they are
+created (fan-out on write), so reading a feed page is one range read of the feed index no
+matter how many authors the user follows. Authors with BLOGAPP['FEED_FANOUT_LIMIT'] followers
+or more are not fanned out, their posts are merged in when the feed is read (fan-out on read),
+which keeps one post from turning into millions of inserts.
+
+"""
+
+CELEBRITIES_CACHE_KEY = 'blogapp:feed:celebrities'
+
+
+def get_celebrity_ids():
+    """
+    Returns : ids of the users whose posts are not fanned out, cached for a minute
+    """
+    celebrities = cache.get(CELEBRITIES_CACHE_KEY)
+    if celebrities is None:
+        celebrities = set(
+            UserProfileStats.objects.filter(follower_count__gte = blogapp_settings.FEED_FANOUT_LIMIT)
+            .values_list('user_id', flat = True)
+        )
+        cache.set(CELEBRITIES_CACHE_KEY, celebrities, 60)
+    return celebrities
+
+
+def is_celebrity(user_id, using = None):
+    follower_count = UserProfileStats.objects.using(using).filter(user_id = user_id).values_list('follower_count', flat = True).first()
+    return (follower_count or 0) >= blogapp_settings.FEED_FANOUT_LIMIT
+
+
+def fan_out_post(post, using = DEFAULT_DB_ALIAS):
+    """
+    Adds post to the feed of its author and, unless the author is a celebrity, of all their followers
+    """
+    FeedEntry.objects.using(using).create(user_id = post.user_id, post = post, author_id = post.user_id, created = post.created)
+    if is_celebrity(post.user_id, using):
+        return
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    # one INSERT ... SELECT, the follower ids never travel to Python
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO {feed} ({user}, {post}, {author}, {created}) '
+            'SELECT {follower}, %s, %s, %s FROM {follow} WHERE {followee} = %s'.format(
+                feed = quote(FeedEntry._meta.db_table), user = quote('user_id'), post = quote('post_id'),
+                author = quote('author_id'), created = quote('created'),
+                follower = quote('follower_id'), follow = quote(Follow._meta.db_table), followee = quote('followee_id'),
+            ),
+            [post.pk, post.user_id, connection.ops.adapt_datetimefield_value(post.created), post.user_id],
+        )
+
+
+def fan_out_posts(posts, using = DEFAULT_DB_ALIAS):
+    """
+    Arguments : saved posts, e.g. a chunk of bulk_create()d ones, which send no post_save
+    fan_out_post() for many posts in one INSERT ... SELECT
+    """
+    if not posts:
+        return
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    post_ids = [post.pk for post in posts]
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO {feed} ({user}, {post}, {author}, {created}) '
+            'SELECT p.{author_column}, p.{id}, p.{author_column}, p.{created} FROM {posts} p WHERE p.{id} IN ({ids}) '
+            'UNION ALL '
+            'SELECT f.{follower}, p.{id}, p.{author_column}, p.{created} FROM {posts} p '
+            'JOIN {follow} f ON f.{followee} = p.{author_column} WHERE p.{id} IN ({ids}) '
+            'AND p.{author_column} NOT IN (SELECT {user} FROM {stats} WHERE {follower_count} >= %s)'.format(
+                feed = quote(FeedEntry._meta.db_table), user = quote('user_id'), post = quote('post_id'),
+                author = quote('author_id'), created = quote('created'), id = quote('id'),
+                posts = quote(Post._meta.db_table), author_column = quote('user_id'),
+                follower = quote('follower_id'), follow = quote(Follow._meta.db_table), followee = quote('followee_id'),
+                stats = quote(UserProfileStats._meta.db_table), follower_count = quote('follower_count'),
+                ids = placeholders,
+            ),
+            post_ids + post_ids + [blogapp_settings.FEED_FANOUT_LIMIT],
+        )
+
+
+def toggle_follow(follower_id, followee_id):
+    """
+    Arguments : id of the user following, id of the user followed
+    Returns : True when now following, False when the follow got removed
+    """
+    with transaction.atomic():
+        removed, _ = Follow.objects.filter(follower_id = follower_id, followee_id = followee_id).delete()
+        if removed:
+            add_to_stats(follower_id, following_count = -1)
+            add_to_stats(followee_id, follower_count = -1)
+            FeedEntry.objects.filter(user_id = follower_id, author_id = followee_id).delete()
+            return False
+        try:
+            with transaction.atomic():
+                Follow.objects.create(follower_id = follower_id, followee_id = followee_id)
+        except IntegrityError:
+            # a concurrent request of the same user followed first
+            return True
+        add_to_stats(follower_id, following_count = 1)
+        add_to_stats(followee_id, follower_count = 1)
+        if is_celebrity(followee_id):
+            cache.delete(CELEBRITIES_CACHE_KEY)
+            return True
+        # recent posts show up right away instead of only the next ones
+        recent = Post.objects.filter(user_id = followee_id).order_by('-created', '-id')[:blogapp_settings.FEED_BACKFILL]
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(user_id = follower_id, post_id = pk, author_id = followee_id, created = created)
+             for pk, created in recent.values_list('pk', 'created')],
+            ignore_conflicts = True,
+        )
+        return True
+
+
+class FeedPagination(KeysetPagination):
+    """
+    Keyset pages of FeedEntry rows merged with the posts of the followed celebrities,
+    both walk the same (created, post id) order so one cursor serves the two
+    """
+    ordering = ('-created', '-post')
+
+    def paginate_feed(self, user_id, request):
+        """
+        Returns : post ids of the page, newest first
+        """
+        entries = FeedEntry.objects.filter(user_id = user_id).values_list('created', 'post_id')
+        rows = list(self.get_page_queryset(entries, request))
+
+        celebrities = get_celebrity_ids()
+        if celebrities:
+            followed = list(
+                Follow.objects.filter(follower_id = user_id, followee_id__in = celebrities)
+                .values_list('followee_id', flat = True)
+            )
+            if followed:
+                posts = Post.objects.filter(user_id__in = followed).order_by('-created', '-id')
+                if self.position is not None:
+                    fields = [Post._meta.get_field('created'), Post._meta.get_field('id')]
+                    posts = posts.filter(self.build_filter(fields, self.position))
+                # a post fanned out before its author became a celebrity comes from both sides
+                rows = sorted(set(rows) | set(posts.values_list('created', 'pk')[:self.page_size + 1]), reverse = True)
+                rows = rows[:self.page_size + 1]
+
+        page = self.get_page([{'created': created, 'post_id': post_id} for created, post_id in rows])
+        return [row['post_id'] for row in page]
@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .conf import blogapp_settings
+from .instrumentation import registry
+
+"""
+Password hashing off the request threads.
+
+PBKDF2 is hundreds of milliseconds of pure CPU by design, so a burst of logins run on the
+request threads takes every core and cheap reads queue behind it. hash_password() and
+verify_password() hand the work to a pool of BLOGAPP['PASSWORD_HASH_WORKERS'] processes instead
+(0 hashes on the calling thread), which caps the cores hashing can take whatever the number of
+logins in flight.
+
+At most BLOGAPP['PASSWORD_HASH_QUEUE_SIZE'] jobs are queued or running per process, a caller
+waiting longer than BLOGAPP['PASSWORD_HASH_QUEUE_TIMEOUT'] seconds for a slot gets a 503 with
+Retry-After rather than joining an ever longer queue. The queue depth and the rejections are
+exported with the request metrics (blogapp/instrumentation.py).
+
+The workers are started with "spawn", forking a process whose request threads hold locks is unsafe.
+A worker that dies (killed, out of memory) breaks its whole pool, the next job finding it broken
+replaces it and is retried once on the new pool, a second failure answers 503.
+
+"""
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many logins right now, try again shortly.'
+    default_code = 'password_hashing_busy'
+    wait = 1
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _make_password(password, algorithm):
+    return make_password(password, hasher = algorithm)
+
+
+class HashingPool:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pid = None
+        self.slots = None
+        self.depth = 0
+        self.rejected = 0
+
+    def get_workers(self):
+        workers = blogapp_settings.PASSWORD_HASH_WORKERS
+        if workers is None:
+            workers = max(1, (os.cpu_count() or 2) // 2)
+        return workers
+
+    def get_executor(self, workers):
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                # a pool inherited from the parent of a forked server worker is not ours
+                self.executor = ProcessPoolExecutor(
+                    workers, mp_context = multiprocessing.get_context('spawn'), initializer = _init_worker,
+                )
+                self.pid = os.getpid()
+                self.slots = threading.BoundedSemaphore(blogapp_settings.PASSWORD_HASH_QUEUE_SIZE)
+            return self.executor
+
+    def run(self, function, *args):
+        workers = self.get_workers()
+        if not workers:
+            return function(*args)
+        executor = self.get_executor(workers)
+        slots = self.slots
+        if not slots.acquire(timeout = blogapp_settings.PASSWORD_HASH_QUEUE_TIMEOUT):
+            with self.lock:
+                self.rejected += 1
+            raise PasswordHashingBusy()
+        with self.lock:
+            self.depth += 1
+        try:
+            try:
+                return executor.submit(function, *args).result()
+            except BrokenProcessPool:
+                self.discard(executor)
+            executor = self.get_executor(workers)
+            try:
+                return executor.submit(function, *args).result()
+            except BrokenProcessPool:
+                self.discard(executor)
+                raise PasswordHashingBusy()
+        finally:
+            with self.lock:
+                self.depth -= 1
+            slots.release()
+
+    def discard(self, executor):
+        """
+        Drops a broken executor, the next get_executor() starts a new one
+        """
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait = False)
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None and self.pid == os.getpid():
+                self.executor.shutdown()
+            self.executor = None
+
+
+pool = HashingPool()
+
+registry.add_gauge('blogapp_password_hash_queue_depth', 'Password hashing jobs queued or running in this process',
+                   lambda: pool.depth)
+registry.add_gauge('blogapp_password_hash_rejected_total', 'Password hashing jobs refused because the queue was full',
+                   lambda: pool.rejected, kind = 'counter')
+
+
+def hash_password(password):
+    """
+    Returns : make_password(password) computed in the hashing pool
+    """
+    return pool.run(_make_password, password, get_hasher('default').algorithm)
+
+
+def verify_password(password, encoded):
+    """
+    Returns : (whether password matches encoded, encoded hash to store instead or None)
+
+    Like check_password(), a hash made with another hasher or another iteration count than
+    the current default gets rehashed once the password proved right.
+    """
+    if not pool.run(check_password, password, encoded):
+        return False, None
+    preferred = get_hasher('default')
+    if identify_hasher(encoded).algorithm != preferred.algorithm or preferred.must_update(encoded):
+        return True, hash_password(password)
+    return True, None
@@ -0,0 +1,297 @@
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.views import APIView
+
+from .conf import blogapp_settings
+
+"""
+Per-request performance metrics.
+
+InstrumentationMiddleware measures a sample of the requests (BLOGAPP['METRICS_SAMPLE_RATE'],
+1.0 measures all of them, 0 none) :
+    total      wall time of the request through the middlewares below it and the view
+    db         number of SQL queries and time spent executing them, on every database alias
+    serialize  time spent in serializers and rendering the response (InstrumentedViewMixin
+               and FastSerializer.data report it)
+    bytes      size of the response body
+and sends them back in a Server-Timing header (BLOGAPP['METRICS_SERVER_TIMING']) that browser
+devtools show next to the request.
+
+Every request counts in blogapp_requests_total, the sampled ones also go into histograms labelled
+with the URL name of the view (post-list, post-detail, like, ...), served in the Prometheus text
+format by MetricsAPIView. Metrics are per process, Prometheus has to scrape every worker, and
+histogram counts only cover the sampled requests.
+
+"""
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+_current = contextvars.ContextVar('blogapp_request_metrics', default = None)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'queries', 'db_time', 'serialize_time')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    execute_wrapper installed on every connection (see install_query_recorder), adds the query
+    to the metrics of the current request. The context variable also reaches the thread
+    sync_to_async runs ORM calls of async views in, a per-request execute_wrapper would not.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # connection_created receiver, see BlogappConfig.ready
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def measure_serialization():
+    """
+    Adds the time spent in the block to the serialize time of the current request, if it is sampled
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serialize_time += time.perf_counter() - started
+
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0, 0.0]
+        counts = series[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        series[1] += 1
+        series[2] += value
+
+    def render(self, label_names):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        for labels, (counts, count, total) in sorted(self.series.items()):
+            base = format_labels(label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append('%s_bucket{%sle="%s"} %d' % (self.name, base, bound, cumulative))
+            lines.append('%s_bucket{%sle="+Inf"} %d' % (self.name, base, count))
+            lines.append('%s_sum{%s} %s' % (self.name, base.rstrip(','), repr(float(total))))
+            lines.append('%s_count{%s} %d' % (self.name, base.rstrip(','), count))
+        return lines
+
+
+def format_labels(names, values):
+    return ''.join('%s="%s",' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in zip(names, values))
+
+
+class MetricsRegistry:
+    """
+    Counters, histograms and gauges of this process, one lock around every update
+    """
+    label_names = ('view', 'method')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.gauges = {}
+        self.clear()
+
+    def add_gauge(self, name, help, value, kind = 'gauge'):
+        """
+        Arguments : metric name, help text, callable returning the current value, Prometheus type
+        """
+        self.gauges[name] = (help, value, kind)
+
+    def clear(self):
+        self.requests = {}
+        self.histograms = {
+            'duration': Histogram('blogapp_request_duration_seconds', 'Wall time of sampled requests', DURATION_BUCKETS),
+            'db_time': Histogram('blogapp_db_duration_seconds', 'SQL time of sampled requests', DURATION_BUCKETS),
+            'queries': Histogram('blogapp_db_queries', 'SQL queries of sampled requests', QUERY_BUCKETS),
+            'serialize_time': Histogram('blogapp_serialize_duration_seconds', 'Serialization and rendering time of sampled requests', DURATION_BUCKETS),
+            'bytes': Histogram('blogapp_response_bytes', 'Response body size of sampled requests', BYTES_BUCKETS),
+        }
+
+    def count(self, view, method, status_code):
+        key = (view, method, status_code)
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def observe(self, view, method, values):
+        labels = (view, method)
+        with self.lock:
+            for name, value in values.items():
+                self.histograms[name].observe(labels, value)
+
+    def render(self):
+        with self.lock:
+            lines = ['# HELP blogapp_requests_total Requests served', '# TYPE blogapp_requests_total counter']
+            for labels, count in sorted(self.requests.items()):
+                lines.append('blogapp_requests_total{%s} %d' % (
+                    format_labels(self.label_names + ('status',), labels).rstrip(','), count))
+            for histogram in self.histograms.values():
+                lines.extend(histogram.render(self.label_names))
+        for name, (help, value, kind) in self.gauges.items():
+            lines.extend(['# HELP %s %s' % (name, help), '# TYPE %s %s' % (name, kind), '%s %s' % (name, value())])
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.url_name or match.view_name) if match is not None else 'unresolved'
+
+
+class InstrumentationMiddleware:
+    """
+    Counts every request and measures the sampled ones, see the module docstring.
+    Runs in the mode of the handler, so it doesn't force ASGI requests through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sample(self):
+        rate = blogapp_settings.METRICS_SAMPLE_RATE
+        return bool(rate) and (rate >= 1 or random.random() < rate)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sample():
+            response = self.get_response(request)
+            registry.count(get_view_name(request), request.method, response.status_code)
+            return response
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not self.sample():
+            response = await self.get_response(request)
+            registry.count(get_view_name(request), request.method, response.status_code)
+            return response
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, metrics)
+
+    def record(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+        view, size = get_view_name(request), None
+        if not response.streaming:
+            size = len(response.content)
+        values = {
+            'duration': total,
+            'db_time': metrics.db_time,
+            'queries': metrics.queries,
+            'serialize_time': metrics.serialize_time,
+        }
+        if size is not None:
+            values['bytes'] = size
+        registry.count(view, request.method, response.status_code)
+        registry.observe(view, request.method, values)
+
+        if blogapp_settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join([
+                'db;desc="%d queries";dur=%.2f' % (metrics.queries, metrics.db_time * 1000),
+                'serialize;dur=%.2f' % (metrics.serialize_time * 1000),
+                'total;dur=%.2f' % (total * 1000),
+            ])
+        return response
+
+
+class InstrumentedViewMixin:
+    """
+    Renders the response inside the view so InstrumentationMiddleware can tell rendering time apart
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if _current.get() is not None and hasattr(response, 'render') and not response.is_rendered:
+            with measure_serialization():
+                response.render()
+        return response
+
+
+class MetricsPermission(permissions.BasePermission):
+    """
+    Staff users, or anyone sending "Authorization: Bearer <BLOGAPP['METRICS_TOKEN']>" when it is set
+    """
+
+    def has_permission(self, request, view):
+        token = blogapp_settings.METRICS_TOKEN
+        if token and request.META.get('HTTP_AUTHORIZATION') == 'Bearer %s' % token:
+            return True
+        return bool(request.user and request.user.is_staff)
+
+
+class MetricsAPIView(APIView):
+    """
+    Returns : metrics of this process in the Prometheus text format
+    """
+    permission_classes = [MetricsPermission]
+
+    def perform_authentication(self, request):
+        # a scrape token is not a JWT, authenticate lazily when the permission needs the user
+        pass
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(registry.render(), content_type = 'text/plain; version=0.0.4; charset=utf-8')
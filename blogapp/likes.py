@@ -0,0 +1,49 @@
+from django.db import IntegrityError, transaction
+
+from .cache import invalidate_post
+from .counters import get_like_counter
+from .events import publish_post_event
+from .models import Like, Post
+
+"""
+Like toggling as one short transaction : a DELETE or an INSERT guarded by the
+(user, post) unique constraint, plus a single counter update through the configured like counter.
+Subscribers of the post's event stream get the new count once the transaction commits.
+
+"""
+
+
+def toggle_like(user_id, post_id):
+    """
+    Arguments : user id, post id
+    Returns : True when the post is now liked, False when the like got removed,
+              None when the post does not exist
+    """
+    counter = get_like_counter()
+    with transaction.atomic():
+        invalidate_post(post_id)
+        removed, _ = Like.objects.filter(user_id = user_id, post_id = post_id).delete()
+        if removed:
+            counter.add(post_id, -removed)
+            publish_like_count(post_id)
+            return False
+
+        # counting first doubles as the existence check of the post
+        if not counter.add(post_id, 1):
+            return None
+        try:
+            with transaction.atomic():
+                Like.objects.create(user_id = user_id, post_id = post_id)
+        except IntegrityError:
+            # a concurrent request of the same user inserted (and counted) the like first
+            counter.add(post_id, -1)
+            return True
+        publish_like_count(post_id)
+        return True
+
+
+def publish_like_count(post_id):
+    def like_count():
+        post = Post.objects.with_like_count().filter(pk = post_id).first()
+        return {'post': post_id, 'like_count': get_like_counter().value(post) if post else 0}
+    publish_post_event(post_id, 'like', like_count)
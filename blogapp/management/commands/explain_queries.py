@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blogapp.query_plans import audit
+
+
+class Command(BaseCommand):
+    help = 'Runs EXPLAIN on every query of the GET endpoints and fails on full scans of big tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type = int, default = 1000,
+                            help = 'Full scans of tables with fewer rows than this are only reported')
+        parser.add_argument('--verbose-plans', action = 'store_true',
+                            help = 'Print the SQL and plan of every statement')
+
+    def handle(self, *args, **options):
+        failures = 0
+        for label, sql, plan, scans in audit():
+            if options['verbose_plans']:
+                self.stdout.write('[%s] %s' % (label, sql))
+                for line in plan:
+                    self.stdout.write('    %s' % line)
+            for table, rows in scans:
+                message = '[%s] full scan of %s (%d rows): %s' % (label, table, rows, sql)
+                if rows >= options['min_rows']:
+                    failures += 1
+                    self.stderr.write(message)
+                else:
+                    self.stdout.write(message)
+        if failures:
+            raise CommandError('%d full scan(s) of tables with %d rows or more' % (failures, options['min_rows']))
+        self.stdout.write('No full scans of tables with %d rows or more' % options['min_rows'])
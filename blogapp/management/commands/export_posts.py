@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from blogapp.bulk import export_posts
+
+
+class Command(BaseCommand):
+    help = 'Exports every post with its comments as JSON Lines, in the format import_posts reads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default = None, help = 'Output file, defaults to stdout')
+        parser.add_argument('--chunk-size', type = int, default = None,
+                            help = 'Number of posts read per query')
+
+    def handle(self, *args, **options):
+        if options['output'] is None:
+            for line in export_posts(chunk_size = options['chunk_size']):
+                self.stdout.write(line, ending = '')
+            return
+        with open(options['output'], 'w', encoding = 'utf-8') as output:
+            output.writelines(export_posts(chunk_size = options['chunk_size']))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blogapp.counters import get_like_counter
+
+
+class Command(BaseCommand):
+    help = 'Folds pending like counter shards into Post.like_count (BLOGAPP["LIKE_COUNTER"] = "sharded")'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type = float, default = 0,
+                            help = 'Keep running and flush every INTERVAL seconds')
+        parser.add_argument('--batch-size', type = int, default = 1000,
+                            help = 'Number of shard rows folded per transaction')
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = get_like_counter().flush(batch_size = options['batch_size'])
+            self.stdout.write('Flushed %d like counter shard(s)' % flushed)
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,37 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from blogapp.bulk import import_posts
+
+
+class Command(BaseCommand):
+    help = 'Imports posts and comments from a JSON Lines file (see blogapp/bulk.py for the format)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help = 'JSON Lines file, - reads stdin')
+        parser.add_argument('--user', required = True,
+                            help = 'Username owning the records that do not name a "user"')
+        parser.add_argument('--chunk-size', type = int, default = None,
+                            help = 'Number of lines inserted per transaction')
+        parser.add_argument('--max-errors', type = int, default = 100,
+                            help = 'Number of rejected lines printed with their reason')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username = options['user']).first()
+        if user is None:
+            raise CommandError('User "%s" does not exist' % options['user'])
+        if options['path'] == '-':
+            result = import_posts(sys.stdin, user.id, allow_user = True, chunk_size = options['chunk_size'],
+                                  max_errors = options['max_errors'])
+        else:
+            with open(options['path'], encoding = 'utf-8') as lines:
+                result = import_posts(lines, user.id, allow_user = True, chunk_size = options['chunk_size'],
+                                      max_errors = options['max_errors'])
+        for error in result.errors:
+            self.stderr.write('line %(line)d: %(error)s' % error)
+        if result.error_count > len(result.errors):
+            self.stderr.write('... and %d more rejected line(s)' % (result.error_count - len(result.errors)))
+        self.stdout.write('Imported %d post(s) and %d comment(s), rejected %d line(s)'
+                          % (result.posts, result.comments, result.error_count))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blogapp.purge import purge_deleted_posts
+
+
+class Command(BaseCommand):
+    help = 'Removes soft-deleted posts with their likes, comments and replies in batched DELETEs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type = int, default = 1000,
+                            help = 'Rows removed per DELETE statement')
+        parser.add_argument('--interval', type = float, default = 0,
+                            help = 'Keep running and purge every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            posts, rows = purge_deleted_posts(options['batch_size'])
+            self.stdout.write('Purged %d deleted post(s), %d row(s) in total' % (posts, rows))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blogapp.tokens import purge_outstanding_tokens, purge_revoked_tokens
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired revoked refresh tokens, and the expired rows of the token_blacklist app, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type = float, default = 0,
+                            help = 'Keep running and purge every INTERVAL seconds')
+        parser.add_argument('--batch-size', type = int, default = 1000,
+                            help = 'Number of rows deleted per statement')
+
+    def handle(self, *args, **options):
+        while True:
+            revoked = purge_revoked_tokens(options['batch_size'])
+            outstanding = purge_outstanding_tokens(options['batch_size'])
+            self.stdout.write('Purged %d revoked and %d outstanding expired token(s)' % (revoked, outstanding))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
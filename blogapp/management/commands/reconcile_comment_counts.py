@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from blogapp.counters import reconcile_count
+from blogapp.models import Comment, Post, Reply
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Post.comment_count from the Comment rows and Comment.reply_count from the Reply rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type = int, default = 10000,
+                            help = 'Number of posts or comments checked per UPDATE statement')
+
+    def handle(self, *args, **options):
+        fixed = reconcile_count(Post, 'comment_count', Comment, 'post', batch_size = options['batch_size'])
+        self.stdout.write('Fixed comment_count on %d post(s)' % fixed)
+        fixed = reconcile_count(Comment, 'reply_count', Reply, 'comment', batch_size = options['batch_size'])
+        self.stdout.write('Fixed reply_count on %d comment(s)' % fixed)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from blogapp.counters import get_like_counter, reconcile_count
+from blogapp.models import Like, Post
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Post.like_count from the Like rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type = int, default = 10000,
+                            help = 'Number of posts checked per UPDATE statement')
+
+    def handle(self, *args, **options):
+        # pending shards would be counted twice once like_count matches the Like rows
+        get_like_counter().flush()
+        fixed = reconcile_count(Post, 'like_count', Like, 'post', batch_size = options['batch_size'])
+        self.stdout.write('Fixed like_count on %d post(s)' % fixed)
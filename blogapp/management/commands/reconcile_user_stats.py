@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from blogapp.stats import reconcile_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes UserProfileStats.post_count and like_count from the Post rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type = int, default = 10000,
+                            help = 'Number of user ids checked per transaction')
+
+    def handle(self, *args, **options):
+        fixed = reconcile_user_stats(batch_size = options['batch_size'])
+        self.stdout.write('Fixed post and like counts of %d user(s)' % fixed)
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blogapp.trending import prune_scores, refresh_trending
+
+
+class Command(BaseCommand):
+    help = 'Ranks the top BLOGAPP["TRENDING_SIZE"] trending posts for posts/trending/ and drops decayed scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type = float, default = 0,
+                            help = 'Keep running and refresh every INTERVAL seconds')
+        parser.add_argument('--size', type = int, default = None,
+                            help = 'Number of posts ranked, BLOGAPP["TRENDING_SIZE"] by default')
+
+    def handle(self, *args, **options):
+        while True:
+            pruned = prune_scores()
+            ranked = refresh_trending(options['size'])
+            self.stdout.write('Ranked %d trending post(s), pruned %d decayed score(s)' % (ranked, pruned))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
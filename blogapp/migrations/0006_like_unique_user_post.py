@@ -0,0 +1,32 @@
+# Generated by Django 4.1.7 on 2026-10-18 14:06
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    # the old toggle could insert the same (user, post) pair twice under concurrent clicks,
+    # keep the oldest row of each pair so the unique constraint can be added
+    Like = apps.get_model('blogapp', 'Like')
+    db = schema_editor.connection.alias
+    duplicates = (
+        Like.objects.using(db).values('user', 'post')
+        .annotate(keep = Min('id'), rows = Count('id')).filter(rows__gt = 1)
+    )
+    for pair in duplicates.iterator():
+        Like.objects.using(db).filter(user = pair['user'], post = pair['post']).exclude(id = pair['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp', '0005_post_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='like_unique_user_post'),
+        ),
+    ]
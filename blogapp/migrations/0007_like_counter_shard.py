@@ -0,0 +1,27 @@
+# Generated by Django 4.1.7 on 2026-10-18 14:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp', '0006_like_unique_user_post'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LikeCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('delta', models.IntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='like_shards', to='blogapp.post')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='likecountershard',
+            constraint=models.UniqueConstraint(fields=('post', 'shard'), name='like_shard_unique_post_shard'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp', '0007_like_counter_shard'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reply',
+            index=models.Index(fields=['comment', 'created_at', 'id'], name='reply_comment_created_id_idx'),
+        ),
+    ]
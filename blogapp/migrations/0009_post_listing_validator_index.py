@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 14:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp', '0008_reply_thread_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['user', 'updated', 'like_count'], name='post_user_updated_likes_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.1.7 on 2026-10-18 14:41
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing(apps, schema_editor):
+    # one UPDATE per table, each row gets the number of its children
+    db = schema_editor.connection.alias
+    for parent, child, field, counter in (('Post', 'Comment', 'post', 'comment_count'), ('Comment', 'Reply', 'comment', 'reply_count')):
+        Parent, Child = apps.get_model('blogapp', parent), apps.get_model('blogapp', child)
+        children = (
+            Child.objects.using(db).filter(**{field: OuterRef('pk')}).order_by()
+            .values(field).annotate(count = Count('pk')).values('count')
+        )
+        Parent.objects.using(db).update(**{counter: Coalesce(Subquery(children), 0)})
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp', '0010_follow_feed'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_user_updated_likes_idx',
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['user', 'updated', 'like_count', 'comment_count'], name='post_user_updated_counts_idx'),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
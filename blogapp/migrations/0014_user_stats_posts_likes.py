@@ -0,0 +1,43 @@
+# Generated by Django 4.1.7 on 2026-10-18 15:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_existing(apps, schema_editor):
+    # one UPDATE for the users with a stats row, the other authors get theirs created
+    db = schema_editor.connection.alias
+    Post, UserProfileStats = apps.get_model('blogapp', 'Post'), apps.get_model('blogapp', 'UserProfileStats')
+    posts = Post.objects.using(db).filter(user = OuterRef('user')).order_by().values('user')
+    UserProfileStats.objects.using(db).update(
+        post_count = Coalesce(Subquery(posts.annotate(count = Count('pk')).values('count')), 0),
+        like_count = Coalesce(Subquery(posts.annotate(likes = Sum('like_count')).values('likes')), 0),
+    )
+    missing = (
+        Post.objects.using(db).exclude(user__in = UserProfileStats.objects.using(db).values('user'))
+        .order_by().values('user').annotate(posts = Count('pk'), likes = Sum('like_count'))
+    )
+    UserProfileStats.objects.using(db).bulk_create([
+        UserProfileStats(user_id = row['user'], post_count = row['posts'], like_count = row['likes'] or 0) for row in missing
+    ], batch_size = 1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp', '0013_revoked_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofilestats',
+            name='like_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofilestats',
+            name='post_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def copy_blacklisted_tokens(apps, schema_editor):
+    # refresh tokens revoked through simplejwt's token_blacklist app before RevokedToken existed,
+    # BlogRefreshToken only checks RevokedToken so they have to be in there too
+    BlacklistedToken = apps.get_model('token_blacklist', 'BlacklistedToken')
+    RevokedToken = apps.get_model('blogapp', 'RevokedToken')
+    db = schema_editor.connection.alias
+    rows = (
+        BlacklistedToken.objects.using(db).filter(token__expires_at__gt = timezone.now())
+        .order_by('pk').values_list('token__jti', 'token__expires_at')
+    )
+    batch = []
+    for jti, expires_at in rows.iterator(chunk_size = 1000):
+        batch.append(RevokedToken(jti = jti, expires_at = expires_at))
+        if len(batch) == 1000:
+            RevokedToken.objects.using(db).bulk_create(batch, ignore_conflicts = True)
+            batch = []
+    RevokedToken.objects.using(db).bulk_create(batch, ignore_conflicts = True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+        ('blogapp', '0015_post_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_blacklisted_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 15:58
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp', '0016_copy_blacklisted_tokens'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_user_updated_counts_idx',
+        ),
+    ]
@@ -3,6 +3,25 @@ from django.contrib.auth.models import User
 from django.urls import reverse
 
 
+class PostQuerySet(models.QuerySet):
+    def with_like_count(self):
+        """
+        Adds whatever the configured like counter needs so PostSerializer can read like_count
+        without a query per post (see blogapp/counters.py)
+        """
+        from .counters import get_like_counter
+        return get_like_counter().annotate(self)
+
+
+class PostManager(models.Manager.from_queryset(PostQuerySet)):
+    """
+    Hides soft-deleted posts, Post.all_objects still sees them (see blogapp/purge.py)
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted = False)
+
+
 class Post(models.Model):
     """
     Post Model which will create instance of Post in database
@@ -13,6 +32,19 @@ class Post(models.Model):
     created = models.DateTimeField(auto_now_add = True)
     updated = models.DateTimeField(auto_now = True)
     like_count = models.IntegerField(default = 0)
+    comment_count = models.IntegerField(default = 0)
+    # set by a delete, purge_deleted_posts removes the post and everything under it later
+    is_deleted = models.BooleanField(default = False)
+
+    objects = PostManager()
+    all_objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ['-created', '-id'], name = 'post_created_id_idx'),
+            models.Index(fields = ['user', '-created', '-id'], name = 'post_user_created_id_idx'),
+            models.Index(fields = ['id'], name = 'post_deleted_idx', condition = models.Q(is_deleted = True)),
+        ]
 
     def __str__(self):
         return self.title
@@ -28,6 +60,26 @@ class Like(models.Model):
     user = models.ForeignKey(User, related_name = 'likes', on_delete = models.CASCADE)
     post = models.ForeignKey(Post, related_name = 'likes', on_delete = models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields = ['user', 'post'], name = 'like_unique_user_post'),
+        ]
+
+
+class LikeCounterShard(models.Model):
+    """
+    Pending like count change of a Post, spread over several rows so concurrent likes on a hot post
+    don't all queue on the Post row lock. The flush_like_counters command folds them into Post.like_count
+    """
+    post = models.ForeignKey(Post, related_name = 'like_shards', on_delete = models.CASCADE)
+    shard = models.PositiveSmallIntegerField()
+    delta = models.IntegerField(default = 0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields = ['post', 'shard'], name = 'like_shard_unique_post_shard'),
+        ]
+
 
 class Comment(models.Model):
     """
@@ -37,6 +89,12 @@ class Comment(models.Model):
     post = models.ForeignKey(Post, related_name = 'comments', on_delete = models.CASCADE)
     body = models.TextField()
     created = models.DateTimeField(auto_now_add = True)
+    reply_count = models.IntegerField(default = 0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ['post', '-created', '-id'], name = 'comment_post_created_id_idx'),
+        ]
 
     def __str__(self):
         return self.body
@@ -50,5 +108,103 @@ class Reply(models.Model):
     body = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields = ['comment', 'created_at', 'id'], name = 'reply_comment_created_id_idx'),
+        ]
+
     def __str__(self):
-        return  self.body
\ No newline at end of file
+        return  self.body
+
+class UserProfileStats(models.Model):
+    """
+    Per-user counters kept up to date with F() updates by the code that changes them (see blogapp/stats.py)
+    """
+    user = models.OneToOneField(User, primary_key = True, related_name = 'stats', on_delete = models.CASCADE)
+    follower_count = models.IntegerField(default = 0)
+    following_count = models.IntegerField(default = 0)
+    post_count = models.IntegerField(default = 0)
+    # likes received, the sum of like_count over the user's posts
+    like_count = models.IntegerField(default = 0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ['follower_count'], name = 'stats_follower_count_idx'),
+        ]
+
+
+class Follow(models.Model):
+    """
+    follower sees the posts of followee in their feed
+    """
+    follower = models.ForeignKey(User, related_name = 'following', on_delete = models.CASCADE)
+    followee = models.ForeignKey(User, related_name = 'followers', on_delete = models.CASCADE)
+    created = models.DateTimeField(auto_now_add = True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields = ['follower', 'followee'], name = 'follow_unique_follower_followee'),
+            models.CheckConstraint(check = ~models.Q(follower = models.F('followee')), name = 'follow_not_self'),
+        ]
+        indexes = [
+            # the fan-out of a new post reads the followers of its author
+            models.Index(fields = ['followee', 'follower'], name = 'follow_followee_follower_idx'),
+        ]
+
+
+class FeedEntry(models.Model):
+    """
+    A post in the home feed of user, written when the post is created (fan-out on write).
+    created is the post's, so a feed page is one range read of the (user, created, post) index.
+    """
+    user = models.ForeignKey(User, related_name = 'feed_entries', on_delete = models.CASCADE)
+    post = models.ForeignKey(Post, related_name = 'feed_entries', on_delete = models.CASCADE)
+    author = models.ForeignKey(User, related_name = '+', on_delete = models.CASCADE)
+    created = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields = ['user', 'post'], name = 'feed_entry_unique_user_post'),
+        ]
+        indexes = [
+            models.Index(fields = ['user', '-created', '-post'], name = 'feed_user_created_post_idx'),
+            models.Index(fields = ['user', 'author'], name = 'feed_user_author_idx'),
+        ]
+
+
+class TrendingScore(models.Model):
+    """
+    Time-decayed activity of a post, stored as the log of its activity scaled to a fixed epoch
+    so every like or comment is one in-place update and old scores never need rewriting (see blogapp/trending.py)
+    """
+    post = models.OneToOneField(Post, primary_key = True, related_name = 'trending_score', on_delete = models.CASCADE)
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ['-score', '-post'], name = 'trending_score_idx'),
+        ]
+
+
+class TrendingPost(models.Model):
+    """
+    The top posts by TrendingScore as of the last refresh_trending run, rank 1 being the hottest
+    """
+    rank = models.PositiveIntegerField(primary_key = True)
+    post = models.OneToOneField(Post, related_name = 'trending_rank', on_delete = models.CASCADE)
+    score = models.FloatField()
+
+
+class RevokedToken(models.Model):
+    """
+    jti of a refresh token that can't be used anymore, kept until the token would have expired anyway
+    (see blogapp/tokens.py). The primary key makes revoking and checking one index access each.
+    """
+    jti = models.CharField(max_length = 64, primary_key = True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # the purge deletes by expiry range
+            models.Index(fields = ['expires_at'], name = 'revoked_token_expires_idx'),
+        ]
@@ -0,0 +1,172 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import date, datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .conf import blogapp_settings
+
+"""
+Keyset pagination walks a queryset by the values of its ordering fields instead of an OFFSET,
+so fetching page 1000 costs the same index seek as fetching page 1.
+
+"""
+
+
+class KeysetPagination(BasePagination):
+    """
+    Arguments : ordering (two fields, same direction, the last one unique)
+    Returns : {"next": <url or null>, "results": [...]}
+
+    The cursor is an opaque token holding the ordering values of the last row of the page,
+    the next page is everything strictly after that position.
+    """
+    ordering = ('-created', '-id')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        default = blogapp_settings.KEYSET_PAGE_SIZE or api_settings.PAGE_SIZE
+        max_page_size = blogapp_settings.KEYSET_MAX_PAGE_SIZE
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            page_size = default
+        if page_size <= 0:
+            page_size = default
+        return min(page_size, max_page_size)
+
+    def get_fields(self, model):
+        return [model._meta.get_field(name.lstrip('-')) for name in self.ordering]
+
+    def encode_cursor(self, position):
+        values = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in position]
+        return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, request, fields):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(fields):
+                raise ValueError
+            position = [field.target_field.to_python(value) if field.is_relation else field.to_python(value)
+                        for field, value in zip(fields, values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        if any(value is None for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_position(self, obj, fields):
+        if isinstance(obj, dict):
+            # rows of a .values() queryset
+            return [obj[field.attname] for field in fields]
+        return [getattr(obj, field.attname) for field in fields]
+
+    def build_filter(self, fields, position):
+        (first, second), (first_value, second_value) = fields, position
+        op = 'lt' if self.ordering[0].startswith('-') else 'gt'
+        # the inclusive bound on the leading column lets the database seek the index
+        # instead of walking it from the start and discarding rows
+        return (
+            Q(**{'%s__%se' % (first.name, op): first_value})
+            & (Q(**{'%s__%s' % (first.name, op): first_value}) | Q(**{'%s__%s' % (second.name, op): second_value}))
+        )
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Returns : the queryset of the requested page plus one row, which tells whether there is a next page
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = self.get_fields(queryset.model)
+        self.position = self.decode_cursor(request, self.fields)
+
+        queryset = queryset.order_by(*self.ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self.build_filter(self.fields, self.position))
+        return queryset[:self.page_size + 1]
+
+    def get_page(self, rows):
+        page = rows[:self.page_size]
+        self.next_position = self.get_position(page[-1], self.fields) if len(rows) > self.page_size else None
+        return page
+
+    def paginate_queryset(self, queryset, request, view = None):
+        return self.get_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view = None):
+        return self.get_page([row async for row in self.get_page_queryset(queryset, request)])
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class ReplyKeysetPagination(KeysetPagination):
+    """
+    Replies read top to bottom, oldest first
+    """
+    ordering = ('created_at', 'id')
+
+
+class TrendingKeysetPagination(KeysetPagination):
+    """
+    Trending posts by rank, hottest first
+    """
+    ordering = ('rank', 'post')
+
+
+class UserKeysetPagination(KeysetPagination):
+    """
+    User directory in username order, served by the unique index on username
+    """
+    ordering = ('username', 'id')
+
+
+class KeysetPaginationMixin:
+    """
+    Opt-in keyset pagination for plain APIViews, mirrors the helpers of GenericAPIView.
+    Set pagination_class = None on a view to turn it off again.
+    """
+    pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = self.pagination_class() if self.pagination_class else None
+        return self._paginator
+
+    def paginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return self.paginator.paginate_queryset(queryset, self.request, view = self)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
@@ -0,0 +1,121 @@
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, models, transaction
+
+from .cache import invalidate_post
+from .models import FeedEntry, Post, TrendingPost, TrendingScore
+from .stats import remove_post_from_stats
+
+"""
+Post deletion in two steps.
+
+delete_post() sets Post.is_deleted, one UPDATE of the post row whatever hangs off it.
+The default manager hides such posts at once, so they drop out of every listing, their detail,
+comment and like endpoints answer 404, and the author's counters lose them right away. The feed
+and trending pages read their own tables, so the post's rows there go in the same transaction :
+its TrendingScore and TrendingPost rows and its feed entries, at most one per follower below
+BLOGAPP['FEED_FANOUT_LIMIT'].
+
+purge_deleted_posts (run it next to the app with --interval) removes them for good. Django's
+delete() would load every Like, Comment and Reply of the post into memory and send signals
+for each, here every table that cascades from Post is emptied bottom up with
+    DELETE FROM <table> WHERE id IN (SELECT id ... WHERE <row belongs to the post> LIMIT <batch>)
+statements, one short transaction each, so a post with a million likes costs a thousand
+small deletes and never more memory than one statement.
+
+The dependents are found through the model relations, a new model with a CASCADE foreign key
+to Post (or to Comment) is purged without changes here.
+
+"""
+
+
+def delete_post(post):
+    """
+    Arguments : Post
+    Returns : False when the post was deleted already
+    """
+    with transaction.atomic():
+        if not Post.objects.filter(pk = post.pk).update(is_deleted = True):
+            return False
+        remove_post_from_stats(post.pk, post.user_id)
+        # nothing cascades from these, each delete() is a single DELETE statement
+        for model in (FeedEntry, TrendingPost, TrendingScore):
+            model.objects.filter(post_id = post.pk).delete()
+        invalidate_post(post.pk)
+    return True
+
+
+def delete_in_batches(queryset, batch_size):
+    """
+    Deletes the rows of queryset, at most batch_size per statement, without loading them
+    or sending signals
+    Returns : number of rows deleted
+    """
+    model, using = queryset.model, queryset.db
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    select, params = queryset.order_by().values('pk')[:batch_size].query.get_compiler(using).as_sql()
+    sql = 'DELETE FROM %s WHERE %s IN (%s)' % (quote(model._meta.db_table), quote(model._meta.pk.column), select)
+    deleted = 0
+    while True:
+        with transaction.atomic(using = using), connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            count = cursor.rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def delete_dependents(model, lookup, value, batch_size, using = DEFAULT_DB_ALIAS):
+    """
+    Arguments : model, lookup selecting its rows (e.g. 'pk'), lookup value
+    Deletes the rows of every model cascading from the selected rows, the deepest ones first
+    Returns : number of rows deleted
+    """
+    deleted = 0
+    for relation in model._meta.get_fields(include_hidden = True):
+        # reverse foreign keys, the ones Django's delete() collects too
+        if not (relation.auto_created and not relation.concrete and (relation.one_to_many or relation.one_to_one)):
+            continue
+        if relation.on_delete is not models.CASCADE:
+            continue
+        related_model = relation.related_model
+        related_lookup = '%s__%s' % (relation.field.name, lookup)
+        deleted += delete_dependents(related_model, related_lookup, value, batch_size, using)
+        deleted += delete_in_batches(
+            related_model._base_manager.using(using).filter(**{related_lookup: value}), batch_size
+        )
+    return deleted
+
+
+def purge_post(post_id, batch_size = 1000, using = DEFAULT_DB_ALIAS):
+    """
+    Arguments : id of a soft-deleted post
+    Returns : (whether the post row is gone, number of dependent rows deleted)
+              the post stays when it is not soft-deleted or something got added under it
+              meanwhile, the next run retries it
+    """
+    deleted = delete_dependents(Post, 'pk', post_id, batch_size, using)
+    try:
+        purged = delete_in_batches(Post.all_objects.using(using).filter(pk = post_id, is_deleted = True), batch_size)
+    except IntegrityError:
+        purged = 0
+    return bool(purged), deleted
+
+
+def purge_deleted_posts(batch_size = 1000, using = DEFAULT_DB_ALIAS):
+    """
+    Returns : (posts purged, rows deleted in total)
+    """
+    posts = rows = 0
+    last_id = 0
+    while True:
+        post_ids = list(
+            Post.all_objects.using(using).filter(is_deleted = True, pk__gt = last_id)
+            .order_by('pk').values_list('pk', flat = True)[:batch_size]
+        )
+        for post_id in post_ids:
+            purged, deleted = purge_post(post_id, batch_size, using)
+            posts += purged
+            rows += deleted + purged
+        if len(post_ids) < batch_size:
+            return posts, rows
+        last_id = post_ids[-1]
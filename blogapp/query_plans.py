@@ -0,0 +1,143 @@
+import re
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.urls import resolve, reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .models import Comment, Post
+
+"""
+Query plan audit for the API.
+
+Every GET endpoint is called once with representative arguments while the SQL it sends is
+recorded, then each statement goes through EXPLAIN (EXPLAIN QUERY PLAN on SQLite). A statement
+that reads a whole table instead of seeking an index is a full scan, which only matters once
+the table is big, so full scans are reported with the size of the table they read.
+
+On SQLite every SCAN counts, walking a whole index (USING [COVERING] INDEX) costs about as
+much as walking the table, only a SEARCH seeks. The walks that are fine go in ALLOWED_SCANS.
+
+"""
+
+FULL_SCAN_PATTERNS = {
+    # "SCAN blogapp_post [USING [COVERING] INDEX post_created_id_idx]", not virtual tables
+    'sqlite': re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (\w+)| USING INTEGER PRIMARY KEY)?$'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)()'),
+}
+
+# "FROM blogapp_post U0", plans name a table by its alias
+TABLE_ALIAS_PATTERN = re.compile(r'(?:FROM|JOIN)\s+"?(\w+)"?\s+(?:AS\s+)?"?(\w+)"?', re.IGNORECASE)
+
+# (endpoint, table, index) scans that are not reported
+ALLOWED_SCANS = {
+    # the newest posts page walks the index in ORDER BY order and its LIMIT stops the walk
+    ('post-list', 'blogapp_post', 'post_created_id_idx'),
+}
+
+
+def audit_requests():
+    """
+    Returns : [(label, path)] for every GET endpoint, pointed at existing rows when there are any
+    """
+    post = Post.objects.order_by('-pk').first()
+    comment = Comment.objects.order_by('-pk').first()
+    post_id = post.pk if post else 1
+    comment_id = comment.pk if comment else 1
+    username = post.user.username if post else 'nobody'
+    word = (post.title.split() or ['post'])[0] if post else 'post'
+    return [
+        ('users-list', reverse('users-list') + '?prefix=%s' % username[:2]),
+        ('post-list', reverse('post-list')),
+        ('post-detail', reverse('post-detail', kwargs = {'pk': post_id})),
+        ('user-post', reverse('user-post', kwargs = {'username': username})),
+        ('comment', reverse('comment', kwargs = {'pk': post_id})),
+        ('comment-thread', reverse('comment-thread', kwargs = {'pk': post_id})),
+        ('post-search', reverse('post-search') + '?query=%s' % word),
+        ('reply-comment', reverse('reply-comment', kwargs = {'pk': comment_id})),
+        ('post-export', reverse('post-export')),
+    ]
+
+
+def record_queries(path, user):
+    """
+    Calls the view behind path as user
+    Returns : [(sql, params)] it executed
+    """
+    queries = []
+
+    def recorder(execute, sql, params, many, context):
+        queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    request = APIRequestFactory().get(path)
+    force_authenticate(request, user = user)
+    match = resolve(path.split('?')[0])
+    with connection.execute_wrapper(recorder):
+        response = match.func(request, *match.args, **match.kwargs)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+    return queries
+
+
+def explain(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute('%s %s' % (connection.ops.explain_query_prefix(), sql), params)
+        return [str(row[-1]) for row in cursor.fetchall()]
+
+
+def full_scans(plan, sql = ''):
+    """
+    Arguments : plan lines, the statement they explain (to resolve table aliases)
+    Returns : [(table, index or None)] the plan reads in full
+    """
+    pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+    if pattern is None:
+        return []
+    tables = set(connection.introspection.table_names())
+    aliases = {alias: table for table, alias in TABLE_ALIAS_PATTERN.findall(sql) if table in tables}
+    scans = []
+    for line in plan:
+        match = pattern.search(line.strip())
+        if match is None:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        # CTEs and subqueries have plans of their own
+        if table in tables:
+            scans.append((table, match.group(2) or None))
+    return scans
+
+
+def table_size(table):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT COUNT(*) FROM %s' % connection.ops.quote_name(table))
+        return cursor.fetchone()[0]
+
+
+def audit(user = None):
+    """
+    Arguments : user the endpoints are called as, defaults to the first user made staff in memory
+    Returns : [(label, sql, plan, [(table, rows)])] for every statement, the last item lists its full scans
+    """
+    if user is None:
+        user = User.objects.order_by('pk').first() or User(pk = 0, username = 'audit')
+        # in memory only, so admin endpoints are audited too
+        user.is_staff = True
+    results, sizes = [], {}
+    for label, path in audit_requests():
+        seen = set()
+        for sql, params in record_queries(path, user):
+            if sql in seen or not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                continue
+            seen.add(sql)
+            plan = explain(sql, params)
+            scans = []
+            for table, index in full_scans(plan, sql):
+                if (label, table, index) in ALLOWED_SCANS:
+                    continue
+                if table not in sizes:
+                    sizes[table] = table_size(table)
+                scans.append((table, sizes[table]))
+            results.append((label, sql, plan, scans))
+    return results
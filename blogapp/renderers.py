@@ -0,0 +1,36 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+"""
+orjson is in requirements.txt, without it ORJSONRenderer still renders exactly like JSONRenderer.
+
+"""
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer on top of orjson, producing the same bytes as JSONRenderer for compact output.
+    Indented output (browsable API, ?indent) and non default JSON settings go through JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type = None, renderer_context = None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # datetimes are handed to DRF's encoder so they come out formatted exactly as JSONRenderer
+        # formats them; str subclasses (ErrorDetail, ...) never reach it, without
+        # OPT_PASSTHROUGH_SUBCLASS orjson writes them as the plain strings JSONRenderer writes too
+        ret = orjson.dumps(
+            data,
+            default = self.encoder_class().default,
+            option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS,
+        )
+        # same strict javascript subset escaping as JSONRenderer
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
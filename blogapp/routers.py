@@ -0,0 +1,140 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework import permissions
+
+from .conf import blogapp_settings
+
+"""
+Read replica routing.
+
+Views with ReplicaReadMixin send the queries of their GET / HEAD / OPTIONS requests to one of
+BLOGAPP['READ_REPLICAS'] (aliases of DATABASES), everything else keeps using the primary.
+A user who just wrote something is pinned to the primary for BLOGAPP['REPLICA_PIN_SECONDS']
+by ReplicaPinMiddleware, so they read their own writes while the replicas catch up.
+
+The pins live in the default cache, which has to be shared (e.g. Redis) with several workers.
+
+"""
+
+_replica = ContextVar('blogapp_replica', default = None)
+
+
+def get_replicas():
+    return list(blogapp_settings.READ_REPLICAS)
+
+
+def current_replica():
+    """
+    Returns : alias of the replica the current request reads from, None on the primary
+    """
+    return _replica.get()
+
+
+def use_replica(request):
+    """
+    Arguments : request, after authentication
+    Returns : token for reset_replica() when the request now reads from a replica, else None
+    """
+    replicas = get_replicas()
+    if not replicas or request.method not in permissions.SAFE_METHODS:
+        return None
+    if is_pinned(getattr(request.user, 'id', None)):
+        return None
+    return _replica.set(random.choice(replicas))
+
+
+def reset_replica(token):
+    if token is not None:
+        _replica.reset(token)
+
+
+def pin_key(user_id):
+    return 'blogapp:replica-pin:%s' % user_id
+
+
+def pin_to_primary(user_id):
+    cache.set(pin_key(user_id), True, blogapp_settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return user_id is not None and cache.get(pin_key(user_id)) is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        # reads inside a transaction on the primary must see its uncommitted writes
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # without this an instance loaded from a replica would be saved back to it
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in get_replicas():
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Reads of safe requests go to a random replica, unless the user is pinned to the primary
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._replica_token = use_replica(request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        reset_replica(getattr(self, '_replica_token', None))
+        self._replica_token = None
+        return response
+
+
+class ReplicaPinMiddleware:
+    """
+    Pins the user of every successful write request to the primary.
+    DRF sets request.user on the Django request when it authenticates, so token users are seen too.
+    Runs in the mode of the handler, so it doesn't force ASGI requests through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def needs_pin(self, request, response):
+        return request.method not in permissions.SAFE_METHODS and response.status_code < 400 and bool(get_replicas())
+
+    def pin(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_to_primary(user.id)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.needs_pin(request, response):
+            self.pin(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.needs_pin(request, response):
+            # a session user is loaded lazily, which is a query
+            await sync_to_async(self.pin)(request)
+        return response
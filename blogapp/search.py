@@ -0,0 +1,142 @@
+import re
+
+from django.db import connections
+from django.db.models import Q
+
+"""
+Full text search over Post title and body.
+
+SQLite  : FTS5 external content table blogapp_post_fts, kept in sync by triggers on blogapp_post
+PostgreSQL : GIN expression index over to_tsvector(title || ' ' || body)
+others  : falls back to icontains filtering
+
+Query syntax : plain words are AND-ed, "quoted words" are phrases, word* is a prefix match
+
+"""
+
+FTS_TABLE = 'blogapp_post_fts'
+PG_CONFIG = 'english'
+PG_VECTOR = "to_tsvector('%s', blogapp_post.title || ' ' || blogapp_post.body)" % PG_CONFIG
+HIGHLIGHT_START, HIGHLIGHT_STOP = '<mark>', '</mark>'
+
+_TERM_RE = re.compile(r'"([^"]*)"|(\S+)')
+_WORD_RE = re.compile(r'\w+')
+
+SQLITE_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS blogapp_post_fts USING fts5(
+        title, body, content='blogapp_post', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS blogapp_post_fts_insert AFTER INSERT ON blogapp_post BEGIN
+        INSERT INTO blogapp_post_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS blogapp_post_fts_delete AFTER DELETE ON blogapp_post BEGIN
+        INSERT INTO blogapp_post_fts(blogapp_post_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS blogapp_post_fts_update AFTER UPDATE OF title, body ON blogapp_post BEGIN
+        INSERT INTO blogapp_post_fts(blogapp_post_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO blogapp_post_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+POSTGRES_SCHEMA = [
+    "CREATE INDEX IF NOT EXISTS blogapp_post_search_idx ON blogapp_post USING GIN ((%s))"
+    % PG_VECTOR.replace('blogapp_post.', ''),
+]
+
+
+def install_search_index(connection):
+    """
+    Creates the search index for the connection's backend, safe to call repeatedly.
+
+    SQLite rebuilds a table when a migration alters it, which drops its triggers,
+    so this also runs after every migrate (see BlogappConfig.ready).
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            exists = FTS_TABLE in connection.introspection.table_names(cursor)
+            for statement in SQLITE_SCHEMA:
+                cursor.execute(statement)
+            if not exists:
+                cursor.execute("INSERT INTO blogapp_post_fts(blogapp_post_fts) VALUES ('rebuild')")
+        elif connection.vendor == 'postgresql':
+            for statement in POSTGRES_SCHEMA:
+                cursor.execute(statement)
+
+
+def uninstall_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for name in ('insert', 'delete', 'update'):
+                cursor.execute('DROP TRIGGER IF EXISTS blogapp_post_fts_%s' % name)
+            cursor.execute('DROP TABLE IF EXISTS %s' % FTS_TABLE)
+        elif connection.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS blogapp_post_search_idx')
+
+
+def parse_query(query):
+    """
+    Splits a user query into terms, each term is (words, is_prefix).
+    Anything that is not a word character is dropped, so user input can never inject
+    FTS5 / tsquery operators.
+    """
+    terms = []
+    for phrase, word in _TERM_RE.findall(query):
+        words = tuple(_WORD_RE.findall(phrase or word))
+        if words:
+            terms.append((words, not phrase and word.endswith('*')))
+    return terms
+
+
+def to_fts5_query(terms):
+    return ' '.join('"%s"%s' % (' '.join(words), ' *' if prefix else '') for words, prefix in terms)
+
+
+def to_tsquery(terms):
+    return ' & '.join(
+        '(%s)' % ' <-> '.join(words[:-1] + (words[-1] + (':*' if prefix else ''),)) for words, prefix in terms
+    )
+
+
+def search_posts(queryset, query):
+    """
+    Arguments : Post queryset, raw user query
+    Returns : matching posts ordered by relevance, annotated with search_title and search_snippet
+    """
+    terms = parse_query(query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        return queryset.extra(
+            select = {
+                'search_rank': 'bm25(blogapp_post_fts, 10.0, 1.0)',
+                'search_title': "highlight(blogapp_post_fts, 0, '%s', '%s')" % (HIGHLIGHT_START, HIGHLIGHT_STOP),
+                'search_snippet': "snippet(blogapp_post_fts, 1, '%s', '%s', '...', 24)" % (HIGHLIGHT_START, HIGHLIGHT_STOP),
+            },
+            tables = [FTS_TABLE],
+            where = ['blogapp_post_fts.rowid = blogapp_post.id', 'blogapp_post_fts MATCH %s'],
+            params = [to_fts5_query(terms)],
+            order_by = ['search_rank', '-id'],
+        )
+
+    if vendor == 'postgresql':
+        tsquery = to_tsquery(terms)
+        options = 'StartSel=%s, StopSel=%s' % (HIGHLIGHT_START, HIGHLIGHT_STOP)
+        return queryset.extra(
+            select = {
+                'search_rank': "ts_rank(%s, to_tsquery('%s', %%s))" % (PG_VECTOR, PG_CONFIG),
+                'search_title': "ts_headline('%s', blogapp_post.title, to_tsquery('%s', %%s), %%s)" % (PG_CONFIG, PG_CONFIG),
+                'search_snippet': "ts_headline('%s', blogapp_post.body, to_tsquery('%s', %%s), %%s)" % (PG_CONFIG, PG_CONFIG),
+            },
+            select_params = [tsquery, tsquery, options + ', HighlightAll=true', tsquery, options + ', MaxFragments=1'],
+            where = ["%s @@ to_tsquery('%s', %%s)" % (PG_VECTOR, PG_CONFIG)],
+            params = [tsquery],
+            order_by = ['-search_rank', '-id'],
+        )
+
+    condition = Q()
+    for words, prefix in terms:
+        phrase = ' '.join(words)
+        condition &= Q(title__icontains = phrase) | Q(body__icontains = phrase)
+    return queryset.filter(condition).order_by('-created', '-id')
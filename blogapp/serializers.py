@@ -2,7 +2,10 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import Post, Like, Comment, Reply
-from django.contrib.auth.hashers import make_password
+from .counters import get_like_counter
+from .tokens import BlogRefreshToken
+from .hashing import hash_password
+from django.urls import reverse
 
 """
 Serializers are used for converting instances into native datatypes which can be rendered easily by JSON,\
@@ -20,15 +23,32 @@ class UserSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         password = validated_data.pop('password')
-        hashed_password = make_password(password)
+        hashed_password = hash_password(password)
         user = User.objects.create(password=hashed_password, **validated_data)
         return user
 
+class UserDirectorySerializer(serializers.Serializer):
+    """
+    Rows of directory_queryset(), the profile summary comes from UserProfileStats
+    """
+    id = serializers.IntegerField()
+    username = serializers.CharField()
+    post_count = serializers.IntegerField()
+    like_count = serializers.IntegerField()
+    follower_count = serializers.IntegerField()
+    following_count = serializers.IntegerField()
+
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = BlogRefreshToken
+
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
         token['user_id'] = user.id
+        # read back by TokenUser, so authenticated requests need no User query
+        token['username'] = user.username
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
         return token
 
     def validate(self, attrs):
@@ -37,9 +57,26 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         return data
     
 class PostSerializer(serializers.ModelSerializer):
+    like_count = serializers.SerializerMethodField()
+
     class Meta:
         model = Post
-        fields = ('id', 'title', 'body', 'created', 'updated', 'user', 'like_count')
+        fields = ('id', 'title', 'body', 'created', 'updated', 'user', 'like_count', 'comment_count')
+        read_only_fields = ('comment_count',)
+
+    def get_like_count(self, obj):
+        return get_like_counter().value(obj)
+
+class PostSearchSerializer(PostSerializer):
+    highlight = serializers.SerializerMethodField()
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ('highlight',)
+
+    def get_highlight(self, obj):
+        if not hasattr(obj, 'search_snippet'):
+            return None
+        return {'title': obj.search_title, 'body': obj.search_snippet}
 
 class LikeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -49,9 +86,45 @@ class LikeSerializer(serializers.ModelSerializer):
 class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
-        fields = ('id', 'user', 'post', 'body', 'created')
+        fields = ('id', 'user', 'post', 'body', 'created', 'reply_count')
+        read_only_fields = ('reply_count',)
 
 class ReplySerializer(serializers.ModelSerializer):
     class Meta:
         model = Reply
-        fields = ('id', 'user', 'comment', 'body', 'created_at')
\ No newline at end of file
+        fields = ('id', 'user', 'comment', 'body', 'created_at')
+
+class ThreadReplySerializer(ReplySerializer):
+    username = serializers.CharField(source='user.username', read_only=True)
+
+    class Meta(ReplySerializer.Meta):
+        fields = ReplySerializer.Meta.fields + ('username',)
+
+class CommentThreadSerializer(CommentSerializer):
+    """
+    Comment with its author's username and the first page of its replies,
+    expects replies prefetched into thread_replies (one row more than the page size)
+    and 'request', 'replies_page_size' and 'reply_paginator' in the context.
+    """
+    username = serializers.CharField(source='user.username', read_only=True)
+    replies = serializers.SerializerMethodField()
+    replies_next = serializers.SerializerMethodField()
+
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ('username', 'replies', 'replies_next')
+
+    def get_replies(self, obj):
+        replies = obj.thread_replies[:self.context['replies_page_size']]
+        return ThreadReplySerializer(replies, many=True).data
+
+    def get_replies_next(self, obj):
+        page_size = self.context['replies_page_size']
+        if len(obj.thread_replies) <= page_size:
+            return None
+        paginator = self.context['reply_paginator']
+        last = obj.thread_replies[page_size - 1]
+        cursor = paginator.encode_cursor([last.created_at, last.id])
+        url = reverse('reply-comment', kwargs={'pk': obj.pk})
+        return self.context['request'].build_absolute_uri(
+            '%s?%s=%s&%s=%d' % (url, paginator.cursor_query_param, cursor, paginator.page_size_query_param, page_size)
+        )
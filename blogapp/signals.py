@@ -0,0 +1,99 @@
+from django.contrib.auth.models import User
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .authentication import user_cache
+from .cache import invalidate_post
+from .events import publish_post_event
+from .feed import fan_out_post
+from .models import Post, Comment, Reply
+from .stats import add_to_stats, remove_post_from_stats
+from .trending import record_activity
+from .serializers import CommentSerializer, ReplySerializer
+
+
+@receiver(post_save, sender = Post)
+@receiver(post_delete, sender = Post)
+def invalidate_cached_post(sender, instance, **kwargs):
+    invalidate_post(instance.pk)
+
+
+@receiver(post_save, sender = Post)
+def fan_out_new_post(sender, instance, created, using, raw = False, **kwargs):
+    if created and not raw:
+        fan_out_post(instance, using)
+
+
+@receiver(post_save, sender = Post)
+def score_new_post(sender, instance, created, using, raw = False, **kwargs):
+    if created and not raw:
+        record_activity(instance.pk, 'post', instance.created, using)
+
+
+@receiver(post_save, sender = Post)
+def count_new_post(sender, instance, created, using, raw = False, **kwargs):
+    if created and not raw:
+        add_to_stats(instance.user_id, using, post_count = 1, like_count = instance.like_count)
+
+
+@receiver(post_save, sender = User)
+@receiver(post_delete, sender = User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.discard(instance.pk)
+
+
+def deleted_along(origin, *models):
+    """
+    Returns : True when the delete() that removed the instance started from one of models,
+              whose rows are gone too so their counters need no update
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in models
+
+
+@receiver(post_save, sender = Comment)
+def count_comment(sender, instance, created, using, raw = False, **kwargs):
+    # bulk_create sends no signals, blogapp/bulk.py counts the comments it imports itself
+    if created and not raw:
+        Post.objects.using(using).filter(pk = instance.post_id).update(comment_count = F('comment_count') + 1)
+        invalidate_post(instance.post_id)
+
+
+@receiver(post_delete, sender = Comment)
+def uncount_comment(sender, instance, using, origin = None, **kwargs):
+    if not deleted_along(origin, Post):
+        Post.objects.using(using).filter(pk = instance.post_id).update(comment_count = F('comment_count') - 1)
+        invalidate_post(instance.post_id)
+
+
+@receiver(pre_delete, sender = Post)
+def uncount_post(sender, instance, using, origin = None, **kwargs):
+    # a soft-deleted post left the counters already
+    if not instance.is_deleted and not deleted_along(origin, User):
+        remove_post_from_stats(instance.pk, instance.user_id, using)
+
+
+@receiver(post_save, sender = Reply)
+def count_reply(sender, instance, created, using, raw = False, **kwargs):
+    if created and not raw:
+        Comment.objects.using(using).filter(pk = instance.comment_id).update(reply_count = F('reply_count') + 1)
+
+
+@receiver(post_delete, sender = Reply)
+def uncount_reply(sender, instance, using, origin = None, **kwargs):
+    if not deleted_along(origin, Post, Comment):
+        Comment.objects.using(using).filter(pk = instance.comment_id).update(reply_count = F('reply_count') - 1)
+
+
+@receiver(post_save, sender = Comment)
+def publish_comment(sender, instance, created, **kwargs):
+    if created:
+        publish_post_event(instance.post_id, 'comment', lambda: CommentSerializer(instance).data)
+
+
+@receiver(post_save, sender = Reply)
+def publish_reply(sender, instance, created, **kwargs):
+    if created:
+        post_id = instance.comment.post_id
+        publish_post_event(post_id, 'reply', lambda: dict(ReplySerializer(instance).data, post = post_id))
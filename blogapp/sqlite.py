@@ -0,0 +1,30 @@
+import re
+
+from .conf import blogapp_settings
+
+"""
+SQLite tuning applied to every new connection (connection_created), with the PRAGMAs from
+BLOGAPP['SQLITE_PRAGMAS'], for example the production profile in settings.py :
+
+    journal_mode=WAL      readers no longer block the writer and the other way round
+    synchronous=NORMAL    fsync at checkpoints instead of every commit, safe with WAL
+    mmap_size=<bytes>     reads go through the page cache instead of read() calls
+    busy_timeout=<ms>     a writer waits for the lock instead of failing with "database is locked"
+
+"""
+
+PRAGMA_NAME = re.compile(r'^\w+$')
+PRAGMA_VALUE = re.compile(r'^-?\w+$')
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = blogapp_settings.SQLITE_PRAGMAS
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            if not PRAGMA_NAME.match(name) or not PRAGMA_VALUE.match(str(value)):
+                raise ValueError('Invalid SQLite pragma %s = %r' % (name, value))
+            cursor.execute('PRAGMA %s = %s' % (name, value))
@@ -0,0 +1,119 @@
+import asyncio
+import re
+from urllib.parse import parse_qs
+
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .conf import blogapp_settings
+from .events import GLOBAL_CHANNEL, get_broker, post_channel
+from .models import Post
+
+"""
+Server-Sent Events endpoints, as a raw ASGI application in front of Django (see asgi.py):
+
+    /api/blogapp/events/               every post's activity
+    /api/blogapp/post/<pk>/events/     the activity of one post
+
+Events are "like" ({"post", "like_count"}), "comment" and "reply" (the serialized object),
+plus "resync" when the connection fell behind and should refetch. A connection costs one
+coroutine and one bounded queue, and a comment line every BLOGAPP['EVENT_HEARTBEAT'] seconds
+keeps proxies from closing it. Django 4.1 can't stream from async views, hence the raw ASGI app.
+EventSource can't send headers, so the access token may also be passed as ?token=.
+
+"""
+
+ROUTES = [
+    (re.compile(r'^/api/blogapp/events/$'), lambda match: GLOBAL_CHANNEL),
+    (re.compile(r'^/api/blogapp/post/(?P<pk>\d+)/events/$'), lambda match: post_channel(match['pk'])),
+]
+
+CONNECTED_MESSAGE = b': connected\n\n'
+HEARTBEAT_MESSAGE = b': ping\n\n'
+
+
+def match_route(path):
+    for pattern, channel in ROUTES:
+        match = pattern.match(path)
+        if match:
+            return match, channel(match)
+    return None, None
+
+
+def authenticate(scope):
+    """
+    Returns : the TokenUser of the Bearer header or ?token=, None when missing or invalid
+    """
+    authentication = JWTStatelessUserAuthentication()
+    headers = dict(scope['headers'])
+    header = headers.get(b'authorization', b'').split()
+    if len(header) == 2 and header[0].decode() in jwt_settings.AUTH_HEADER_TYPES:
+        raw_token = header[1]
+    else:
+        raw_token = (parse_qs(scope.get('query_string', b'').decode()).get('token') or [None])[0]
+    if not raw_token:
+        return None
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError):
+        return None
+
+
+async def send_error(send, status, body):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def event_stream(scope, receive, send, match, channel):
+    if authenticate(scope) is None:
+        return await send_error(send, 401, b'{"detail":"Authentication credentials were not provided."}')
+    if 'pk' in match.groupdict() and not await Post.objects.filter(pk = match['pk']).aexists():
+        return await send_error(send, 404, b'{"error":"Post not found"}')
+
+    subscription = get_broker().subscribe(channel)
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await send({'type': 'http.response.body', 'body': CONNECTED_MESSAGE, 'more_body': True})
+        while True:
+            message = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {message, disconnect}, timeout = blogapp_settings.EVENT_HEARTBEAT,
+                return_when = asyncio.FIRST_COMPLETED,
+            )
+            if message not in done:
+                message.cancel()
+            if disconnect in done:
+                break
+            body = message.result() if message in done else HEARTBEAT_MESSAGE
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        subscription.close()
+        disconnect.cancel()
+
+
+class EventStreamRouter:
+    """
+    ASGI application serving the event streams and handing every other request to application
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            match, channel = match_route(scope['path'])
+            if match is not None:
+                return await event_stream(scope, receive, send, match, channel)
+        return await self.application(scope, receive, send)
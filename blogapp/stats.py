@@ -0,0 +1,100 @@
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Count, F, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Post, UserProfileStats
+
+"""
+UserProfileStats counters, updated in place with F() expressions like the other denormalized
+counters (see blogapp/counters.py). The row of a user is created by their first update.
+
+like_count of a user always equals the sum of Post.like_count over their posts : it moves
+whenever a like counter backend changes Post.like_count, so with the sharded counter it lags
+behind by the same pending likes and the author's row is written once per flush, not per like.
+
+"""
+
+
+def add_to_stats(user_id, using = DEFAULT_DB_ALIAS, **deltas):
+    """
+    Arguments : user id, counter name = delta, e.g. add_to_stats(1, follower_count = 1)
+    """
+    stats = UserProfileStats.objects.using(using)
+    rows = stats.filter(user_id = user_id)
+    if rows.update(**{field: F(field) + delta for field, delta in deltas.items()}):
+        return
+    try:
+        with transaction.atomic(using = using):
+            stats.create(user_id = user_id, **deltas)
+    except IntegrityError:
+        # created by a concurrent update in between
+        rows.update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def add_to_author_stats(post_id, **deltas):
+    """
+    Arguments : post id, counter name = delta
+    Updates the counters of the post's author, in a single UPDATE once the author has a stats row
+    """
+    author = Post.objects.filter(pk = post_id).values('user_id')
+    if UserProfileStats.objects.filter(user_id = Subquery(author)).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    ):
+        return
+    user_id = author.values_list('user_id', flat = True).first()
+    if user_id is not None:
+        add_to_stats(user_id, **deltas)
+
+
+def remove_post_from_stats(post_id, user_id, using = DEFAULT_DB_ALIAS):
+    """
+    Arguments : id and author of a post being deleted
+    Takes the post and its likes off the author's counters, the like count is read by the UPDATE
+    itself since the instance being deleted may hold a stale one
+    """
+    like_count = Post.all_objects.using(using).filter(pk = post_id).values('like_count')
+    UserProfileStats.objects.using(using).filter(user_id = user_id).update(
+        post_count = F('post_count') - 1,
+        like_count = F('like_count') - Coalesce(Subquery(like_count), 0),
+    )
+
+
+def reconcile_user_stats(batch_size = 10000):
+    """
+    Arguments : number of user ids checked per transaction
+    Returns : number of users whose post_count or like_count was wrong and got fixed
+
+    Walks user ids in ranges of batch_size, like reconcile_count(), and only writes the
+    rows whose stored values drifted.
+    """
+    bounds = [
+        (ids.first(), ids.last()) for ids in
+        (model.objects.order_by('user_id').values_list('user_id', flat = True) for model in (Post, UserProfileStats))
+    ]
+    bounds = [bound for bound in bounds if bound[0] is not None]
+    fixed = 0
+    if not bounds:
+        return fixed
+    first, last = min(bound[0] for bound in bounds), max(bound[1] for bound in bounds)
+    for start in range(first, last + 1, batch_size):
+        users = {'user_id__gte': start, 'user_id__lt': start + batch_size}
+        with transaction.atomic():
+            actual = {
+                user_id: (posts, likes or 0) for user_id, posts, likes in
+                Post.objects.filter(**users).order_by().values('user_id')
+                .annotate(posts = Count('pk'), likes = Sum('like_count')).values_list('user_id', 'posts', 'likes')
+            }
+            stored = {
+                user_id: (posts, likes) for user_id, posts, likes in
+                UserProfileStats.objects.filter(**users).values_list('user_id', 'post_count', 'like_count')
+            }
+            for user_id in sorted(actual.keys() | stored.keys()):
+                posts, likes = actual.get(user_id, (0, 0))
+                if stored.get(user_id, (0, 0)) == (posts, likes):
+                    continue
+                if user_id in stored:
+                    UserProfileStats.objects.filter(user_id = user_id).update(post_count = posts, like_count = likes)
+                else:
+                    UserProfileStats.objects.create(user_id = user_id, post_count = posts, like_count = likes)
+                fixed += 1
+    return fixed
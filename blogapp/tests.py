@@ -1,11 +1,41 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib import auth
 from django.urls import reverse
 from rest_framework import status
 from django.contrib.auth.models import User
-from rest_framework.test import APITestCase, APIClient
-from .models import Post, Like, Comment, Reply
+from rest_framework.test import APITestCase, APITransactionTestCase, APIClient, APIRequestFactory
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from io import StringIO
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+import asyncio
+import json
+import math
+import time
+from datetime import timedelta
+import os
+import tempfile
+from rest_framework_simplejwt.tokens import AccessToken
+from .authentication import CachedUserJWTAuthentication, user_cache
+from .models import Post, Like, Comment, Reply, LikeCounterShard, FeedEntry, Follow, UserProfileStats, TrendingScore, RevokedToken
 from .serializers import PostSerializer, CommentSerializer, ReplySerializer
+from .fast_serializers import FastPostSerializer, FastCommentSerializer, FastReplySerializer
+from .renderers import ORJSONRenderer
+from .events import LocalBroker, RESYNC_MESSAGE, get_broker, post_channel
+from .sse import EventStreamRouter
+from .feed import toggle_follow
+from .likes import toggle_like
+from .throttling import LocalBucketStore, get_bucket_store
+from .instrumentation import InstrumentationMiddleware, registry
+from .tokens import BlogRefreshToken, revoked_cache
+from .hashing import pool as hashing_pool
+from .routers import ReplicaPinMiddleware
+from .trending import EPOCH, log_weight, record_activity
+from .backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from rest_framework.renderers import JSONRenderer
 
 class AuthTestCase(TestCase):
     """
@@ -21,6 +51,56 @@ class AuthTestCase(TestCase):
     def testLogin(self):
         self.client.login(username='test@dom.com', password='pass')
 
+class JWTAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.user = User.objects.create_user('writer', 'writer@dom.com', 'testpass1234', is_staff=True)
+        response = self.client.post(reverse('get-token'), {'username': 'writer', 'password': 'testpass1234'})
+        self.access = response.data['access']
+
+    def test_token_embeds_user_claims(self):
+        token = AccessToken(self.access)
+        self.assertEqual(token['user_id'], self.user.id)
+        self.assertEqual(token['username'], 'writer')
+        self.assertTrue(token['is_staff'])
+        self.assertFalse(token['is_superuser'])
+
+    def test_requests_skip_user_query(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access)
+        # validators aggregate + page, no auth_user lookup
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('post-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('post-list'), {'title': 'Title', 'body': 'Body'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['user'], self.user.id)
+
+    def test_writes_check_the_user_row(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(reverse('post-list')).status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('post-list'), {'title': 'Title', 'body': 'Body'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertFalse(Post.objects.exists())
+
+    def test_cached_user_authentication(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Bearer ' + self.access)
+        authentication = CachedUserJWTAuthentication()
+        with self.assertNumQueries(1):
+            first, _ = authentication.authenticate(request)
+            second, _ = authentication.authenticate(request)
+        self.assertEqual(first, self.user)
+        self.assertIs(first, second)
+
+        self.user.first_name = 'Changed'
+        self.user.save()
+        with self.assertNumQueries(1):
+            user, _ = authentication.authenticate(request)
+        self.assertEqual(user.first_name, 'Changed')
+
+
 class PostListAPIViewTestCase(APITestCase):
     def setUp(self):
         self.client = APIClient()
@@ -42,9 +122,155 @@ class PostListAPIViewTestCase(APITestCase):
         response = self.client.get(url)
         posts = Post.objects.all()
         serializer = PostSerializer(posts, many=True)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
+        self.assertIsNone(response.data['next'])
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_get_posts_paginated_by_cursor(self):
+        posts = [Post.objects.create(user=self.user, title='Post %d' % i, body='Body') for i in range(5)]
+        url = reverse('post-list') + '?page_size=2'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(post['id'] for post in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, [post.id for post in reversed(posts)])
+
+    def test_get_posts_cursor_survives_identical_timestamps(self):
+        posts = [Post.objects.create(user=self.user, title='Post %d' % i, body='Body') for i in range(3)]
+        Post.objects.update(created=posts[0].created)
+        response = self.client.get(reverse('post-list') + '?page_size=1')
+        seen = [response.data['results'][0]['id']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen.extend(post['id'] for post in response.data['results'])
+        self.assertEqual(seen, [post.id for post in reversed(posts)])
+
+    def test_get_posts_invalid_cursor(self):
+        response = self.client.get(reverse('post-list') + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(BLOGAPP={'KEYSET_MAX_PAGE_SIZE': 3})
+    def test_get_posts_page_size_is_capped(self):
+        for i in range(5):
+            Post.objects.create(user=self.user, title='Post %d' % i, body='Body')
+        response = self.client.get(reverse('post-list') + '?page_size=1000')
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+
+
+
+class ConditionalListTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.post = Post.objects.create(user=self.user, title='Test Post', body='Test body')
+        Comment.objects.create(user=self.user, post=self.post, body='Test comment')
+        self.client.force_authenticate(user=self.user)
+        self.urls = [
+            reverse('post-list'),
+            reverse('user-post', kwargs={'username': self.user.username}),
+            reverse('comment', args=[self.post.id]),
+            reverse('post-search') + '?query=test',
+        ]
+
+    def test_matching_etag_returns_304_with_one_aggregate(self):
+        # the user and comment listings look up their user / post first
+        for url, queries in zip(self.urls, [1, 2, 2, 1]):
+            etag = self.client.get(url)['ETag']
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED, url)
+            self.assertEqual(response['ETag'], etag)
+
+    def test_validators_only_read_the_page(self):
+        for i in range(3):
+            Post.objects.create(user=self.user, title='Post %d' % i, body='Body')
+        url = self.urls[0] + '?page_size=2'
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertIn('LIMIT 3', queries[-1]['sql'])
+        # an older post beyond the page doesn't change it
+        Post.objects.filter(title='Test Post').update(like_count=5)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_deleting_a_post_on_the_page_changes_etag(self):
+        # a soft delete doesn't touch "updated", and deleting below the newest post keeps
+        # both the latest "updated" and the page_size + 1 rows of the page
+        posts = [Post.objects.create(user=self.user, title='Post %d' % i, body='Body') for i in range(4)]
+        for url in self.urls[:2]:
+            url += '?page_size=2'
+            etag = self.client.get(url)['ETag']
+            self.client.delete(reverse('post-detail', kwargs={'pk': posts.pop(-2).pk}))
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            self.assertEqual(len(response.data['results']), 2)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_lists_send_no_last_modified(self):
+        # a like changes the list but not the latest "updated"
+        response = self.client.get(self.urls[0])
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.client.post(reverse('like', kwargs={'pk': self.post.pk}))
+        response = self.client.get(self.urls[0], HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['like_count'], 1)
+
+    def test_changes_invalidate_etag(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        self.client.post(reverse('like', kwargs={'pk': self.post.pk}))
+        Comment.objects.create(user=self.user, post=self.post, body='Another comment')
+        for url, etag in zip(self.urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+
+    def test_pages_have_distinct_etags(self):
+        Post.objects.create(user=self.user, title='Second', body='Body')
+        first = self.client.get(self.urls[0] + '?page_size=1')
+        second = self.client.get(first.data['next'])
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+
+class FastSerializerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.posts = [
+            Post.objects.create(user=self.user, title='Plain', body='Body'),
+            Post.objects.create(user=self.user, title='Ünïcode ✓', body='line\u2028separator \u2029 "quoted"'),
+        ]
+        Like.objects.create(user=self.user, post=self.posts[0])
+        Post.objects.filter(pk=self.posts[0].pk).update(like_count=1)
+        self.comment = Comment.objects.create(user=self.user, post=self.posts[0], body='Comment ✓')
+
+    def assertSameJSON(self, serializer_class, fast_class, queryset):
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        fast = fast_class(fast_class.values(queryset)).data
+        self.assertEqual(JSONRenderer().render(fast), expected)
+        self.assertEqual(ORJSONRenderer().render(fast), expected)
+
+    def test_post_output_is_byte_identical(self):
+        self.assertSameJSON(PostSerializer, FastPostSerializer, Post.objects.with_like_count().order_by('id'))
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_post_output_is_byte_identical_in_other_timezone(self):
+        self.assertSameJSON(PostSerializer, FastPostSerializer, Post.objects.with_like_count().order_by('id'))
+
+    @override_settings(BLOGAPP={'LIKE_COUNTER': 'sharded'})
+    def test_post_output_is_byte_identical_with_sharded_counter(self):
+        LikeCounterShard.objects.create(post=self.posts[1], shard=0, delta=2)
+        self.assertSameJSON(PostSerializer, FastPostSerializer, Post.objects.with_like_count().order_by('id'))
+
+    def test_comment_and_reply_output_is_byte_identical(self):
+        Reply.objects.create(user=self.user, comment=self.comment, body='Reply')
+        self.assertSameJSON(CommentSerializer, FastCommentSerializer, Comment.objects.order_by('id'))
+        self.assertSameJSON(ReplySerializer, FastReplySerializer, Reply.objects.order_by('id'))
+
+    def test_orjson_renderer_matches_json_renderer_on_errors(self):
+        serializer = PostSerializer(data={'title': ''})
+        serializer.is_valid()
+        self.assertEqual(ORJSONRenderer().render(serializer.errors), JSONRenderer().render(serializer.errors))
 
 
 class PostDetailAPIViewTestCase(TestCase):
@@ -90,6 +316,55 @@ class PostDetailAPIViewTestCase(TestCase):
 
 
 
+class PostDetailCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.post = Post.objects.create(user=self.user, title='Test Title', body='Test Body')
+        self.url = reverse('post-detail', kwargs={'pk': self.post.pk})
+        self.client.force_authenticate(user=self.user)
+
+    def test_second_read_skips_database(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertIn('Last-Modified', second)
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_if_modified_since_returns_304(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_save_invalidates(self):
+        etag = self.client.get(self.url)['ETag']
+        self.post.title = 'Changed'
+        self.post.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], 'Changed')
+
+    def test_like_invalidates(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.post(reverse('like', kwargs={'pk': self.post.pk}))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['like_count'], 1)
+
+    def test_delete_invalidates(self):
+        self.client.get(self.url)
+        self.post.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+
 class UserPostAPIViewTestCase(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='testuser', password='testpass')
@@ -101,7 +376,7 @@ class UserPostAPIViewTestCase(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         serializer = PostSerializer([self.post], many=True)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
     def test_get_posts_by_invalid_user(self):
         self.client.force_authenticate(user=self.user)
@@ -132,6 +407,32 @@ class LikeAPIViewTestCase(APITestCase):
         self.assertEqual(response.data['like_count'], 0)
         self.assertFalse(Like.objects.filter(user=self.user, post=self.post).exists())
 
+    def test_like_does_not_clobber_concurrent_count(self):
+        url = reverse('like', kwargs={'pk': self.post.pk})
+        self.client.force_authenticate(user=self.user)
+        # another worker counted a like after this post instance was loaded
+        Post.objects.filter(pk=self.post.pk).update(like_count=5)
+        response = self.client.post(url)
+        self.assertEqual(response.data['like_count'], 6)
+
+    def test_like_is_unique_per_user_and_post(self):
+        Like.objects.create(user=self.user, post=self.post)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Like.objects.create(user=self.user, post=self.post)
+
+    def test_reconcile_like_counts(self):
+        other = User.objects.create_user('other', 'other@example.com', 'testpass')
+        Like.objects.create(user=self.user, post=self.post)
+        Like.objects.create(user=other, post=self.post)
+        empty = Post.objects.create(user=self.user, title='Empty', body='Body', like_count=3)
+        out = StringIO()
+        call_command('reconcile_like_counts', batch_size=1, stdout=out)
+        self.post.refresh_from_db()
+        empty.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
+        self.assertEqual(empty.like_count, 0)
+        self.assertIn('Fixed like_count on 2 post(s)', out.getvalue())
+
     def test_like_nonexistent_post(self):
         url = reverse('like', kwargs={'pk': 999})
         self.client.force_authenticate(user=self.user)
@@ -147,6 +448,66 @@ class LikeAPIViewTestCase(APITestCase):
 
 
 
+@override_settings(BLOGAPP={'LIKE_COUNTER': 'sharded', 'LIKE_COUNTER_SHARDS': 4})
+class ShardedLikeCounterTestCase(APITestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user('user%d' % i, password='testpass') for i in range(6)]
+        self.post = Post.objects.create(user=self.users[0], title='Hot post', body='Test body')
+        self.url = reverse('like', kwargs={'pk': self.post.pk})
+
+    def like_as(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.post(self.url)
+
+    def test_likes_go_to_shards(self):
+        for user in self.users:
+            response = self.like_as(user)
+        self.assertEqual(response.data['like_count'], 6)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertLessEqual(LikeCounterShard.objects.filter(post=self.post).count(), 4)
+
+        response = self.like_as(self.users[0])
+        self.assertEqual(response.data['like_count'], 5)
+
+    def test_list_reads_merged_count(self):
+        for user in self.users[:3]:
+            self.like_as(user)
+        response = self.client.get(reverse('post-list'))
+        self.assertEqual(response.data['results'][0]['like_count'], 3)
+
+    def test_flush_folds_shards_into_post(self):
+        for user in self.users:
+            self.like_as(user)
+        self.like_as(self.users[1])
+        out = StringIO()
+        call_command('flush_like_counters', batch_size=1, stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 5)
+        self.assertFalse(LikeCounterShard.objects.exists())
+        self.assertEqual(self.like_as(self.users[1]).data['like_count'], 6)
+
+    def test_reconcile_flushes_pending_shards(self):
+        for user in self.users[:2]:
+            self.like_as(user)
+        call_command('reconcile_like_counts', stdout=StringIO())
+        self.assertEqual(self.client.get(reverse('post-detail', kwargs={'pk': self.post.pk})).data['like_count'], 2)
+
+    def test_like_nonexistent_post(self):
+        self.client.force_authenticate(user=self.users[0])
+        response = self.client.post(reverse('like', kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(LikeCounterShard.objects.exists())
+
+
+    def test_no_likes_on_deleted_post(self):
+        from .counters import ShardedLikeCounter
+        counter = ShardedLikeCounter(shards=1)
+        self.assertTrue(counter.add(self.post.pk, 1))
+        Post.objects.filter(pk=self.post.pk).update(is_deleted=True)
+        self.assertFalse(counter.add(self.post.pk, 1))
+        self.assertEqual(LikeCounterShard.objects.get(post=self.post).delta, 1)
+
 class CommentAPIViewTestCase(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -175,6 +536,67 @@ class CommentAPIViewTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(Comment.objects.filter(post=self.post).count(), 0)
 
+    def test_comment_count_follows_creates_and_deletes(self):
+        self.client.force_login(self.user)
+        detail = reverse('post-detail', args=[self.post.id])
+        self.assertEqual(self.client.get(detail).data['comment_count'], 0)
+        self.client.post(self.url, data=self.valid_payload)
+        self.client.post(self.url, data=self.valid_payload)
+        self.assertEqual(self.client.get(detail).data['comment_count'], 2)
+        Comment.objects.filter(post=self.post).first().delete()
+        self.assertEqual(self.client.get(detail).data['comment_count'], 1)
+
+    def test_counts_follow_rows_created_outside_the_views(self):
+        comment = Comment.objects.create(user=self.user, post=self.post, body='Comment')
+        Reply.objects.create(user=self.user, comment=comment, body='Reply')
+        comment.refresh_from_db()
+        self.assertEqual(comment.reply_count, 1)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_post_list_reads_counts_without_extra_queries(self):
+        self.client.force_login(self.user)
+        for i in range(5):
+            post = Post.objects.create(user=self.user, title='Post %d' % i, body='Body')
+            self.client.post(reverse('comment', args=[post.id]), data=self.valid_payload)
+        url = reverse('post-list') + '?page_size=3'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        with CaptureQueriesContext(connection) as more_queries:
+            self.client.get(reverse('post-list') + '?page_size=6')
+        self.assertEqual(len(queries), len(more_queries))
+        self.assertEqual([post['comment_count'] for post in response.data['results']], [1, 1, 1])
+
+    def test_reconcile_comment_counts(self):
+        comment = Comment.objects.create(user=self.user, post=self.post, body='Comment')
+        Reply.objects.create(user=self.user, comment=comment, body='Reply')
+        Post.objects.filter(pk=self.post.pk).update(comment_count=5)
+        Comment.objects.filter(pk=comment.pk).update(reply_count=0)
+        out = StringIO()
+        call_command('reconcile_comment_counts', batch_size=1, stdout=out)
+        self.post.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual((self.post.comment_count, comment.reply_count), (1, 1))
+        self.assertIn('Fixed comment_count on 1 post(s)', out.getvalue())
+        self.assertIn('Fixed reply_count on 1 comment(s)', out.getvalue())
+
+    def test_migration_counts_existing_rows(self):
+        import importlib
+        from types import SimpleNamespace
+        from django.apps import apps
+        comment = Comment.objects.create(user=self.user, post=self.post, body='Comment')
+        Reply.objects.create(user=self.user, comment=comment, body='Reply')
+        Reply.objects.create(user=self.user, comment=comment, body='Reply')
+        Post.objects.update(comment_count=5)
+        Comment.objects.update(reply_count=0)
+        migration = importlib.import_module('blogapp.migrations.0011_comment_reply_counts')
+        migration.count_existing(apps, SimpleNamespace(connection=connection))
+        self.post.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual((self.post.comment_count, comment.reply_count), (1, 2))
+
 
 
 class PostSearchAPIViewTestCase(APITestCase):
@@ -195,9 +617,9 @@ class PostSearchAPIViewTestCase(APITestCase):
         self.assertEqual(response.status_code, 200)
 
         # Check that the correct posts were returned
-        self.assertEqual(len(response.data), 2)
-        self.assertEqual(response.data[0]['title'], 'Test Post 1')
-        self.assertEqual(response.data[1]['title'], 'Test Post 2')
+        results = response.data['results']
+        self.assertEqual(len(results), 2)
+        self.assertCountEqual([post['title'] for post in results], ['Test Post 1', 'Test Post 2'])
 
     def test_search_posts_empty(self):
         # Search for posts with the keyword "invalid"
@@ -206,13 +628,47 @@ class PostSearchAPIViewTestCase(APITestCase):
         self.assertEqual(response.status_code, 200)
 
         # Check that no posts were returned
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
+
+    def test_search_ranks_title_matches_first(self):
+        post = Post.objects.create(title='Different', body='a post about nothing', user=self.user)
+        response = self.client.get(reverse('post-search') + '?query=different')
+        self.assertEqual([result['id'] for result in response.data['results']], [post.id, self.post3.id])
+
+    def test_search_phrase_and_prefix(self):
+        response = self.client.get(reverse('post-search') + '?query="another test"')
+        self.assertEqual([post['id'] for post in response.data['results']], [self.post2.id])
+
+        response = self.client.get(reverse('post-search') + '?query=differ*')
+        self.assertEqual([post['id'] for post in response.data['results']], [self.post3.id])
+
+    def test_search_highlights_matches(self):
+        response = self.client.get(reverse('post-search') + '?query=another')
+        highlight = response.data['results'][0]['highlight']
+        self.assertEqual(highlight['title'], 'Test Post 2')
+        self.assertIn('<mark>Another</mark>', highlight['body'])
+
+    def test_search_ignores_query_operators(self):
+        response = self.client.get(reverse('post-search'), {'query': 'test" ^ ( :'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_search_index_follows_edits_and_deletes(self):
+        self.post1.body = 'Now about gardening'
+        self.post1.title = 'Garden'
+        self.post1.save()
+        self.post2.delete()
+        response = self.client.get(reverse('post-search') + '?query=test')
+        self.assertEqual(len(response.data['results']), 0)
+        response = self.client.get(reverse('post-search') + '?query=gardening')
+        self.assertEqual([post['id'] for post in response.data['results']], [self.post1.id])
 
 
 class ReplyAPIViewTestCase(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='testuser', password='testpass')
-        self.comment = Comment.objects.create(user=self.user, post_id=1, body='Test Comment')
+        self.post = Post.objects.create(user=self.user, title='Test Post', body='Test body')
+        self.comment = Comment.objects.create(user=self.user, post=self.post, body='Test Comment')
 
     def test_create_reply(self):
         self.client.force_authenticate(user=self.user)
@@ -223,10 +679,928 @@ class ReplyAPIViewTestCase(APITestCase):
         reply = Reply.objects.last()
         serializer = ReplySerializer(reply)
         self.assertEqual(response.data, serializer.data)
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.reply_count, 1)
+        reply.delete()
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.reply_count, 0)
 
     def test_create_reply_with_invalid_data(self):
         self.client.force_authenticate(user=self.user)
         url = reverse('reply-comment', kwargs={'pk': self.comment.id})
         data = {'invalid': 'data'}
         response = self.client.post(url, data, format='json')
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_replies_paginated(self):
+        replies = [Reply.objects.create(user=self.user, comment=self.comment, body='Reply %d' % i) for i in range(3)]
+        self.client.force_authenticate(user=self.user)
+        url = reverse('reply-comment', kwargs={'pk': self.comment.id}) + '?page_size=2'
+        response = self.client.get(url)
+        self.assertEqual([reply['id'] for reply in response.data['results']], [replies[0].id, replies[1].id])
+        self.assertEqual(response.data['results'][0]['username'], 'testuser')
+        response = self.client.get(response.data['next'])
+        self.assertEqual([reply['id'] for reply in response.data['results']], [replies[2].id])
+        self.assertIsNone(response.data['next'])
+
+
+class CommentThreadAPIViewTestCase(APITestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username='user%d' % i, password='testpass') for i in range(3)]
+        self.post = Post.objects.create(user=self.users[0], title='Test Post', body='Test body')
+        self.comments = [
+            Comment.objects.create(user=self.users[i % 3], post=self.post, body='Comment %d' % i) for i in range(4)
+        ]
+        for comment in self.comments:
+            for i in range(3):
+                Reply.objects.create(user=self.users[i], comment=comment, body='Reply %d' % i)
+        self.url = reverse('comment-thread', kwargs={'pk': self.post.pk})
+        self.client.force_authenticate(user=self.users[0])
+
+    def test_thread_nests_replies(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first = response.data['results'][0]
+        self.assertEqual(first['id'], self.comments[-1].id)
+        self.assertEqual(first['username'], self.comments[-1].user.username)
+        self.assertEqual([reply['body'] for reply in first['replies']], ['Reply 0', 'Reply 1', 'Reply 2'])
+        self.assertEqual([reply['username'] for reply in first['replies']], ['user0', 'user1', 'user2'])
+        self.assertIsNone(first['replies_next'])
+
+    def test_thread_query_count_is_bounded(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url + '?page_size=4')
+        self.assertEqual(len(response.data['results']), 4)
+        Comment.objects.create(user=self.users[1], post=self.post, body='One more')
+        with self.assertNumQueries(3):
+            self.client.get(self.url + '?page_size=5')
+
+    def test_thread_paginates_both_levels(self):
+        response = self.client.get(self.url + '?page_size=3&replies=2')
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+        first = response.data['results'][0]
+        self.assertEqual([reply['body'] for reply in first['replies']], ['Reply 0', 'Reply 1'])
+
+        response = self.client.get(first['replies_next'])
+        self.assertEqual([reply['body'] for reply in response.data['results']], ['Reply 2'])
+
+    def test_thread_inlines_at_least_one_reply(self):
+        first = self.client.get(self.url + '?replies=0').data['results'][0]
+        self.assertEqual([reply['body'] for reply in first['replies']], ['Reply 0'])
+        self.assertIn('page_size=1', first['replies_next'])
+        response = self.client.get(first['replies_next'])
+        self.assertEqual([reply['body'] for reply in response.data['results']], ['Reply 1'])
+
+    def test_thread_of_nonexistent_post(self):
+        response = self.client.get(reverse('comment-thread', kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BulkImportExportTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass', is_staff=True)
+        self.author = User.objects.create_user(username='author', password='testpass')
+        self.client.force_authenticate(user=self.admin)
+
+    def post_lines(self, lines):
+        body = '\n'.join(json.dumps(line) if not isinstance(line, str) else line for line in lines)
+        return self.client.post(reverse('post-import'), data=body, content_type='application/x-ndjson')
+
+    def test_import_posts_with_comments(self):
+        existing = Post.objects.create(user=self.author, title='Existing', body='Already there')
+        response = self.post_lines([
+            {'title': 'First', 'body': 'One', 'comments': [{'body': 'Nice', 'user': 'author'}, {'body': 'Thanks'}]},
+            {'title': 'Second', 'body': 'Two', 'user': 'author'},
+            {'type': 'comment', 'post': existing.pk, 'body': 'Late comment'},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['posts'], response.data['comments'], response.data['errors']), (2, 3, []))
+        first = Post.objects.get(title='First')
+        self.assertEqual(first.user, self.admin)
+        self.assertEqual(list(first.comments.order_by('id').values_list('body', 'user__username')),
+                         [('Nice', 'author'), ('Thanks', 'admin')])
+        self.assertEqual(Post.objects.get(title='Second').user, self.author)
+        self.assertTrue(existing.comments.filter(body='Late comment').exists())
+        first.refresh_from_db()
+        existing.refresh_from_db()
+        self.assertEqual((first.comment_count, existing.comment_count), (2, 1))
+
+    def test_import_reports_invalid_lines(self):
+        response = self.post_lines([
+            '{not json',
+            {'title': '', 'body': 'No title'},
+            {'title': 'x' * 101, 'body': 'Too long'},
+            {'title': 'Ghost', 'body': 'Nobody', 'user': 'ghost'},
+            {'type': 'comment', 'post': 999, 'body': 'Orphan'},
+            {'title': 'Fine', 'body': 'Kept'},
+        ])
+        self.assertEqual(response.data['posts'], 1)
+        self.assertEqual([error['line'] for error in response.data['errors']], [1, 2, 3, 4, 5])
+        self.assertEqual(list(Post.objects.values_list('title', flat=True)), ['Fine'])
+
+    def test_import_rejects_invalid_utf8_and_boolean_posts(self):
+        Post.objects.create(pk=1, user=self.author, title='First', body='Has pk 1')
+        body = b'{"title": "\xff", "body": "Latin-1"}\n' + json.dumps({'type': 'comment', 'post': True, 'body': 'Bool'}).encode()
+        body += b'\n' + json.dumps({'title': 'Fine', 'body': 'Kept'}).encode()
+        response = self.client.post(reverse('post-import'), data=body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([error['line'] for error in response.data['errors']], [1, 2])
+        self.assertIn('UTF-8', response.data['errors'][0]['error'])
+        self.assertFalse(Comment.objects.exists())
+
+    def test_imported_posts_reach_feeds_and_trending(self):
+        reader = User.objects.create_user(username='reader', password='testpass')
+        celebrity = User.objects.create_user(username='celebrity', password='testpass')
+        toggle_follow(reader.id, self.author.id)
+        toggle_follow(reader.id, celebrity.id)
+        with override_settings(BLOGAPP={'FEED_FANOUT_LIMIT': 2}):
+            toggle_follow(self.admin.id, celebrity.id)
+            self.post_lines([
+                {'title': 'Fanned out', 'body': 'Body', 'user': 'author'},
+                {'title': 'Merged on read', 'body': 'Body', 'user': 'celebrity'},
+            ])
+        fanned_out, merged = Post.objects.get(title='Fanned out'), Post.objects.get(title='Merged on read')
+        self.assertEqual(set(FeedEntry.objects.filter(post=fanned_out).values_list('user__username', flat=True)), {'author', 'reader'})
+        self.assertEqual(list(FeedEntry.objects.filter(post=merged).values_list('user__username', flat=True)), ['celebrity'])
+        self.assertEqual(TrendingScore.objects.filter(post__in=[fanned_out, merged]).count(), 2)
+
+    def test_import_keeps_only_the_first_errors(self):
+        from .bulk import import_posts
+        result = import_posts(['{not json'] * 250 + [json.dumps({'title': 'Fine', 'body': 'Kept'})], self.admin.id, max_errors=10)
+        self.assertEqual((result.posts, result.error_count), (1, 250))
+        self.assertEqual([error['line'] for error in result.errors], list(range(1, 11)))
+
+    def test_import_and_export_are_admin_only(self):
+        self.client.force_authenticate(user=self.author)
+        self.assertEqual(self.post_lines([{'title': 'T', 'body': 'B'}]).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(reverse('post-export')).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_round_trips_through_import_command(self):
+        for i in range(5):
+            post = Post.objects.create(user=self.author, title='Post %d' % i, body='Body %d' % i)
+            Comment.objects.create(user=self.admin, post=post, body='Comment %d' % i)
+        with override_settings(BLOGAPP={'BULK_CHUNK_SIZE': 2}):
+            response = self.client.get(reverse('post-export'))
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line)['title'] for line in lines], ['Post %d' % i for i in range(5)])
+
+        Post.objects.all().delete()
+        path = os.path.join(tempfile.mkdtemp(), 'posts.jsonl')
+        with open(path, 'w') as output:
+            output.write('\n'.join(lines))
+        out = StringIO()
+        call_command('import_posts', path, user='admin', chunk_size=2, stdout=out)
+        self.assertIn('Imported 5 post(s) and 5 comment(s)', out.getvalue())
+        self.assertEqual(Post.objects.filter(user=self.author).count(), 5)
+        self.assertEqual(Comment.objects.filter(user=self.admin, post__title='Post 3').get().body, 'Comment 3')
+
+
+    def test_export_pages_the_comments(self):
+        from .bulk import export_posts
+        posts = [Post.objects.create(user=self.author, title='Post %d' % i, body='Body') for i in range(3)]
+        for i in range(5):
+            Comment.objects.create(user=self.admin, post=posts[1], body='Comment %d' % i)
+        Comment.objects.create(user=self.admin, post=posts[2], body='Last')
+        with CaptureQueriesContext(connection) as queries:
+            lines = [json.loads(line) for line in export_posts(chunk_size=2)]
+        self.assertEqual([[comment['body'] for comment in line['comments']] for line in lines],
+                         [[], ['Comment %d' % i for i in range(5)], ['Last']])
+        self.assertTrue(all('LIMIT 2' in query['sql'] for query in queries))
+
+class ExplainQueriesTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='testpass')
+        post = Post.objects.create(user=self.user, title='Indexed post', body='Body')
+        comment = Comment.objects.create(user=self.user, post=post, body='Comment')
+        Reply.objects.create(user=self.user, comment=comment, body='Reply')
+
+    def test_listings_do_not_scan_post_table(self):
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        self.assertIn('No full scans', out.getvalue())
+        self.assertNotIn('full scan of blogapp_', out.getvalue())
+
+    def test_full_scans_above_threshold_fail(self):
+        from unittest import mock
+        # a lookup on a column without an index reads all of auth_user
+        unindexed = [('SELECT id FROM auth_user WHERE first_name = %s', ('writer',))]
+        err = StringIO()
+        with mock.patch('blogapp.query_plans.record_queries', return_value=unindexed), self.assertRaises(CommandError):
+            call_command('explain_queries', min_rows=1, stdout=StringIO(), stderr=err)
+        self.assertIn('[users-list] full scan of auth_user', err.getvalue())
+
+    def test_index_scans_count_as_full_scans(self):
+        from unittest import mock
+        # walks the whole of an index, behind an alias
+        counted = [('SELECT COUNT(*) FROM "blogapp_post" U0 WHERE NOT U0."is_deleted"', ())]
+        err = StringIO()
+        with mock.patch('blogapp.query_plans.record_queries', return_value=counted), self.assertRaises(CommandError):
+            call_command('explain_queries', min_rows=1, stdout=StringIO(), stderr=err)
+        self.assertIn('full scan of blogapp_post', err.getvalue())
+
+
+class SQLiteProfileTestCase(TestCase):
+    def test_pragmas_applied_to_new_connections(self):
+        path = os.path.join(tempfile.mkdtemp(), 'profile.sqlite3')
+        settings_dict = dict(connection.settings_dict, NAME=path, OPTIONS={'transaction_mode': 'immediate'})
+        wrapper = SQLiteDatabaseWrapper(settings_dict, alias='profile')
+        pragmas = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 1234}
+        try:
+            with override_settings(BLOGAPP={'SQLITE_PRAGMAS': pragmas}):
+                with wrapper.cursor() as cursor:
+                    values = []
+                    for name in pragmas:
+                        cursor.execute('PRAGMA %s' % name)
+                        values.append(cursor.fetchone()[0])
+            self.assertEqual(values, ['wal', 1, 1234])
+            self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+            with CaptureQueriesContext(wrapper) as queries:
+                wrapper._start_transaction_under_autocommit()
+                wrapper.cursor().execute('ROLLBACK')
+        finally:
+            wrapper.close()
+        self.assertEqual(queries.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+@override_settings(BLOGAPP={'READ_REPLICAS': ['replica'], 'REPLICA_PIN_SECONDS': 10})
+class ReplicaRoutingTestCase(APITransactionTestCase):
+    # not APITestCase, its wrapping transaction on the primary keeps every read there
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='writer', password='testpass')
+        User.objects.using('replica').create(pk=self.user.pk, username='writer')
+        self.post = Post.objects.create(user=self.user, title='On the primary', body='Body')
+        Post.objects.using('replica').create(pk=self.post.pk, user_id=self.user.pk, title='Replica copy', body='Body')
+        self.client.force_authenticate(user=self.user)
+
+    def titles(self):
+        return [post['title'] for post in self.client.get(reverse('post-list')).data['results']]
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.titles(), ['Replica copy'])
+        response = self.client.get(reverse('post-detail', kwargs={'pk': self.post.pk}))
+        self.assertEqual(response.data['title'], 'Replica copy')
+
+    def test_writer_is_pinned_to_primary(self):
+        response = self.client.post(reverse('like', kwargs={'pk': self.post.pk}))
+        self.assertEqual(response.data['like_count'], 1)
+        self.assertEqual(self.titles(), ['On the primary'])
+
+        other = User.objects.create_user(username='reader', password='testpass')
+        User.objects.using('replica').create(pk=other.pk, username='reader')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.titles(), ['Replica copy'])
+
+    def test_instances_read_from_replica_are_saved_to_primary(self):
+        replica_post = Post.objects.using('replica').get(pk=self.post.pk)
+        replica_post.title = 'Edited'
+        replica_post.save()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).title, 'Edited')
+        self.assertEqual(Post.objects.using('replica').get(pk=self.post.pk).title, 'Replica copy')
+
+
+class AsyncReadAPIViewTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='writer', password='testpass')
+        self.posts = [Post.objects.create(user=self.user, title='Post %d' % i, body='Body') for i in range(3)]
+        for i in range(3):
+            Comment.objects.create(user=self.user, post=self.posts[0], body='Comment %d' % i)
+        token = 'Bearer %s' % AccessToken.for_user(self.user)
+        self.auth = {'HTTP_AUTHORIZATION': token}
+        # AsyncClient takes raw header names on Django 4.1
+        self.async_auth = {'authorization': token}
+
+    async def sync_and_async(self, name, query='', **kwargs):
+        sync = await sync_to_async(self.client.get)(reverse(name, kwargs=kwargs) + query, **self.auth)
+        response = await self.async_client.get(reverse('async-' + name, kwargs=kwargs) + query, **self.async_auth)
+        return sync, response
+
+    async def test_responses_match_sync_views(self):
+        cases = [
+            ('post-list', '?page_size=2', {}),
+            ('post-detail', '', {'pk': self.posts[0].pk}),
+            ('user-post', '', {'username': 'writer'}),
+            ('comment', '?page_size=2', {'pk': self.posts[0].pk}),
+            ('post-detail', '', {'pk': 999}),
+            ('post-detail', '', {'pk': self.posts[1].pk}),
+        ]
+        for name, query, kwargs in cases:
+            sync, response = await self.sync_and_async(name, query, **kwargs)
+            self.assertEqual(response.status_code, sync.status_code, name)
+            self.assertEqual(response.content.replace(b'/async', b''), sync.content, name)
+            # list ETags hash the request path, which differs
+            self.assertEqual(response.has_header('ETag'), sync.has_header('ETag'), name)
+        self.assertEqual(response.get('ETag'), sync.get('ETag'))
+
+    async def test_conditional_get_and_pagination(self):
+        response = await self.async_client.get(reverse('async-post-list') + '?page_size=2', **self.async_auth)
+        self.assertEqual(len(response.json()['results']), 2)
+        following = await self.async_client.get(response.json()['next'], **self.async_auth)
+        self.assertEqual([post['title'] for post in following.json()['results']], ['Post 0'])
+        not_modified = await self.async_client.get(
+            reverse('async-post-list') + '?page_size=2', **{'if-none-match': response['ETag']}, **self.async_auth
+        )
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_requires_valid_token(self):
+        response = await self.async_client.get(reverse('async-post-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        response = await self.async_client.get(reverse('async-post-list'), authorization='Bearer nope')
+        sync = await sync_to_async(self.client.get)(reverse('post-list'), HTTP_AUTHORIZATION='Bearer nope')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+        self.assertEqual(response.json(), sync.json())
+
+    async def test_errors_raised_by_the_view_are_rendered(self):
+        sync, response = await self.sync_and_async('post-list', '?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json(), sync.json())
+
+
+class EventStreamTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='testpass')
+        self.post = Post.objects.create(user=self.user, title='Live post', body='Body')
+        self.token = str(AccessToken.for_user(self.user))
+
+    def communicator(self, path, query=''):
+        async def django_application(scope, receive, send):
+            raise AssertionError('should not reach Django')
+        scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode(), 'headers': []}
+        return ApplicationCommunicator(EventStreamRouter(django_application), scope)
+
+    def create_comment(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(user=self.user, post=self.post, body='Hello')
+
+    def like(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            toggle_like(self.user.id, self.post.id)
+
+    async def test_post_stream_pushes_comments_and_likes(self):
+        communicator = self.communicator('/api/blogapp/post/%d/events/' % self.post.pk, 'token=' + self.token)
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output()
+        self.assertEqual((start['status'], dict(start['headers'])[b'content-type']), (200, b'text/event-stream'))
+        self.assertEqual((await communicator.receive_output())['body'], b': connected\n\n')
+
+        await sync_to_async(self.create_comment)()
+        body = (await communicator.receive_output())['body'].decode()
+        self.assertTrue(body.startswith('event: comment\ndata: '))
+        self.assertEqual(json.loads(body.split('data: ')[1])['body'], 'Hello')
+
+        await sync_to_async(self.like)()
+        body = (await communicator.receive_output())['body'].decode()
+        self.assertEqual(json.loads(body.split('data: ')[1]), {'post': self.post.pk, 'like_count': 1})
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait()
+        self.assertFalse(get_broker().has_subscribers(post_channel(self.post.pk)))
+
+    async def test_stream_requires_token_and_post(self):
+        communicator = self.communicator('/api/blogapp/events/')
+        await communicator.send_input({'type': 'http.request'})
+        self.assertEqual((await communicator.receive_output())['status'], 401)
+        communicator = self.communicator('/api/blogapp/post/999/events/', 'token=' + self.token)
+        await communicator.send_input({'type': 'http.request'})
+        self.assertEqual((await communicator.receive_output())['status'], 404)
+
+    @override_settings(BLOGAPP={'EVENT_QUEUE_SIZE': 2})
+    async def test_slow_subscriber_gets_resync(self):
+        broker = LocalBroker()
+        subscription = broker.subscribe('posts')
+        for i in range(5):
+            broker.publish('posts', b'message %d' % i)
+        await asyncio.sleep(0)
+        self.assertEqual(subscription.queue.qsize(), 2)
+        self.assertEqual(await subscription.get(), RESYNC_MESSAGE)
+        broker.publish('posts', b'fresh')
+        self.assertEqual(await subscription.get(), b'fresh')
+        subscription.close()
+        self.assertFalse(broker.has_subscribers('posts'))
+
+
+class FeedAPIViewTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader', password='testpass')
+        self.author = User.objects.create_user(username='author', password='testpass')
+        self.other = User.objects.create_user(username='other', password='testpass')
+        self.old_post = Post.objects.create(user=self.author, title='Before follow', body='Body')
+        self.client.force_authenticate(user=self.reader)
+
+    def feed_titles(self, **params):
+        response = self.client.get(reverse('feed'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['title'] for post in response.data['results']], response.data['next']
+
+    def test_follow_backfills_and_new_posts_fan_out(self):
+        response = self.client.post(reverse('follow', kwargs={'username': 'author'}))
+        self.assertEqual(response.data, {'following': True})
+        self.assertEqual(UserProfileStats.objects.get(user=self.author).follower_count, 1)
+        self.assertEqual(UserProfileStats.objects.get(user=self.reader).following_count, 1)
+        Post.objects.create(user=self.author, title='After follow', body='Body')
+        Post.objects.create(user=self.other, title='Not followed', body='Body')
+        Post.objects.create(user=self.reader, title='Own post', body='Body')
+        self.assertEqual(self.feed_titles()[0], ['Own post', 'After follow', 'Before follow'])
+
+        response = self.client.post(reverse('follow', kwargs={'username': 'author'}))
+        self.assertEqual(response.data, {'following': False})
+        self.assertEqual(UserProfileStats.objects.get(user=self.author).follower_count, 0)
+        self.assertEqual(self.feed_titles()[0], ['Own post'])
+
+    def test_feed_pages_follow_cursor(self):
+        Follow.objects.create(follower=self.reader, followee=self.author)
+        for i in range(5):
+            Post.objects.create(user=self.author, title='Post %d' % i, body='Body')
+        titles, next_link = self.feed_titles(page_size=3)
+        self.assertEqual(titles, ['Post 4', 'Post 3', 'Post 2'])
+        response = self.client.get(next_link)
+        self.assertEqual([post['title'] for post in response.data['results']], ['Post 1', 'Post 0'])
+        self.assertIsNone(response.data['next'])
+
+    @override_settings(BLOGAPP={'FEED_FANOUT_LIMIT': 1})
+    def test_celebrity_posts_are_merged_on_read(self):
+        self.client.post(reverse('follow', kwargs={'username': 'author'}))
+        Post.objects.create(user=self.author, title='Celebrity post', body='Body')
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader, post__title='Celebrity post').exists())
+        Post.objects.create(user=self.reader, title='Own post', body='Body')
+        titles, next_link = self.feed_titles(page_size=2)
+        self.assertEqual(titles, ['Own post', 'Celebrity post'])
+        self.assertEqual(self.client.get(next_link).data['results'][0]['title'], 'Before follow')
+
+    def test_follow_errors(self):
+        response = self.client.post(reverse('follow', kwargs={'username': 'reader'}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('follow', kwargs={'username': 'nobody'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Follow.objects.exists())
+
+
+class TrendingPostAPIViewTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='testpass')
+        self.quiet = Post.objects.create(user=self.user, title='Quiet', body='Body')
+        self.liked = Post.objects.create(user=self.user, title='Liked', body='Body')
+        self.discussed = Post.objects.create(user=self.user, title='Discussed', body='Body')
+        self.client.force_authenticate(user=self.user)
+
+    def test_scores_add_up_in_log_space(self):
+        when = EPOCH + timedelta(days=400)
+        post = Post.objects.create(user=self.user, title='Math', body='Body')
+        TrendingScore.objects.filter(post=post).delete()
+        record_activity(post.id, 'like', when)
+        record_activity(post.id, 'like', when)
+        self.assertAlmostEqual(TrendingScore.objects.get(post=post).score, log_weight('like', when) + math.log(2))
+        # one half-life later a like weighs as much as the two earlier ones
+        with override_settings(BLOGAPP={'TRENDING_HALF_LIFE': 3600}):
+            self.assertAlmostEqual(log_weight('like', when + timedelta(hours=1)), log_weight('like', when) + math.log(2))
+
+    def test_trending_ranks_activity_after_refresh(self):
+        toggle_like(self.user.id, self.liked.id)
+        self.client.post(reverse('comment', args=[self.discussed.id]), {'body': 'Hot take'})
+        out = StringIO()
+        call_command('refresh_trending', stdout=out)
+        self.assertIn('Ranked 3 trending post(s)', out.getvalue())
+
+        response = self.client.get(reverse('post-trending'), {'page_size': 2})
+        self.assertEqual([post['title'] for post in response.data['results']], ['Discussed', 'Liked'])
+        self.assertEqual(response.data['results'][0]['comment_count'], 1)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([post['title'] for post in response.data['results']], ['Quiet'])
+        self.assertIsNone(response.data['next'])
+
+    def test_unlikes_take_the_like_back(self):
+        score = TrendingScore.objects.get(post=self.liked).score
+        for _ in range(3):
+            toggle_like(self.user.id, self.liked.id)
+            toggle_like(self.user.id, self.liked.id)
+        self.assertAlmostEqual(TrendingScore.objects.get(post=self.liked).score, score, places=4)
+        # taking back more than the score holds leaves next to nothing
+        record_activity(self.liked.id, 'like', count=-5)
+        self.assertLess(TrendingScore.objects.get(post=self.liked).score, score - 20)
+
+    @override_settings(BLOGAPP={'LIKE_COUNTER': 'sharded'})
+    def test_sharded_likes_are_scored_on_flush(self):
+        score = TrendingScore.objects.get(post=self.liked).score
+        for user in [self.user] + [User.objects.create_user('fan%d' % i) for i in range(2)]:
+            toggle_like(user.id, self.liked.id)
+        toggle_like(self.user.id, self.liked.id)
+        self.assertEqual(TrendingScore.objects.get(post=self.liked).score, score)
+        call_command('flush_like_counters', stdout=StringIO())
+        # the net two likes
+        expected = score + math.log(1 + 2 * math.exp(log_weight('like') - score))
+        self.assertAlmostEqual(TrendingScore.objects.get(post=self.liked).score, expected, places=4)
+
+    def test_refresh_prunes_decayed_scores(self):
+        TrendingScore.objects.filter(post=self.quiet).update(score=log_weight('post', EPOCH))
+        call_command('refresh_trending', stdout=StringIO())
+        self.assertFalse(TrendingScore.objects.filter(post=self.quiet).exists())
+        response = self.client.get(reverse('post-trending'))
+        self.assertNotIn('Quiet', [post['title'] for post in response.data['results']])
+
+
+class ThrottleTestCase(APITestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        self.user = User.objects.create_user(username='writer', password='testpass')
+        self.other = User.objects.create_user(username='other', password='testpass')
+        self.post = Post.objects.create(user=self.user, title='Post', body='Body')
+        self.url = reverse('like', kwargs={'pk': self.post.id})
+
+    def tearDown(self):
+        get_bucket_store().clear()
+
+    @override_settings(BLOGAPP={'THROTTLE_RATES': {'like': '3/min'}})
+    def test_user_bucket_returns_429_with_retry_after(self):
+        self.client.force_authenticate(user=self.user)
+        codes = [self.client.post(self.url).status_code for _ in range(3)]
+        self.assertEqual(codes, [status.HTTP_200_OK] * 3)
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '20')
+        # reads are not throttled, other users have their own bucket
+        self.assertEqual(self.client.get(reverse('post-detail', kwargs={'pk': self.post.id})).status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.client.post(self.url).status_code, status.HTTP_200_OK)
+
+    @override_settings(BLOGAPP={'THROTTLE_RATES': {'comment': '1/min'}, 'THROTTLE_ENDPOINT_RATES': {'comment': '2/min'}})
+    def test_endpoint_bucket_is_shared_by_all_clients(self):
+        url = reverse('comment', args=[self.post.id])
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.post(url, {'body': 'One'}).status_code, status.HTTP_201_CREATED)
+        # refused by its own bucket, so the shared one keeps its token
+        self.assertEqual(self.client.post(url, {'body': 'Two'}).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.client.post(url, {'body': 'Three'}).status_code, status.HTTP_201_CREATED)
+        third = User.objects.create_user(username='third', password='testpass')
+        self.client.force_authenticate(user=third)
+        self.assertEqual(self.client.post(url, {'body': 'Four'}).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    @override_settings(BLOGAPP={'THROTTLE_MAX_ENTRIES': 2})
+    def test_bucket_refills_and_store_stays_bounded(self):
+        store = LocalBucketStore()
+        self.assertEqual(store.take('a', 1, 1000.0), 0)
+        self.assertGreater(store.take('a', 1, 1000.0), 0)
+        time.sleep(0.002)
+        self.assertEqual(store.take('a', 1, 1000.0), 0)
+        store.take('b', 1, 1.0)
+        store.take('c', 1, 1.0)
+        self.assertEqual(list(store._buckets), ['b', 'c'])
+
+
+class InstrumentationTestCase(APITestCase):
+    def setUp(self):
+        registry.clear()
+        self.user = User.objects.create_user(username='writer', password='testpass')
+        self.admin = User.objects.create_user(username='admin', password='testpass', is_staff=True)
+        Post.objects.create(user=self.user, title='Post', body='Body')
+
+    def metrics(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_server_timing_and_histograms_per_url_name(self):
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('post-list'))
+        query_count = len(queries)
+        timing = response['Server-Timing']
+        self.assertIn('db;desc="%d queries";dur=' % query_count, timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+        metrics = self.metrics()
+        self.assertIn('blogapp_requests_total{view="post-list",method="GET",status="200"} 1', metrics)
+        self.assertIn('blogapp_request_duration_seconds_count{view="post-list",method="GET"} 1', metrics)
+        self.assertIn('blogapp_db_queries_sum{view="post-list",method="GET"} %d.0' % query_count, metrics)
+        self.assertIn('blogapp_response_bytes_sum{view="post-list",method="GET"} %d.0' % len(response.content), metrics)
+        self.assertIn('blogapp_serialize_duration_seconds_bucket{view="post-list",method="GET",le="+Inf"} 1', metrics)
+
+    @override_settings(BLOGAPP={'METRICS_SAMPLE_RATE': 0})
+    def test_unsampled_requests_are_only_counted(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('post-list'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        metrics = self.metrics()
+        self.assertIn('blogapp_requests_total{view="post-list",method="GET",status="200"} 1', metrics)
+        self.assertNotIn('blogapp_request_duration_seconds_count{view="post-list"', metrics)
+
+    async def test_async_requests_stay_async_and_count_queries(self):
+        async def get_response(request):
+            return None
+        self.assertTrue(iscoroutinefunction(InstrumentationMiddleware(get_response)))
+        self.assertTrue(iscoroutinefunction(ReplicaPinMiddleware(get_response)))
+        self.assertFalse(iscoroutinefunction(ReplicaPinMiddleware(lambda request: None)))
+
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        response = await self.async_client.get(reverse('async-post-list'), authorization='Bearer %s' % token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # the queries run in sync_to_async threads
+        self.assertRegex(response['Server-Timing'], r'db;desc="[1-9]\d* queries"')
+
+    @override_settings(BLOGAPP={'METRICS_TOKEN': 'scrape-secret'})
+    def test_metrics_need_staff_or_scrape_token(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class RefreshTokenRotationTestCase(APITestCase):
+    def setUp(self):
+        revoked_cache.clear()
+        self.user = User.objects.create_user('writer', 'writer@dom.com', 'testpass1234')
+        response = self.client.post(reverse('get-token'), {'username': 'writer', 'password': 'testpass1234'})
+        self.refresh = response.data['refresh']
+
+    def test_rotation_revokes_the_used_token_only(self):
+        from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+        # the revocation check and the INSERT, plus the savepoint around it
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse('token-refresh'), {'refresh': self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(AccessToken(response.data['access'])['username'], 'writer')
+        self.assertEqual(RevokedToken.objects.get().jti, BlogRefreshToken(self.refresh, verify=False)['jti'])
+        self.assertFalse(OutstandingToken.objects.exists())
+
+        response = self.client.post(reverse('token-refresh'), {'refresh': response.data['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_reused_token_is_rejected_from_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('token-refresh'), {'refresh': self.refresh})
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('token-refresh'), {'refresh': self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        # another process only finds it in the table
+        revoked_cache.clear()
+        response = self.client.post(reverse('token-refresh'), {'refresh': self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_racing_refresh_loses_on_insert(self):
+        token = BlogRefreshToken(self.refresh)
+        self.assertTrue(token.blacklist())
+        revoked_cache.clear()
+        self.assertFalse(BlogRefreshToken(self.refresh, verify=False).blacklist())
+
+    def test_tokens_blacklisted_before_the_upgrade_stay_revoked(self):
+        import importlib
+        from types import SimpleNamespace
+        from django.apps import apps
+        from rest_framework_simplejwt.tokens import RefreshToken
+        RefreshToken(self.refresh).blacklist()
+        migration = importlib.import_module('blogapp.migrations.0016_copy_blacklisted_tokens')
+        migration.copy_blacklisted_tokens(apps, SimpleNamespace(connection=connection))
+        response = self.client.post(reverse('token-refresh'), {'refresh': self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_purge_deletes_expired_tokens_in_batches(self):
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+        from django.utils import timezone
+        past = timezone.now() - timedelta(days=1)
+        RevokedToken.objects.bulk_create(RevokedToken(jti='old%d' % i, expires_at=past) for i in range(5))
+        RevokedToken.objects.create(jti='live', expires_at=timezone.now() + timedelta(days=1))
+        outstanding = OutstandingToken.objects.create(jti='legacy', token='x', expires_at=past)
+        BlacklistedToken.objects.create(token=outstanding)
+        out = StringIO()
+        call_command('purge_tokens', batch_size=2, stdout=out)
+        self.assertIn('Purged 5 revoked and 1 outstanding expired token(s)', out.getvalue())
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class PasswordHashingPoolTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('writer', 'writer@dom.com', 'testpass1234')
+
+    def login(self, password='testpass1234'):
+        return self.client.post(reverse('get-token'), {'username': 'writer', 'password': password})
+
+    @override_settings(BLOGAPP={'PASSWORD_HASH_WORKERS': 1})
+    def test_login_and_signup_hash_in_the_pool(self):
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.assertEqual(self.login('wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(hashing_pool.pid, os.getpid())
+
+        response = self.client.post(reverse('add_user'), {'username': 'reader', 'password': 'readpass1234'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(User.objects.get(username='reader').check_password('readpass1234'))
+
+    @override_settings(BLOGAPP={'PASSWORD_HASH_WORKERS': 1})
+    def test_pool_replaced_after_a_worker_died(self):
+        from concurrent.futures.process import BrokenProcessPool
+        broken = hashing_pool.get_executor(1)
+        with self.assertRaises(BrokenProcessPool):
+            broken.submit(os._exit, 1).result()
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.assertIsNot(hashing_pool.executor, broken)
+
+    @override_settings(BLOGAPP={'PASSWORD_HASH_WORKERS': 0})
+    def test_outdated_hash_is_upgraded_on_login(self):
+        from django.contrib.auth.hashers import PBKDF2PasswordHasher
+        hasher = PBKDF2PasswordHasher()
+        hasher.iterations = 1000
+        User.objects.filter(pk=self.user.pk).update(password=hasher.encode('testpass1234', hasher.salt()))
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        password = User.objects.get(pk=self.user.pk).password
+        self.assertEqual(password.split('$')[1], str(PBKDF2PasswordHasher.iterations))
+
+    @override_settings(BLOGAPP={'PASSWORD_HASH_WORKERS': 1, 'PASSWORD_HASH_QUEUE_TIMEOUT': 0})
+    def test_full_queue_answers_503(self):
+        hashing_pool.get_executor(1)
+        held = 0
+        while hashing_pool.slots.acquire(blocking=False):
+            held += 1
+        rejected = hashing_pool.rejected
+        try:
+            response = self.login()
+        finally:
+            for _ in range(held):
+                hashing_pool.slots.release()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(hashing_pool.rejected, rejected + 1)
+        self.assertIn('blogapp_password_hash_rejected_total %d' % (rejected + 1), registry.render())
+        self.assertIn('# TYPE blogapp_password_hash_queue_depth gauge', registry.render())
+
+
+class UserDirectoryTestCase(APITestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username, password='testpass') for username in ('alice', 'albert', 'bob', 'Alan')]
+        self.client.force_authenticate(user=self.users[0])
+
+    def test_pages_in_username_order_with_summary(self):
+        post = Post.objects.create(user=self.users[1], title='Post', body='Body')
+        Post.objects.create(user=self.users[1], title='Post', body='Body')
+        self.client.post(reverse('like', kwargs={'pk': post.pk}))
+        self.client.post(reverse('follow', kwargs={'username': 'albert'}))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('users-list'), {'page_size': 2})
+        self.assertEqual([row['username'] for row in response.data['results']], ['Alan', 'albert'])
+        self.assertEqual(dict(response.data['results'][1]), {
+            'id': self.users[1].id, 'username': 'albert', 'post_count': 2, 'like_count': 1,
+            'follower_count': 1, 'following_count': 0,
+        })
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['username'] for row in response.data['results']], ['alice', 'bob'])
+        self.assertIsNone(response.data['next'])
+
+    def test_prefix_is_an_index_range(self):
+        response = self.client.get(reverse('users-list'), {'prefix': 'al'})
+        self.assertEqual([row['username'] for row in response.data['results']], ['albert', 'alice'])
+        self.assertEqual(self.client.get(reverse('users-list'), {'prefix': 'z'}).data['results'], [])
+
+    def test_needs_authentication(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(reverse('users-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_counts_follow_deletes_and_reconcile(self):
+        post = Post.objects.create(user=self.users[2], title='Post', body='Body')
+        self.client.post(reverse('like', kwargs={'pk': post.pk}))
+        stats = UserProfileStats.objects.get(user=self.users[2])
+        self.assertEqual((stats.post_count, stats.like_count), (1, 1))
+        post.delete()
+        stats.refresh_from_db()
+        self.assertEqual((stats.post_count, stats.like_count), (0, 0))
+
+        Post.objects.create(user=self.users[3], title='Post', body='Body')
+        UserProfileStats.objects.filter(user=self.users[3]).update(post_count=7)
+        out = StringIO()
+        call_command('reconcile_user_stats', batch_size=2, stdout=out)
+        self.assertIn('Fixed post and like counts of 1 user(s)', out.getvalue())
+        self.assertEqual(UserProfileStats.objects.get(user=self.users[3]).post_count, 1)
+
+    def test_migration_counts_existing_posts(self):
+        import importlib
+        from types import SimpleNamespace
+        from django.apps import apps
+        for user in self.users[:2]:
+            Post.objects.create(user=user, title='Post', body='Body', like_count=3)
+        UserProfileStats.objects.filter(user=self.users[0]).update(post_count=0, like_count=0)
+        UserProfileStats.objects.filter(user=self.users[1]).delete()
+        migration = importlib.import_module('blogapp.migrations.0014_user_stats_posts_likes')
+        migration.count_existing(apps, SimpleNamespace(connection=connection))
+        stats = UserProfileStats.objects.filter(user__in=self.users[:2]).order_by('user_id')
+        self.assertEqual([(row.post_count, row.like_count) for row in stats], [(1, 3), (1, 3)])
+
+
+class SoftDeleteTestCase(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='testpass')
+        self.reader = User.objects.create_user('reader', password='testpass')
+        self.post = Post.objects.create(user=self.author, title='Viral', body='Body')
+        self.other = Post.objects.create(user=self.author, title='Other', body='Body')
+        self.client.force_authenticate(user=self.reader)
+        self.client.post(reverse('follow', kwargs={'username': 'author'}))
+        for post in (self.post, self.other):
+            self.client.post(reverse('like', kwargs={'pk': post.pk}))
+            self.client.post(reverse('comment', kwargs={'pk': post.pk}), {'body': 'Comment'}, format='json')
+        comment = Comment.objects.get(post=self.post)
+        self.client.post(reverse('reply-comment', kwargs={'pk': comment.pk}), {'body': 'Reply'}, format='json')
+        self.comment = comment
+
+    def delete(self):
+        self.client.force_authenticate(user=self.author)
+        response = self.client.delete(reverse('post-detail', kwargs={'pk': self.post.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_delete_hides_the_post_at_once(self):
+        call_command('refresh_trending', stdout=StringIO())
+        with self.assertNumQueries(9):
+            # post lookup and author, the flag, the stats, feed and trending rows, plus the savepoint around them
+            self.delete()
+        self.assertTrue(Post.all_objects.filter(pk=self.post.pk, is_deleted=True).exists())
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+
+        detail = reverse('post-detail', kwargs={'pk': self.post.pk})
+        self.assertEqual(self.client.get(detail).status_code, status.HTTP_404_NOT_FOUND)
+        ids = [row['id'] for row in self.client.get(reverse('post-list')).data['results']]
+        self.assertEqual(ids, [self.other.pk])
+        self.assertEqual(self.client.post(reverse('like', kwargs={'pk': self.post.pk})).status_code, status.HTTP_404_NOT_FOUND)
+        reply = self.client.post(reverse('reply-comment', kwargs={'pk': self.comment.pk}), {'body': 'Late'}, format='json')
+        self.assertEqual(reply.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('post-search'), {'query': 'viral'}).data['results'], [])
+        self.assertEqual([row['id'] for row in self.client.get(reverse('feed')).data['results']], [self.other.pk])
+        self.assertEqual([row['id'] for row in self.client.get(reverse('post-trending')).data['results']], [self.other.pk])
+
+        stats = UserProfileStats.objects.get(user=self.author)
+        self.assertEqual((stats.post_count, stats.like_count), (1, 1))
+        self.assertEqual(self.client.delete(detail).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_purge_deletes_dependents_in_batches(self):
+        self.delete()
+        Like.objects.bulk_create(Like(user=User.objects.create_user('fan%d' % i), post=self.post) for i in range(5))
+        out = StringIO()
+        call_command('purge_deleted_posts', batch_size=2, stdout=out)
+        # the post, 6 likes, its comment and reply
+        self.assertIn('Purged 1 deleted post(s), 9 row(s) in total', out.getvalue())
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
+        self.assertFalse(Like.objects.filter(post_id=self.post.pk).exists())
+        self.assertFalse(Reply.objects.filter(comment_id=self.comment.pk).exists())
+        self.assertEqual(Comment.objects.filter(post=self.other).count(), 1)
+        self.assertEqual(Like.objects.filter(post=self.other).count(), 1)
+        self.assertEqual(UserProfileStats.objects.get(user=self.author).post_count, 1)
+
+
+class PostEditTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='testpass')
+        self.reader = User.objects.create_user('reader', password='testpass')
+        self.post = Post.objects.create(user=self.author, title='Title', body='Body')
+        self.url = reverse('post-detail', kwargs={'pk': self.post.pk})
+        self.client.force_authenticate(user=self.author)
+
+    def test_edit_is_one_update_of_the_sent_fields(self):
+        etag = self.client.get(self.url)['ETag']
+        # the conditional UPDATE, then the row read back by primary key
+        with self.assertNumQueries(2):
+            response = self.client.put(self.url, {'title': 'New Title'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['title'], response.data['body']), ('New Title', 'Body'))
+        self.assertNotEqual(response['ETag'], etag)
+        # the cached entry is gone, the next read builds the same representation
+        self.assertEqual(self.client.get(self.url)['ETag'], response['ETag'])
+        self.assertEqual(self.client.get(reverse('post-search'), {'query': 'new'}).data['results'][0]['id'], self.post.pk)
+
+    def test_likes_in_between_are_kept(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_authenticate(user=self.reader)
+        self.client.post(reverse('like', kwargs={'pk': self.post.pk}))
+        self.client.force_authenticate(user=self.author)
+        response = self.client.put(self.url, {'body': 'Edited'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['like_count'], 1)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).like_count, 1)
+
+    def test_stale_if_match_is_412(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.put(self.url, {'title': 'First'}, format='json', HTTP_IF_MATCH=etag).status_code, status.HTTP_200_OK)
+        response = self.client.put(self.url, {'title': 'Second'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        response = self.client.put(self.url, {'title': 'Weak'}, format='json', HTTP_IF_MATCH='W/' + etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).title, 'First')
+        self.assertEqual(self.client.put(self.url, {'title': 'Any'}, format='json', HTTP_IF_MATCH='*').status_code, status.HTTP_200_OK)
+
+    def test_owner_and_existence_checks(self):
+        self.client.force_authenticate(user=self.reader)
+        self.assertEqual(self.client.put(self.url, {'title': 'Mine'}, format='json').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(user=self.author)
+        self.assertEqual(self.client.put(self.url, {}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.put(self.url, {'title': 'x' * 101}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.delete(self.url)
+        self.assertEqual(self.client.put(self.url, {'title': 'Gone'}, format='json').status_code, status.HTTP_404_NOT_FOUND)
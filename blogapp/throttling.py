@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from .conf import blogapp_settings
+
+"""
+Token bucket throttles for the write endpoints.
+
+A bucket holds up to N tokens and refills at N per period, every request takes one token and a
+request finding the bucket empty gets a 429 whose Retry-After says when the next token arrives.
+So a client can burst N requests and then keeps going at the sustained rate, nothing more.
+
+Rates are "<N>/<period>" with period one of s, min, hour, day :
+    BLOGAPP['THROTTLE_RATES'][scope]           bucket of every user (or client IP) on the endpoint
+    BLOGAPP['THROTTLE_ENDPOINT_RATES'][scope]  one bucket shared by every client of the endpoint,
+                                               caps what the endpoint can cost the database
+A scope without a rate is not throttled. Safe methods (GET, HEAD, OPTIONS) are never throttled.
+
+BLOGAPP['THROTTLE_STORE'] picks where the buckets live :
+    'local' : a dict in this process, each worker throttles on its own (a few microseconds per check)
+    'redis' : one Redis hash per bucket updated by a Lua script (BLOGAPP['THROTTLE_STORE_URL']),
+              shared by every process, costs a round trip per check
+
+"""
+
+PERIODS = {'s': 1, 'sec': 1, 'second': 1, 'm': 60, 'min': 60, 'minute': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+@lru_cache(maxsize = None)
+def parse_rate(rate):
+    """
+    Returns : (capacity, tokens refilled per second) of a "<N>/<period>" rate, None for None
+    """
+    if rate is None:
+        return None
+    try:
+        count, period = rate.split('/')
+        capacity = int(count)
+        return capacity, capacity / PERIODS[period]
+    except (ValueError, KeyError):
+        raise ImproperlyConfigured('Invalid throttle rate %r, expected "<N>/<s|min|hour|day>"' % rate)
+
+
+class LocalBucketStore:
+    """
+    Buckets of this process, the least recently used is evicted above THROTTLE_MAX_ENTRIES
+    (it was idle the longest, so it would be full again anyway)
+    """
+
+    def __init__(self):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate):
+        """
+        Returns : 0 when a token was taken, otherwise seconds until the next token
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+                bucket = self._buckets[key] = [tokens, now]
+                if len(self._buckets) > blogapp_settings.THROTTLE_MAX_ENTRIES:
+                    self._buckets.popitem(last = False)
+            else:
+                self._buckets.move_to_end(key)
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * refill_rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0
+            bucket[0] = tokens
+            return (1 - tokens) / refill_rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisBucketStore:
+    """
+    Buckets in Redis, the refill and the take happen in one script so concurrent workers can't both
+    spend the last token. The clock is the Redis server's, so worker clocks don't need to agree.
+    """
+    prefix = 'blogapp:throttle:'
+    script = """
+        local capacity, refill_rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+        local clock = redis.call('TIME')
+        local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+        local tokens = capacity
+        if bucket[1] then
+            tokens = math.min(capacity, tonumber(bucket[1]) + (now - tonumber(bucket[2])) * refill_rate)
+        end
+        local wait = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+        else
+            wait = (1 - tokens) / refill_rate
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+        redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / refill_rate * 1000))
+        return tostring(wait)
+    """
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("BLOGAPP['THROTTLE_STORE'] = 'redis' needs the redis package")
+        self.client = redis.Redis.from_url(url)
+        self.take_script = self.client.register_script(self.script)
+
+    def take(self, key, capacity, refill_rate):
+        return float(self.take_script(keys = [self.prefix + key], args = [capacity, refill_rate]))
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = blogapp_settings.THROTTLE_STORE
+                if backend == 'local':
+                    _store = LocalBucketStore()
+                elif backend == 'redis':
+                    _store = RedisBucketStore(blogapp_settings.THROTTLE_STORE_URL)
+                else:
+                    raise ImproperlyConfigured("BLOGAPP['THROTTLE_STORE'] must be one of local, redis")
+    return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Arguments : throttle_scope of the view
+    Takes a token from the client's bucket of the scope, then from the endpoint's bucket,
+    so a client refused by its own bucket doesn't drain the one every client shares.
+    Anonymous clients are told apart by IP address.
+    """
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return super().get_ident(request)
+
+    def allow_request(self, request, view):
+        self.wait_time = 0
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None or request.method in SAFE_METHODS:
+            return True
+        store = get_bucket_store()
+        buckets = (
+            ('%s:%s' % (scope, self.get_ident(request)), blogapp_settings.THROTTLE_RATES.get(scope)),
+            ('%s:*' % scope, blogapp_settings.THROTTLE_ENDPOINT_RATES.get(scope)),
+        )
+        for key, rate in buckets:
+            if rate is None:
+                continue
+            self.wait_time = store.take(key, *parse_rate(rate))
+            if self.wait_time:
+                return False
+        return True
+
+    def wait(self):
+        return self.wait_time
@@ -0,0 +1,161 @@
+import threading
+from collections import OrderedDict
+
+from django.db import IntegrityError, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_from_epoch
+
+from .conf import blogapp_settings
+from .models import RevokedToken
+
+"""
+Refresh token revocation with a cost that doesn't grow with traffic.
+
+simplejwt's token_blacklist app writes an OutstandingToken row (with the whole token) for every
+issued refresh token and a BlacklistedToken row for every rotated one, and nothing removes them
+but a single unbatched DELETE. Here only the jti of a revoked token is stored, in RevokedToken
+with the expiry of the token :
+
+    checking  one primary key lookup, revoked jtis seen before are answered from a per-process LRU
+    rotating  one INSERT, which also settles two refreshes racing with the same token : the
+              primary key lets one of them through and the other gets "Token is blacklisted"
+    purging   purge_tokens deletes expired rows in batches on the expires_at index, so the table
+              only ever holds the tokens revoked during one REFRESH_TOKEN_LIFETIME
+
+The LRU only remembers revoked jtis, never that a jti is valid, so a token revoked by another
+process is always seen : a revoked token stays revoked, a valid one may be revoked any moment.
+
+"""
+
+
+class RevokedCache:
+    """
+    Per-process LRU of revoked jtis, at most BLOGAPP['REVOKED_TOKEN_CACHE_SIZE']
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, jti):
+        with self._lock:
+            if jti not in self._entries:
+                return False
+            self._entries.move_to_end(jti)
+            return True
+
+    def add(self, jti):
+        with self._lock:
+            self._entries[jti] = None
+            self._entries.move_to_end(jti)
+            while len(self._entries) > blogapp_settings.REVOKED_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last = False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+revoked_cache = RevokedCache()
+
+
+def is_revoked(jti):
+    if jti in revoked_cache:
+        return True
+    if RevokedToken.objects.filter(pk = jti).exists():
+        revoked_cache.add(jti)
+        return True
+    return False
+
+
+def revoke(jti, expires_at):
+    """
+    Arguments : jti, expiry of the token (datetime)
+    Returns : True when the token got revoked, False when it already was
+    """
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(jti = jti, expires_at = expires_at)
+    except IntegrityError:
+        revoked_cache.add(jti)
+        return False
+    transaction.on_commit(lambda: revoked_cache.add(jti))
+    return True
+
+
+def purge_expired(queryset, batch_size):
+    """
+    Deletes the rows of queryset batch_size primary keys at a time
+    Returns : number of rows deleted
+    """
+    deleted = 0
+    while True:
+        batch = list(queryset.values_list('pk', flat = True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += queryset.model.objects.filter(pk__in = batch).delete()[1].get(queryset.model._meta.label, 0)
+
+
+def purge_revoked_tokens(batch_size = 1000):
+    """
+    Returns : number of revoked tokens deleted because they expired
+    """
+    return purge_expired(RevokedToken.objects.filter(expires_at__lte = aware_utcnow()), batch_size)
+
+
+def purge_outstanding_tokens(batch_size = 1000):
+    """
+    Deletes the expired rows simplejwt's token_blacklist app wrote before BlogRefreshToken
+    Returns : number of outstanding tokens deleted
+    """
+    now = aware_utcnow()
+    purge_expired(BlacklistedToken.objects.filter(token__expires_at__lte = now), batch_size)
+    return purge_expired(OutstandingToken.objects.filter(expires_at__lte = now), batch_size)
+
+
+class BlogRefreshToken(RefreshToken):
+    """
+    RefreshToken checking and writing revocations in RevokedToken instead of the token_blacklist tables
+    """
+
+    def check_blacklist(self):
+        if is_revoked(self.payload[jwt_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        """
+        Returns : True when the token got revoked, False when it already was
+        """
+        return revoke(self.payload[jwt_settings.JTI_CLAIM], datetime_from_epoch(self.payload['exp']))
+
+    @classmethod
+    def for_user(cls, user):
+        # skips BlacklistMixin.for_user, issued tokens are not recorded
+        return super(BlacklistMixin, cls).for_user(user)
+
+
+class RotatingTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    TokenRefreshSerializer that revokes the refresh token it rotates in the same statement
+    that checks it was not used already
+    """
+    token_class = BlogRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        data = {'access': str(refresh.access_token)}
+
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION and not refresh.blacklist():
+                # a concurrent refresh with the same token won
+                raise TokenError(_('Token is blacklisted'))
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
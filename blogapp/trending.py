@@ -0,0 +1,112 @@
+import math
+from datetime import datetime, timezone
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Abs, Exp, Greatest, Least, Ln
+
+from .conf import blogapp_settings
+from .models import TrendingPost, TrendingScore
+
+"""
+Trending posts : posts ranked by their activity (creation, likes, comments, replies), every
+event weighing BLOGAPP['TRENDING_WEIGHTS'][event] and losing half of that weight every
+BLOGAPP['TRENDING_HALF_LIFE'] seconds.
+
+The decayed sum of a post, sum(weight * 2 ** -((now - t) / half_life)), changes with every clock
+tick, but dividing every post's sum by the same 2 ** -(now / half_life) keeps their order. So each
+event adds weight * 2 ** ((t - EPOCH) / half_life) instead, a number that never changes afterwards,
+and TrendingScore keeps the log of the total so it stays in float range for any date :
+
+    score = log(exp(score) + exp(log(weight) + (t - EPOCH) / tau))    (tau = half_life / ln 2)
+
+That is one UPDATE of one row per event and an index on score orders the posts. The
+refresh_trending command copies the top BLOGAPP['TRENDING_SIZE'] of them into TrendingPost with
+their rank, which is what posts/trending/ pages through, and drops the scores that decayed to nothing.
+
+Likes are recorded by the like counter backend (see blogapp/counters.py) as the net change of
+the like count : the sharded counter adds them per post when flush_like_counters runs, off the
+request path, and an unlike takes a like's weight back off, so liking and unliking a post
+over and over doesn't heat it up. Deleted comments and replies are not subtracted.
+
+"""
+
+EPOCH = datetime(2023, 1, 1, tzinfo = timezone.utc)
+
+# scores worth less than this many likes right now are dropped by prune_scores()
+PRUNE_WEIGHT = 0.01
+
+# fraction of a score left when an unlike takes back all of it or more
+REMAINDER = 1e-9
+
+
+def get_tau():
+    return blogapp_settings.TRENDING_HALF_LIFE / math.log(2)
+
+
+def log_weight(event, when = None):
+    """
+    Returns : log of the weight of event (see TRENDING_WEIGHTS) at time when, scaled to EPOCH
+    """
+    when = when or datetime.now(timezone.utc)
+    weight = blogapp_settings.TRENDING_WEIGHTS[event]
+    return math.log(weight) + (when - EPOCH).total_seconds() / get_tau()
+
+
+def record_activity(post_id, event, when = None, using = DEFAULT_DB_ALIAS, count = 1):
+    """
+    Arguments : post id, event name ("post", "like", "comment", "reply"), time of the event (now),
+                number of events, negative to take them back (unlikes)
+    Adds the events to the post's TrendingScore
+    """
+    if not count:
+        return
+    added = log_weight(event, when) + math.log(abs(count))
+    scores = TrendingScore.objects.using(using).filter(post_id = post_id)
+    if count < 0:
+        # log(exp(a) - exp(b)) = a + log(1 - exp(b - a)), taking back more than the score
+        # holds leaves a score prune_scores() drops
+        scores.update(score = F('score') + Ln(Greatest(
+            Value(1.0) - Exp(Least(Value(added) - F('score'), Value(0.0))), Value(REMAINDER),
+        )))
+        return
+    # log(exp(a) + exp(b)) = max(a, b) + log(1 + exp(-|a - b|)), exact without overflow
+    score = Greatest(F('score'), Value(added)) + Ln(Value(1.0) + Exp(-Abs(F('score') - Value(added))))
+    if scores.update(score = score):
+        return
+    try:
+        with transaction.atomic(using = using):
+            TrendingScore.objects.using(using).create(post_id = post_id, score = added)
+    except IntegrityError:
+        # another event of the same post created the row in between
+        scores.update(score = score)
+
+
+def prune_scores(batch_size = 10000):
+    """
+    Deletes the scores worth less than PRUNE_WEIGHT likes by now
+    Returns : number of scores deleted
+    """
+    threshold = math.log(PRUNE_WEIGHT * blogapp_settings.TRENDING_WEIGHTS['like']) + \
+        (datetime.now(timezone.utc) - EPOCH).total_seconds() / get_tau()
+    deleted = 0
+    while True:
+        stale = list(TrendingScore.objects.filter(score__lt = threshold).values_list('pk', flat = True)[:batch_size])
+        if not stale:
+            return deleted
+        deleted += TrendingScore.objects.filter(pk__in = stale).delete()[0]
+
+
+def refresh_trending(size = None):
+    """
+    Replaces TrendingPost with the current top size scores (BLOGAPP['TRENDING_SIZE'])
+    Returns : number of ranked posts
+    """
+    size = size or blogapp_settings.TRENDING_SIZE
+    top = TrendingScore.objects.order_by('-score', '-post').values_list('post_id', 'score')[:size]
+    ranked = [TrendingPost(rank = rank, post_id = post_id, score = score) for rank, (post_id, score) in enumerate(top, 1)]
+    with transaction.atomic():
+        TrendingPost.objects.all().delete()
+        TrendingPost.objects.bulk_create(ranked, batch_size = 1000)
+    return len(ranked)
+
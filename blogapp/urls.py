@@ -1,20 +1,29 @@
 from django.urls import path, include
 from .views import UsersAPIView, MyTokenObtainPairView
 from rest_framework_simplejwt.views import TokenRefreshView
-from .views import PostListAPIView, PostDetailAPIView, UserPostAPIView, LikeAPIView, CommentAPIView, PostSearchAPIView,ReplyAPIView , AddUserAPI
+from .views import PostListAPIView, PostDetailAPIView, UserPostAPIView, LikeAPIView, CommentAPIView, CommentThreadAPIView, PostSearchAPIView,ReplyAPIView , AddUserAPI
+from .views import PostImportAPIView, PostExportAPIView, FollowAPIView, FeedAPIView, TrendingPostAPIView
+from .instrumentation import MetricsAPIView
 
 
 urlpatterns = [
     path('', UsersAPIView.as_view(), name='users-list'),
     path('adduser/', AddUserAPI.as_view(), name='add_user'),
     path('login/', MyTokenObtainPairView.as_view(), name="get-token"),
-    path('token/refresh/', TokenRefreshView.as_view()),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     path('post/', PostListAPIView.as_view(), name='post-list'),
     path('post/<int:pk>/', PostDetailAPIView.as_view(), name = 'post-detail'),
     path('post/<int:pk>/upvote/', LikeAPIView.as_view(), name='like'),
     path('post/<int:pk>/comment/', CommentAPIView.as_view(), name='comment'),
+    path('post/<int:pk>/comment/thread/', CommentThreadAPIView.as_view(), name='comment-thread'),
     path('post/<username>/', UserPostAPIView.as_view(), name="user-post"),
     path('posts/search/', PostSearchAPIView.as_view(), name='post-search'),
+    path('posts/import/', PostImportAPIView.as_view(), name='post-import'),
+    path('posts/export/', PostExportAPIView.as_view(), name='post-export'),
+    path('posts/trending/', TrendingPostAPIView.as_view(), name='post-trending'),
     path('comment/<int:pk>/reply/', ReplyAPIView.as_view(), name="reply-comment"),
+    path('user/<username>/follow/', FollowAPIView.as_view(), name='follow'),
+    path('feed/', FeedAPIView.as_view(), name='feed'),
+    path('metrics/', MetricsAPIView.as_view(), name='metrics'),
 
 ]
\ No newline at end of file
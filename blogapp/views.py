@@ -1,26 +1,52 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status, permissions, generics, filters
-from .models import Post, Like, Comment
+from rest_framework import status, permissions, generics
+from .models import Post, Comment, Reply, TrendingPost
 from django.contrib.auth.models import User
-from .serializers import PostSerializer, LikeSerializer, CommentSerializer, ReplySerializer, UserSerializer
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.db.models.expressions import RawSQL
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from .serializers import PostSerializer, CommentSerializer, ReplySerializer, UserSerializer, UserDirectorySerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
-from .serializers import MyTokenObtainPairSerializer
-from django.db.models import Q
-
-
-
-
-class UsersAPIView(APIView):
+from .serializers import MyTokenObtainPairSerializer, PostSearchSerializer, CommentThreadSerializer, ThreadReplySerializer
+from .search import search_posts
+from .likes import toggle_like
+from .pagination import KeysetPaginationMixin, ReplyKeysetPagination, TrendingKeysetPagination, UserKeysetPagination
+from .fast_serializers import FastPostSerializer, FastCommentSerializer
+from .conf import blogapp_settings
+from .cache import get_cached_post, cache_post, make_post_entry, set_validators
+from .conditional import ConditionalListMixin
+from .routers import ReplicaReadMixin
+from .feed import FeedPagination, toggle_follow
+from .bulk import import_posts, export_posts
+from .trending import record_activity
+from .throttling import TokenBucketThrottle
+from .instrumentation import InstrumentedViewMixin
+from .authentication import StatelessReadMixin
+from .directory import directory_queryset
+from .purge import delete_post
+from .edits import parse_if_match, update_post
+
+
+
+
+class UsersAPIView(InstrumentedViewMixin, StatelessReadMixin, ReplicaReadMixin, KeysetPaginationMixin, APIView):
     """
-    Arguments : API View
-    Returns : List of all the users from the database
-    
+    Arguments : ?prefix=<start of the username>&cursor=<next cursor>&page_size=<n>
+    Returns : Page of the user directory in username order, with each user's post count,
+              likes received, follower and following counts
+
+    One index range read per page whatever the number of users, see blogapp/directory.py
     """
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = UserKeysetPagination
+
     def get(self, request):
-        users = User.objects.all()
-        serializer = UserSerializer(users, many = True)
-        return Response(serializer.data)
+        prefix = request.query_params.get('prefix', '')[:User._meta.get_field('username').max_length]
+        page = self.paginate_queryset(directory_queryset(prefix))
+        return self.get_paginated_response(UserDirectorySerializer(page, many = True).data)
 
 
 class AddUserAPI(APIView):
@@ -29,6 +55,9 @@ class AddUserAPI(APIView):
                 request_data = ["username","email","password"]
     Returns : created user data (username & email)
     """
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'signup'
+
     def post(self, request):    
         serializer = UserSerializer(data = request.data)
         if serializer.is_valid():
@@ -45,17 +74,26 @@ class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
 
 
-class PostListAPIView(APIView):
+class PostListAPIView(InstrumentedViewMixin, StatelessReadMixin, ReplicaReadMixin, ConditionalListMixin, KeysetPaginationMixin, APIView):
     """
     Arguments : request_data ["title", "body"]
-    Returns : All Posts before making the POST API call , after that created post
+    Returns : Page of Posts (newest first) before making the POST API call , after that created post
+
+    GET accepts ?cursor=<next cursor>&page_size=<n> and answers If-None-Match
     """
     permission_classes = [permissions.IsAuthenticated]
+    validator_fields = ('like_count', 'comment_count')
 
     def get(self, request, *args, **kwargs):
         posts = Post.objects.all()
-        serializer = PostSerializer(posts, many = True)
-        return Response(serializer.data, status = status.HTTP_200_OK)
+        not_modified = self.conditional_list_response(posts)
+        if not_modified is not None:
+            return not_modified
+        rows = FastPostSerializer.values(posts.with_like_count())
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(FastPostSerializer(page).data)
+        return Response(FastPostSerializer(rows).data, status = status.HTTP_200_OK)
 
     def post(self, request, *args, **kwargs):
         data = {
@@ -70,75 +108,97 @@ class PostListAPIView(APIView):
         return Response(serializer.errors, status = status.HTTP_400_BAD_REQUEST)
 
 
-class PostDetailAPIView(APIView):
+class PostDetailAPIView(InstrumentedViewMixin, StatelessReadMixin, ReplicaReadMixin, APIView):
     """
         Arguments : request_data ["post_id"]
         Returns : specific post details
 
         Also allow authenticated user to update, delete their post
 
+        GET is served from the post cache (see blogapp/cache.py) and sends ETag / Last-Modified,
+        a matching If-None-Match or If-Modified-Since gets a 304 without touching the database
+
     """
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self, pk):
         try:
-            return Post.objects.get(pk = pk)
+            return Post.objects.with_like_count().get(pk = pk)
         except Post.DoesNotExist:
             return None
 
     def get(self, request, pk, *args, **kwargs):
-        post = self.get_object(pk)
-        if post is None:
-            return Response({'error': 'Post not found'}, status = status.HTTP_404_NOT_FOUND)
-        serializer = PostSerializer(post)
-        return Response(serializer.data, status = status.HTTP_200_OK)
+        entry = get_cached_post(pk)
+        if entry is None:
+            post = self.get_object(pk)
+            if post is None:
+                return Response({'error': 'Post not found'}, status = status.HTTP_404_NOT_FOUND)
+            entry = cache_post(post, PostSerializer(post).data)
+        not_modified = get_conditional_response(request, etag = entry['etag'], last_modified = entry['last_modified'])
+        if not_modified is not None:
+            return set_validators(not_modified, entry)
+        return set_validators(Response(entry['data'], status = status.HTTP_200_OK), entry)
 
     def put(self, request, pk, *args, **kwargs):
-        post = self.get_object(pk)
+        """
+        Writes only the title / body sent, in one UPDATE guarded by ownership and, when the request
+        has an If-Match header, by the version of the ETag (412 when the post was edited since)
+        """
+        data = {name: request.data[name] for name in ('title', 'body') if name in request.data}
+        if not data:
+            return Response({'error': 'Send a title or a body'}, status = status.HTTP_400_BAD_REQUEST)
+        serializer = PostSerializer(data = data, partial = True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status = status.HTTP_400_BAD_REQUEST)
+
+        versions = parse_if_match(request.META.get('HTTP_IF_MATCH'))
+        post = update_post(pk, request.user.id, serializer.validated_data, versions)
         if post is None:
-            return Response({'error': 'Post not found'}, status = status.HTTP_404_NOT_FOUND)
-        data = {
-            'user': request.user.id,
-            'title': request.data.get('title'),
-            'body': request.data.get('body'),
-            'like_count': post.like_count
-        }
-        serializer = PostSerializer(post, data = data, partial = True)
-        if serializer.is_valid():
-            if post.user.id == request.user.id:
-                serializer.save()
-                return Response(serializer.data, status = status.HTTP_200_OK)
-            return Response({"error": "You are not authorized to edit this post"}, status = status.HTTP_401_UNAUTHORIZED)
-        return Response(serializer.errors, status = status.HTTP_400_BAD_REQUEST)
+            owner = Post.objects.filter(pk = pk).values_list('user_id', flat = True).first()
+            if owner is None:
+                return Response({'error': 'Post not found'}, status = status.HTTP_404_NOT_FOUND)
+            if owner != request.user.id:
+                return Response({"error": "You are not authorized to edit this post"}, status = status.HTTP_401_UNAUTHORIZED)
+            return Response({'error': 'The post was edited since, fetch it again'}, status = status.HTTP_412_PRECONDITION_FAILED)
+        data = PostSerializer(post).data
+        return set_validators(Response(data, status = status.HTTP_200_OK), make_post_entry(post, data))
 
     def delete(self, request, pk, *args, **kwargs):
         post = self.get_object(pk)
         if post is None:
             return Response({'error': 'Post not found'}, status = status.HTTP_404_NOT_FOUND)
         if post.user.id == request.user.id:
-            post.delete()
+            # hidden at once, purge_deleted_posts removes it with its likes and comments later
+            delete_post(post)
             return Response({"res": "Object deleted!"}, status = status.HTTP_200_OK)
         return Response({"error": "You are not authorized to delete this post"}, status = status.HTTP_401_UNAUTHORIZED)
 
 
-class UserPostAPIView(APIView):
+class UserPostAPIView(InstrumentedViewMixin, StatelessReadMixin, ReplicaReadMixin, ConditionalListMixin, KeysetPaginationMixin, APIView):
     """
         Arguments : user_name
-        Returns : All post made by the specific user
+        Returns : Page of posts made by the specific user (newest first)
 
     """
     permission_classes = [permissions.IsAuthenticated]
+    validator_fields = ('like_count', 'comment_count')
 
     def get(self, request, username, *args, **kwargs):
         user = User.objects.filter(username = username).first()
         if user is None:
             return Response({'error': 'User not found'}, status = status.HTTP_404_NOT_FOUND)
         posts = Post.objects.filter(user = user)
-        serializer = PostSerializer(posts, many = True)
-        return Response(serializer.data, status = status.HTTP_200_OK)
+        not_modified = self.conditional_list_response(posts)
+        if not_modified is not None:
+            return not_modified
+        rows = FastPostSerializer.values(posts.with_like_count())
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(FastPostSerializer(page).data)
+        return Response(FastPostSerializer(rows).data, status = status.HTTP_200_OK)
 
 
-class LikeAPIView(APIView):
+class LikeAPIView(InstrumentedViewMixin, APIView):
     """
     Post API for liking the post
     Arguments : 
@@ -146,41 +206,40 @@ class LikeAPIView(APIView):
 
     This API call will let user like the post, once they made the POST request it'll upvote the count\
     They can undo it by making another POST request
+
+    The toggle is a single transaction (see blogapp/likes.py), so concurrent likes never lose updates
     """
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'like'
 
     def get_object(self, pk):
         try:
-            return Post.objects.get(pk = pk)
+            return Post.objects.with_like_count().get(pk = pk)
         except Post.DoesNotExist:
             return None
 
     def post(self, request, pk, *args, **kwargs):
-        post = self.get_object(pk)
+        liked = toggle_like(request.user.id, pk)
+        post = self.get_object(pk) if liked is not None else None
         if post is None:
             return Response({'error': 'Post not found'}, status = status.HTTP_404_NOT_FOUND)
-        
-        upvoters = post.likes.all().values_list('user', flat = True)
-        if request.user.id in upvoters:
-            post.like_count -= 1
-            post.likes.filter(user = request.user).delete()
-        else:
-            post.like_count += 1
-            like = Like(user = request.user, post = post)
-            like.save()
-        post.save()
         serializer = PostSerializer(post)
         return Response(serializer.data, status = status.HTTP_200_OK)
 
 
-class CommentAPIView(APIView):
+class CommentAPIView(InstrumentedViewMixin, StatelessReadMixin, ReplicaReadMixin, ConditionalListMixin, KeysetPaginationMixin, APIView):
     """
     This API will let user add comments on the post
 
     Arguments : comment body
-    Returns : added comment details
+    Returns : added comment details, GET returns a page of the post's comments (newest first)
     """
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'comment'
+    last_modified_field = 'created'
+    validator_fields = ('reply_count',)
 
     def get_object(self, pk):
         try:
@@ -193,8 +252,14 @@ class CommentAPIView(APIView):
         if post is None:
             return Response({'error': 'Post not found'}, status = status.HTTP_404_NOT_FOUND)
         comments = Comment.objects.filter(post = post)
-        serializer = CommentSerializer(comments, many = True)
-        return Response(serializer.data, status = status.HTTP_200_OK)
+        not_modified = self.conditional_list_response(comments)
+        if not_modified is not None:
+            return not_modified
+        rows = FastCommentSerializer.values(comments)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(FastCommentSerializer(page).data)
+        return Response(FastCommentSerializer(rows).data, status = status.HTTP_200_OK)
 
     def post(self, request, pk, *args, **kwargs):
         post = self.get_object(pk)
@@ -208,48 +273,122 @@ class CommentAPIView(APIView):
         }
         serializer = CommentSerializer(data = data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                record_activity(post.id, 'comment')
             return Response(serializer.data, status = status.HTTP_201_CREATED)
         return Response(serializer.errors, status = status.HTTP_400_BAD_REQUEST)
 
     
 
-class PostSearchAPIView(generics.ListAPIView):
+class CommentThreadAPIView(InstrumentedViewMixin, StatelessReadMixin, KeysetPaginationMixin, APIView):
+    """
+    This GET API returns the comments of a post with their author and first replies nested
+
+    Arguments : ?cursor=<next cursor>&page_size=<comments per page>&replies=<replies per comment>
+    Returns : page of comments (newest first), each with "replies" (oldest first) and
+              "replies_next" pointing at the next page of that comment's replies
+
+    A page always costs three queries : the post check, the comments joined with their users
+    and one query for the replies of every comment on the page.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    reply_pagination_class = ReplyKeysetPagination
+
+    def get_replies_page_size(self, request):
+        try:
+            page_size = int(request.query_params['replies'])
+        except (KeyError, ValueError):
+            page_size = blogapp_settings.THREAD_REPLIES_PAGE_SIZE
+        return max(1, min(page_size, blogapp_settings.KEYSET_MAX_PAGE_SIZE))
+
+    def prefetch_replies(self, comments, page_size):
+        """
+        Loads the first page_size + 1 replies of every comment in a single query,
+        the extra row tells whether the comment has a next page of replies
+        """
+        comment_ids = [comment.id for comment in comments]
+        if not comment_ids:
+            return
+        first_replies = RawSQL(
+            'SELECT id FROM ('
+            ' SELECT id, ROW_NUMBER() OVER (PARTITION BY comment_id ORDER BY created_at, id) AS position'
+            ' FROM blogapp_reply WHERE comment_id IN (%s)'
+            ') ranked WHERE position <= %%s' % ', '.join(['%s'] * len(comment_ids)),
+            comment_ids + [page_size + 1],
+        )
+        replies = Reply.objects.select_related('user').filter(pk__in = first_replies).order_by('created_at', 'id')
+        prefetch_related_objects(comments, Prefetch('replies', queryset = replies, to_attr = 'thread_replies'))
+
+    def get(self, request, pk, *args, **kwargs):
+        if not Post.objects.filter(pk = pk).exists():
+            return Response({'error': 'Post not found'}, status = status.HTTP_404_NOT_FOUND)
+        comments = self.paginate_queryset(Comment.objects.filter(post_id = pk).select_related('user'))
+        replies_page_size = self.get_replies_page_size(request)
+        self.prefetch_replies(comments, replies_page_size)
+        serializer = CommentThreadSerializer(comments, many = True, context = {
+            'request': request,
+            'replies_page_size': replies_page_size,
+            'reply_paginator': self.reply_pagination_class(),
+        })
+        return self.get_paginated_response(serializer.data)
+
+
+class PostSearchAPIView(InstrumentedViewMixin, StatelessReadMixin, ReplicaReadMixin, ConditionalListMixin, generics.ListAPIView):
     """
     This GET API will let user search specific keywords present in the title or the body of the post
 
-    Arguments : filter keyword <Click on the filter button we'll get on the web page to provide argument>
-    Returns : Posts with that keyword otherwise return data with Null values
-    
+    Arguments : ?query=<words> , "quoted words" match a phrase and word* matches a prefix
+    Returns : Posts with those keywords ranked by relevance, with highlighted title and body snippet
+
+    Searching goes through the full text index (see blogapp/search.py), never a LIKE scan.
     """
-    serializer_class = PostSerializer
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['title', 'body']
+    serializer_class = PostSearchSerializer
+    validator_fields = ('like_count', 'comment_count')
 
-    def get_queryset(self):
-        queryset = Post.objects.all()
+    def get_matching_posts(self):
+        queryset = Post.objects.order_by('-created', '-id')
         query = self.request.query_params.get('query', None)
         if query is not None:
-            queryset = queryset.filter(Q(title__icontains=query) | Q(body__icontains=query))
+            queryset = search_posts(queryset, query)
         return queryset
 
+    def get_queryset(self):
+        return self.get_matching_posts().with_like_count()
+
+    def list(self, request, *args, **kwargs):
+        not_modified = self.conditional_list_response(self.get_matching_posts())
+        if not_modified is not None:
+            return not_modified
+        return super().list(request, *args, **kwargs)
 
-class ReplyAPIView(APIView):
+
+class ReplyAPIView(InstrumentedViewMixin, StatelessReadMixin, KeysetPaginationMixin, APIView):
     """
     This API will let people add replies to the specific comments
 
     Arguments : reply body
 
-    Return : created Reply details
+    Return : created Reply details, GET returns a page of the comment's replies (oldest first)
     """
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ReplyKeysetPagination
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'reply'
 
     def get_object(self, pk):
         try:
-            return Comment.objects.get(pk=pk)
+            return Comment.objects.get(pk=pk, post__is_deleted=False)
         except Comment.DoesNotExist:
             return None
 
+    def get(self, request, pk, *args, **kwargs):
+        if not Comment.objects.filter(pk = pk, post__is_deleted = False).exists():
+            return Response({'error': 'Comment not found'}, status = status.HTTP_404_NOT_FOUND)
+        replies = self.paginate_queryset(Reply.objects.filter(comment_id = pk).select_related('user'))
+        serializer = ThreadReplySerializer(replies, many = True)
+        return self.get_paginated_response(serializer.data)
+
     def post(self, request, pk, *args, **kwargs):
         comment = self.get_object(pk)
         if comment is None:
@@ -258,11 +397,98 @@ class ReplyAPIView(APIView):
         data = {
             'user': request.user.id,
             'comment': comment.id,
-            'body': request.data['body'] if isinstance(request.data, dict) else request.data
+            'body': request.data.get('body') if isinstance(request.data, dict) else request.data
         }
         serializer = ReplySerializer(data=data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                record_activity(comment.post_id, 'reply')
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+
+class PostImportAPIView(APIView):
+    """
+    Arguments : request body in JSON Lines (application/x-ndjson), one post or comment per line,
+                see blogapp/bulk.py for the format
+    Returns : number of imported posts and comments, plus the rejected lines with the reason
+
+    Admin only, the body is read line by line and inserted in chunks so it can be arbitrarily large.
+    Records are owned by the admin unless they name a "user".
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        if request.stream is None:
+            return Response({'error': 'Empty request body'}, status = status.HTTP_400_BAD_REQUEST)
+        result = import_posts(request.stream, request.user.id, allow_user = True)
+        return Response(result.as_dict(), status = status.HTTP_200_OK)
+
+
+class PostExportAPIView(APIView):
+    """
+    Arguments : API View
+    Returns : every post with its comments as JSON Lines, in the format PostImportAPIView reads
+
+    Admin only, the response is streamed so memory use does not grow with the number of posts.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        response = StreamingHttpResponse(export_posts(), content_type = 'application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="posts.jsonl"'
+        return response
+
+
+class FollowAPIView(InstrumentedViewMixin, APIView):
+    """
+    POST API for following a user, another POST unfollows them
+    Arguments : user_name
+    Returns : {"following": true / false}
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, username, *args, **kwargs):
+        followee_id = User.objects.filter(username = username).values_list('id', flat = True).first()
+        if followee_id is None:
+            return Response({'error': 'User not found'}, status = status.HTTP_404_NOT_FOUND)
+        if followee_id == request.user.id:
+            return Response({'error': 'You can not follow yourself'}, status = status.HTTP_400_BAD_REQUEST)
+        return Response({'following': toggle_follow(request.user.id, followee_id)}, status = status.HTTP_200_OK)
+
+
+class FeedAPIView(InstrumentedViewMixin, StatelessReadMixin, KeysetPaginationMixin, APIView):
+    """
+    Arguments : ?cursor=<next cursor>&page_size=<n>
+    Returns : Page of the posts of the user and of the people they follow (newest first)
+
+    See blogapp/feed.py, a page is one range read of the user's feed plus the posts of the page.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FeedPagination
+
+    def get(self, request, *args, **kwargs):
+        post_ids = self.paginator.paginate_feed(request.user.id, request)
+        rows = {row['id']: row for row in FastPostSerializer.values(Post.objects.filter(pk__in = post_ids).with_like_count())}
+        page = [rows[pk] for pk in post_ids if pk in rows]
+        return self.get_paginated_response(FastPostSerializer(page).data)
+
+
+class TrendingPostAPIView(InstrumentedViewMixin, StatelessReadMixin, ReplicaReadMixin, KeysetPaginationMixin, APIView):
+    """
+    Arguments : ?cursor=<next cursor>&page_size=<n>
+    Returns : Page of the trending posts, hottest first
+
+    The ranking is the one of the last refresh_trending run (see blogapp/trending.py),
+    a page is one range read of TrendingPost plus the posts of the page.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TrendingKeysetPagination
+
+    def get(self, request, *args, **kwargs):
+        ranks = self.paginate_queryset(TrendingPost.objects.values('rank', 'post_id'))
+        post_ids = [row['post_id'] for row in ranks]
+        rows = {row['id']: row for row in FastPostSerializer.values(Post.objects.filter(pk__in = post_ids).with_like_count())}
+        page = [rows[pk] for pk in post_ids if pk in rows]
+        return self.get_paginated_response(FastPostSerializer(page).data)